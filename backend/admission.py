@@ -0,0 +1,218 @@
+"""Admission control and fair queueing for concurrent council runs."""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from .config import (
+    COUNCIL_MAX_CONCURRENT,
+    COUNCIL_MAX_QUEUE,
+    COUNCIL_FAIR_QUEUE,
+    COUNCIL_SHARED_LIMITS,
+)
+from .locking import SharedSlots
+
+# Queue key used for every client when per-client fairness is off
+_SHARED_QUEUE = "*"
+
+# How often queued runs re-check for slots freed by other workers
+SHARED_POLL_SECONDS = 0.25
+
+
+class AdmissionRejected(Exception):
+    """Raised when the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Council queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A council run waiting for, or holding, an execution slot."""
+
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.admitted = False
+        self.released = False
+        self.admitted_at: Optional[float] = None
+        self.slot: Optional[int] = None
+
+
+class AdmissionController:
+    """
+    Limit how many councils run at once and queue the rest.
+
+    Waiting runs are dispatched round-robin across clients when fairness is
+    enabled (so one client's burst can't starve others), otherwise FIFO.
+    Once the queue is full, new runs are rejected immediately with a
+    Retry-After estimate based on recent run durations.
+
+    With `shared` slots, each admission also takes a cross-process slot, so
+    the concurrency limit holds across every worker; the wait queue stays
+    per worker.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int,
+        fair: bool = True,
+        shared: Optional[SharedSlots] = None
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.fair = fair
+        self._shared = shared
+        self._active = 0
+        self._queues: OrderedDict[str, deque[Ticket]] = OrderedDict()
+        self._changed = asyncio.Event()
+        # Exponential moving average of council run time, seeded with a guess
+        self._avg_run_seconds = 30.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _notify(self):
+        """Wake every waiter and arm a fresh event for the next change."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _dispatch_order(self) -> List[Ticket]:
+        """Order in which queued tickets will be admitted."""
+        queues = [list(q) for q in self._queues.values()]
+        order = []
+        for round_index in range(max((len(q) for q in queues), default=0)):
+            order.extend(q[round_index] for q in queues if round_index < len(q))
+        return order
+
+    def _try_admit(self, ticket: Ticket) -> bool:
+        """Give the ticket a slot if one is free locally (and across workers)."""
+        if self._active >= self.max_concurrent:
+            return False
+        if self._shared is not None:
+            ticket.slot = self._shared.try_acquire()
+            if ticket.slot is None:
+                return False
+        ticket.admitted = True
+        ticket.admitted_at = time.monotonic()
+        self._active += 1
+        return True
+
+    def _dispatch(self):
+        """Admit queued tickets while there are free slots."""
+        admitted_any = False
+        while self._queues:
+            client_id, queue = next(iter(self._queues.items()))
+            if not self._try_admit(queue[0]):
+                break
+            queue.popleft()
+            # Rotate the client to the back so others go next
+            del self._queues[client_id]
+            if queue:
+                self._queues[client_id] = queue
+            admitted_any = True
+        if admitted_any:
+            self._notify()
+
+    def retry_after(self) -> int:
+        """Estimate seconds until a queue slot is likely to free up."""
+        waves = (self.queued + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(self._avg_run_seconds * waves))
+
+    def enqueue(self, client_id: str) -> Ticket:
+        """
+        Request a slot for a council run.
+
+        Args:
+            client_id: Identifier used for per-client fairness
+
+        Returns:
+            A ticket, already admitted if a slot was free
+
+        Raises:
+            AdmissionRejected: If the wait queue is full
+        """
+        ticket = Ticket(client_id)
+        if not self._queues and self._try_admit(ticket):
+            return ticket
+
+        if self.queued >= self.max_queue:
+            raise AdmissionRejected(self.retry_after())
+
+        key = client_id if self.fair else _SHARED_QUEUE
+        self._queues.setdefault(key, deque()).append(ticket)
+        self._dispatch()
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based queue position of a ticket (0 once admitted)."""
+        if ticket.admitted:
+            return 0
+        return self._dispatch_order().index(ticket) + 1
+
+    async def wait_for_change(self):
+        """Block until a ticket is admitted or leaves the queue."""
+        if self._shared is None:
+            await self._changed.wait()
+            return
+        # Slots freed by other workers don't notify us, so poll as well
+        try:
+            await asyncio.wait_for(self._changed.wait(), SHARED_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            self._dispatch()
+
+    async def wait(self, ticket: Ticket):
+        """Wait until the ticket is admitted."""
+        while not ticket.admitted:
+            await self.wait_for_change()
+
+    def release(self, ticket: Ticket):
+        """
+        Give up a ticket: free its slot if admitted, or leave the queue.
+
+        Safe to call more than once.
+        """
+        if ticket.released:
+            return
+        ticket.released = True
+
+        if ticket.admitted:
+            self._active -= 1
+            if ticket.slot is not None:
+                self._shared.release(ticket.slot)
+            duration = time.monotonic() - ticket.admitted_at
+            self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * duration
+        else:
+            key = ticket.client_id if self.fair else _SHARED_QUEUE
+            queue = self._queues.get(key)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[key]
+
+        self._dispatch()
+        self._notify()
+
+    def stats(self) -> Dict[str, int]:
+        """Current load, for diagnostics."""
+        return {
+            "active": self._active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+
+council_admission = AdmissionController(
+    COUNCIL_MAX_CONCURRENT,
+    COUNCIL_MAX_QUEUE,
+    fair=COUNCIL_FAIR_QUEUE,
+    shared=SharedSlots("council-slots.lock", COUNCIL_MAX_CONCURRENT) if COUNCIL_SHARED_LIMITS else None,
+)
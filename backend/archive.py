@@ -0,0 +1,415 @@
+"""Packed, memory-mapped segment store for cold (archived) conversations."""
+
+import mmap
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+from . import serialization
+from .config import ARCHIVE_DIR, ARCHIVE_RECLAIM_DEAD_FRACTION, ARCHIVE_SEGMENT_MAX_BYTES
+from .locking import named_lock
+
+INDEX_FILENAME = "index.json"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".seg"
+
+# Lock order: named_lock("archive-segments") (appending to or deleting
+# segments), then named_lock("archive") (replacing the index), then _lock,
+# which guards this process's cached index and mappings and is only held
+# briefly, never while segment data is written
+_lock = threading.Lock()
+_index: Optional[Dict[str, Any]] = None
+_index_mtime: Optional[float] = None
+_maps: Dict[str, mmap.mmap] = {}
+# Generation of the index the cached mappings belong to. It changes whenever
+# segment files are deleted (clear, reclaim), since a deleted segment's name
+# can be reused and a mapping of the old file would serve stale bytes.
+_maps_generation: Optional[str] = None
+
+
+def _index_path() -> str:
+    return os.path.join(ARCHIVE_DIR, INDEX_FILENAME)
+
+
+def _segment_path(segment: str) -> str:
+    return os.path.join(ARCHIVE_DIR, segment)
+
+
+def _read_index_file() -> Tuple[Dict[str, Any], Optional[float]]:
+    """Read the index from disk, returning it with its mtime (None if missing)."""
+    path = _index_path()
+    try:
+        mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            return serialization.loads(f.read()), mtime
+    except FileNotFoundError:
+        return {"entries": {}}, None
+
+
+def _load_index() -> Dict[str, Any]:
+    """
+    Return the offset index, reloading it if the file changed on disk (call under _lock).
+
+    The index maps conversation id to its segment, byte offset and length,
+    plus the metadata needed to list the conversation without reading it.
+    """
+    global _index, _index_mtime
+
+    try:
+        mtime = os.path.getmtime(_index_path())
+    except FileNotFoundError:
+        mtime = None
+    if _index is None or mtime != _index_mtime:
+        _index, _index_mtime = _read_index_file()
+    _check_generation(_index)
+    return _index
+
+
+def _check_generation(index: Dict[str, Any]):
+    """Drop cached mappings made under an index generation that has been replaced."""
+    global _maps_generation
+    generation = index.get("generation")
+    if generation != _maps_generation:
+        for segment in list(_maps):
+            _close_map(segment)
+        _maps_generation = generation
+
+
+def _save_index(index: Dict[str, Any]):
+    """
+    Atomically replace the index file (under named_lock("archive")).
+
+    Writers build `index` from _read_index_file() taken under the same lock,
+    so they never update a stale copy when another worker changed it.
+    """
+    global _index, _index_mtime
+
+    Path(ARCHIVE_DIR).mkdir(parents=True, exist_ok=True)
+    path = _index_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(serialization.dumps(index))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    mtime = os.path.getmtime(path)
+    with _lock:
+        _index, _index_mtime = index, mtime
+        _check_generation(index)
+
+
+def _close_map(segment: str):
+    mapped = _maps.pop(segment, None)
+    if mapped is not None:
+        mapped.close()
+
+
+def _get_map(segment: str, end: int) -> mmap.mmap:
+    """Return a read-only mapping of a segment covering at least `end` bytes."""
+    mapped = _maps.get(segment)
+    if mapped is None or len(mapped) < end:
+        # The active segment grows as conversations are appended; remap it
+        _close_map(segment)
+        with open(_segment_path(segment), 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _maps[segment] = mapped
+    return mapped
+
+
+def _encode(conversation: Dict[str, Any]):
+    """Encode a conversation compactly, returning (payload, format)."""
+    if serialization.msgpack is not None:
+        return serialization.encode_document(conversation, "msgpack"), "msgpack"
+    return serialization.dumps(conversation), "json"
+
+
+def _segments() -> List[str]:
+    """Segment file names, oldest first."""
+    return sorted(
+        name for name in os.listdir(ARCHIVE_DIR)
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def _active_segment(incoming: int, size: int, exclude: Tuple[str, ...] = ()) -> str:
+    """
+    Pick the segment to append to, starting a new one when it would overflow.
+
+    Args:
+        incoming: Bytes about to be appended
+        size: Bytes already appended to the last segment in this batch
+        exclude: Segments that must not be appended to (being reclaimed)
+    """
+    segments = _segments()
+    if segments:
+        last = segments[-1]
+        size = max(size, os.path.getsize(_segment_path(last)))
+        if last not in exclude and (size == 0 or size + incoming <= ARCHIVE_SEGMENT_MAX_BYTES):
+            return last
+        number = int(last[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) + 1
+    else:
+        number = 1
+    return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+
+def _write_segments(
+    payloads: List[bytes],
+    exclude: Tuple[str, ...] = ()
+) -> List[Tuple[str, int]]:
+    """
+    Append payloads to the active segment(s), under named_lock("archive-segments").
+
+    Each segment written to is fsynced once, after its last payload.
+
+    Returns:
+        (segment, offset) of each payload, in order
+    """
+    locations = []
+    handle = None
+    segment = None
+    try:
+        for payload in payloads:
+            target = _active_segment(len(payload), handle.tell() if handle else 0, exclude)
+            if target != segment:
+                if handle is not None:
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                    handle.close()
+                segment = target
+                handle = open(_segment_path(segment), 'ab')
+            locations.append((segment, handle.tell()))
+            handle.write(payload)
+        if handle is not None:
+            handle.flush()
+            os.fsync(handle.fileno())
+    finally:
+        if handle is not None:
+            handle.close()
+    return locations
+
+
+def contains(conversation_id: str) -> bool:
+    """Check whether a conversation is in the archive."""
+    with _lock:
+        return conversation_id in _load_index()["entries"]
+
+
+def read(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Read an archived conversation through a memory-mapped segment.
+
+    Args:
+        conversation_id: Conversation identifier
+
+    Returns:
+        Conversation dict or None if not archived
+    """
+    for attempt in range(2):
+        with _lock:
+            entry = _load_index()["entries"].get(conversation_id)
+            if entry is None:
+                return None
+            start = entry["offset"]
+            end = start + entry["length"]
+            try:
+                data = _get_map(entry["segment"], end)[start:end]
+                break
+            except FileNotFoundError:
+                # The segment was reclaimed after our last look at the index
+                if attempt:
+                    raise
+    return serialization.decode_document(data, entry["format"])
+
+
+def list_metadata() -> List[Dict[str, Any]]:
+    """Return list-view metadata for every archived conversation."""
+    with _lock:
+        entries = _load_index()["entries"]
+        return [
+            {
+                "id": conversation_id,
+                "created_at": entry["created_at"],
+                "title": entry["title"],
+                "message_count": entry["message_count"],
+                "version": entry.get("version", 0),
+                "updated_at": entry.get("updated_at"),
+            }
+            for conversation_id, entry in entries.items()
+        ]
+
+
+def iter_conversations() -> Iterator[Dict[str, Any]]:
+    """Yield every archived conversation, one at a time."""
+    with _lock:
+        ids = list(_load_index()["entries"])
+    for conversation_id in ids:
+        conversation = read(conversation_id)
+        if conversation is not None:
+            yield conversation
+
+
+def append(conversations: List[Dict[str, Any]]) -> int:
+    """
+    Pack conversations into the active segment and index them.
+
+    Segment data is fsynced before the index is replaced, so a crash never
+    leaves the index pointing at missing bytes. Reads, lists and saves in
+    this process only wait for the index update, not for segment writes.
+
+    Args:
+        conversations: Conversation dicts to archive
+
+    Returns:
+        Number of conversations archived
+    """
+    if not conversations:
+        return 0
+
+    Path(ARCHIVE_DIR).mkdir(parents=True, exist_ok=True)
+    archived_at = datetime.utcnow().isoformat()
+    encoded = [_encode(conversation) for conversation in conversations]
+
+    with named_lock("archive-segments"):
+        locations = _write_segments([payload for payload, _ in encoded])
+
+        with named_lock("archive"):
+            index, _ = _read_index_file()
+            entries = dict(index["entries"])
+            for conversation, (payload, fmt), (segment, offset) in zip(conversations, encoded, locations):
+                entries[conversation["id"]] = {
+                    "segment": segment,
+                    "offset": offset,
+                    "length": len(payload),
+                    "format": fmt,
+                    "created_at": conversation["created_at"],
+                    "title": conversation.get("title", "New Conversation"),
+                    "message_count": len(conversation["messages"]),
+                    "version": conversation.get("version", 0),
+                    "updated_at": conversation.get("updated_at"),
+                    "archived_at": archived_at,
+                }
+            generation = index.get("generation") or uuid.uuid4().hex
+            _save_index({**index, "entries": entries, "generation": generation})
+
+    return len(conversations)
+
+
+def forget(conversation_id: str):
+    """
+    Drop a conversation from the index (after deletion or when it becomes hot again).
+
+    Its bytes stay in the segment as dead space until reclaim() rewrites it.
+    """
+    with _lock:
+        if conversation_id not in _load_index()["entries"]:
+            return
+
+    with named_lock("archive"):
+        index, _ = _read_index_file()
+        if conversation_id not in index["entries"]:
+            return
+        entries = dict(index["entries"])
+        del entries[conversation_id]
+        _save_index({**index, "entries": entries})
+
+
+def reclaim(min_dead_fraction: float = ARCHIVE_RECLAIM_DEAD_FRACTION) -> int:
+    """
+    Rewrite segments that are mostly dead space (forgotten conversations).
+
+    The live conversations of each such segment are copied to the active
+    segment, the index is pointed at the copies, and the old segment is
+    deleted. The index gets a new generation, so every worker drops its
+    mappings of the deleted files.
+
+    Args:
+        min_dead_fraction: Rewrite segments with at least this share of dead bytes
+
+    Returns:
+        Bytes freed
+    """
+    if not os.path.isdir(ARCHIVE_DIR):
+        return 0
+
+    with named_lock("archive-segments"):
+        index, _ = _read_index_file()
+        live: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for conversation_id, entry in index["entries"].items():
+            live.setdefault(entry["segment"], []).append((conversation_id, entry))
+
+        victims = []
+        for segment in _segments():
+            size = os.path.getsize(_segment_path(segment))
+            live_bytes = sum(entry["length"] for _, entry in live.get(segment, []))
+            if size and (size - live_bytes) / size >= min_dead_fraction:
+                victims.append((segment, size - live_bytes))
+        if not victims:
+            return 0
+        victim_names = tuple(segment for segment, _ in victims)
+
+        moved = []
+        payloads = []
+        for segment in victim_names:
+            with open(_segment_path(segment), 'rb') as f:
+                for conversation_id, entry in sorted(live.get(segment, []), key=lambda item: item[1]["offset"]):
+                    f.seek(entry["offset"])
+                    payloads.append(f.read(entry["length"]))
+                    moved.append((conversation_id, entry))
+        locations = _write_segments(payloads, exclude=victim_names)
+
+        with named_lock("archive"):
+            index, _ = _read_index_file()
+            entries = dict(index["entries"])
+            for (conversation_id, old), (segment, offset) in zip(moved, locations):
+                current = entries.get(conversation_id)
+                # Skip conversations forgotten (or re-archived) since the scan
+                if current is not None and (current["segment"], current["offset"]) == (old["segment"], old["offset"]):
+                    entries[conversation_id] = {**current, "segment": segment, "offset": offset}
+            _save_index({**index, "entries": entries, "generation": uuid.uuid4().hex})
+
+        for segment in victim_names:
+            os.remove(_segment_path(segment))
+
+    return sum(dead for _, dead in victims)
+
+
+def clear():
+    """Remove all segments and the index."""
+    global _index, _index_mtime
+
+    with named_lock("archive-segments"), named_lock("archive"), _lock:
+        for segment in list(_maps):
+            _close_map(segment)
+        if os.path.isdir(ARCHIVE_DIR):
+            for name in os.listdir(ARCHIVE_DIR):
+                if name == INDEX_FILENAME or name.startswith(SEGMENT_PREFIX):
+                    os.remove(os.path.join(ARCHIVE_DIR, name))
+        # Other workers see the index vanish and drop their mappings
+        _index, _index_mtime = None, None
+
+
+def main():
+    """Command-line entry point for the compaction job."""
+    import argparse
+    from . import storage
+    from .config import ARCHIVE_AFTER_DAYS
+
+    parser = argparse.ArgumentParser(description="Move cold conversations into packed archive segments")
+    parser.add_argument(
+        "--older-than-days",
+        type=float,
+        default=ARCHIVE_AFTER_DAYS,
+        help=f"Archive conversations not modified for this many days (default: {ARCHIVE_AFTER_DAYS})"
+    )
+    args = parser.parse_args()
+
+    count = storage.archive_cold_conversations(args.older_than_days)
+    freed = reclaim()
+    print(f"Archived {count} conversations into {ARCHIVE_DIR}, reclaimed {freed} bytes")
+
+
+if __name__ == "__main__":
+    main()
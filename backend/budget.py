@@ -0,0 +1,184 @@
+"""Token budgets: estimate, strip, condense and trim what one stage passes to the next."""
+
+import math
+import re
+from typing import Dict, List, Optional, Sequence
+
+from .config import (
+    DEFAULT_CONTEXT_TOKENS,
+    MODEL_CONTEXT_TOKENS,
+    RESPONSE_RESERVE_TOKENS,
+    STRIP_THINKING,
+)
+from .providers import resolve
+
+# Average characters per token of ASCII text. Slightly low for English
+# prose, so estimates err on the side of more tokens.
+CHARS_PER_TOKEN = 3.5
+
+# Per-message overhead of the chat template (role markers and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Reasoning blocks, closed or cut off at the end of the text
+_THINK_RE = re.compile(r"<(think|thinking|reasoning)>.*?(?:</\1>|\Z)\s*", re.DOTALL)
+# Everything up to a closing tag whose opening tag was eaten by the chat template
+_ORPHAN_THINK_RE = re.compile(r"^.*</(?:think|thinking|reasoning)>\s*", re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate how many tokens a text takes, without a tokenizer.
+
+    ASCII characters count CHARS_PER_TOKEN to a token; other characters
+    (accents, CJK, emoji) count as a token each.
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars / CHARS_PER_TOKEN) + (len(text) - ascii_chars)
+
+
+def strip_thinking(text: str) -> str:
+    """
+    Remove <think> (or <thinking>, <reasoning>) blocks from a response.
+
+    A response that is nothing but reasoning is returned unchanged, since
+    that is all the model said.
+    """
+    if not STRIP_THINKING or not text or "<" not in text:
+        return text
+    stripped = _THINK_RE.sub("", text)
+    if "</" in stripped:
+        stripped = _ORPHAN_THINK_RE.sub("", stripped, count=1)
+    return stripped.strip() or text
+
+
+def condense(text: str, max_tokens: int) -> str:
+    """
+    Shorten a text to about max_tokens, keeping its beginning and its end.
+
+    Conclusions tend to sit at the end of an answer, so a third of the budget
+    goes to the tail; the cut points snap to nearby line or word breaks and
+    the gap is marked. The result never exceeds max_tokens: where the kept
+    parts are denser than average (accents, CJK), they are cut further.
+
+    Args:
+        text: The text to shorten
+        max_tokens: Token budget for the result
+
+    Returns:
+        The text itself if it already fits, else the condensed text
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    marker = "\n\n[... about {} tokens omitted ...]\n\n"
+    keep_chars = max(0, int((max_tokens - estimate_tokens(marker.format(tokens))) * len(text) / tokens))
+    while keep_chars >= 40:
+        head = text[:_break_before(text, keep_chars * 2 // 3)].rstrip()
+        tail = text[_break_after(text, len(text) - keep_chars // 3):].lstrip()
+        omitted = tokens - estimate_tokens(head) - estimate_tokens(tail)
+        condensed = f"{head}{marker.format(omitted)}{tail}"
+        excess = estimate_tokens(condensed) - max_tokens
+        if excess <= 0:
+            return condensed
+        keep_chars -= math.ceil(excess * CHARS_PER_TOKEN)
+
+    end = max(1, int(max_tokens * len(text) / tokens))
+    while end > 1 and estimate_tokens(text[:end].rstrip()) > max_tokens:
+        end -= max(1, int((estimate_tokens(text[:end]) - max_tokens) * CHARS_PER_TOKEN) // 2)
+    return text[:end].rstrip()
+
+
+def _break_before(text: str, index: int) -> int:
+    """A line or word break at most a little before index."""
+    window = max(0, index - 200)
+    for separator in ("\n", " "):
+        found = text.rfind(separator, window, index)
+        if found > 0:
+            return found
+    return index
+
+
+def _break_after(text: str, index: int) -> int:
+    """A line or word break at most a little after index."""
+    window = min(len(text), index + 200)
+    for separator in ("\n", " "):
+        found = text.find(separator, index, window)
+        if found >= 0:
+            return found + 1
+    return index
+
+
+def fit_texts(texts: Sequence[str], total_tokens: Optional[int], caps: Sequence[int]) -> List[str]:
+    """
+    Condense texts so each fits its cap and all of them fit a shared total.
+
+    The total is shared out fairly: texts shorter than an equal share keep
+    their full length and the rest divide what is left.
+
+    Args:
+        texts: The texts (already stripped of reasoning)
+        total_tokens: Budget for all texts together (None = no total)
+        caps: Budget per text, matching texts (0 = no cap)
+
+    Returns:
+        The texts, condensed where needed, in the same order
+    """
+    sizes = [estimate_tokens(text) for text in texts]
+    wants = [min(size, cap) if cap > 0 else size for size, cap in zip(sizes, caps)]
+    allotted = list(wants)
+    if total_tokens is not None and sum(wants) > total_tokens:
+        remaining = max(0, total_tokens)
+        order = sorted(range(len(texts)), key=wants.__getitem__)
+        for position, i in enumerate(order):
+            allotted[i] = min(wants[i], remaining // (len(texts) - position))
+            remaining -= allotted[i]
+    return [
+        text if size <= allotment else condense(text, allotment)
+        for text, size, allotment in zip(texts, sizes, allotted)
+    ]
+
+
+def context_limit(model: str) -> int:
+    """Context window of a model: MODEL_CONTEXT_TOKENS, its provider's, or the default."""
+    if model in MODEL_CONTEXT_TOKENS:
+        return int(MODEL_CONTEXT_TOKENS[model])
+    provider, _ = resolve(model)
+    return provider.context_tokens or DEFAULT_CONTEXT_TOKENS
+
+
+def prompt_budget(model: str) -> int:
+    """Tokens a prompt to this model may take, leaving room for the answer."""
+    return max(0, context_limit(model) - RESPONSE_RESERVE_TOKENS)
+
+
+def estimate_messages(messages: List[Dict[str, str]]) -> int:
+    """Estimated prompt tokens of a chat message list."""
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def fit_messages(messages: List[Dict[str, str]], max_tokens: int) -> List[Dict[str, str]]:
+    """
+    Trim a chat prompt to max_tokens by condensing its longest messages.
+
+    Args:
+        messages: Message dicts with 'role' and 'content'
+        max_tokens: Prompt budget (see prompt_budget)
+
+    Returns:
+        The messages unchanged if they fit, otherwise trimmed copies
+    """
+    excess = estimate_messages(messages) - max_tokens
+    if excess <= 0:
+        return messages
+    contents = [m.get("content") or "" for m in messages]
+    overhead = MESSAGE_OVERHEAD_TOKENS * len(messages)
+    fitted = fit_texts(contents, max_tokens - overhead, [0] * len(contents))
+    return [
+        message if content is original else {**message, "content": content}
+        for message, content, original in zip(messages, fitted, contents)
+    ]
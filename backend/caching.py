@@ -0,0 +1,94 @@
+"""ETag / Last-Modified helpers for conditional GET requests."""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Dict, Any, Optional
+
+from fastapi import Request
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a stored (naive UTC) ISO timestamp, truncated to whole seconds."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.replace(microsecond=0)
+
+
+def conversation_validators(conversation: Dict[str, Any]):
+    """
+    Build the ETag and Last-Modified time of a conversation.
+
+    The ETag is weak because the same version may be sent with different
+    content encodings.
+
+    Returns:
+        Tuple of (etag, last_modified datetime or None)
+    """
+    etag = f'W/"{conversation["id"]}-{conversation.get("version", 0)}"'
+    last_modified = _parse_timestamp(conversation.get("updated_at") or conversation.get("created_at"))
+    return etag, last_modified
+
+
+def list_validators(conversations: List[Dict[str, Any]]):
+    """
+    Build the ETag and Last-Modified time of the conversation list.
+
+    The ETag hashes every entry's id and version, so it changes whenever a
+    conversation is created, updated or deleted.
+
+    Returns:
+        Tuple of (etag, last_modified datetime or None)
+    """
+    digest = hashlib.sha1()
+    for conversation in conversations:
+        digest.update(f'{conversation["id"]}:{conversation.get("version", 0)};'.encode())
+    etag = f'W/"list-{digest.hexdigest()[:20]}"'
+
+    timestamps = [
+        _parse_timestamp(c.get("updated_at") or c.get("created_at"))
+        for c in conversations
+    ]
+    timestamps = [t for t in timestamps if t is not None]
+    return etag, max(timestamps) if timestamps else None
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    """Response headers that let clients revalidate on every request."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since against the current validators.
+
+    If-None-Match takes precedence when present, as required by RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: ignore the W/ prefix on both sides
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+
+    return False
@@ -0,0 +1,174 @@
+"""Gzip/brotli response compression that keeps SSE streams flushed per event."""
+
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Optional brotli support - gzip is used when it is not installed
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best supported encoding from an Accept-Encoding header.
+
+    Args:
+        accept_encoding: Raw header value
+
+    Returns:
+        "br", "gzip" or None
+    """
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(coding.strip().lower())
+
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _StreamCompressor:
+    """Incremental compressor where every chunk is flushed to the client."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk and flush it, so it can be decoded on arrival."""
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """Terminate the compressed stream."""
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses JSON, NDJSON and text responses.
+
+    Unlike a whole-body compressor, streamed responses (including SSE) are
+    compressed chunk by chunk with a sync flush after each one, so every
+    event still reaches the client as soon as it is yielded.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    """Wraps `send` for a single response."""
+
+    def __init__(self, send: Send, encoding: str, config: CompressionMiddleware):
+        self._send = send
+        self._encoding = encoding
+        self._config = config
+        self._start: Optional[Message] = None
+        self._compressor: Optional[_StreamCompressor] = None
+        self._started = False
+
+    @staticmethod
+    def _is_compressible(headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until we know whether the body gets compressed
+            self._start = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self._started:
+            self._started = True
+            headers = MutableHeaders(raw=self._start["headers"])
+            if not self._is_compressible(headers) or (not more_body and len(body) < self._config.minimum_size):
+                await self._send(self._start)
+                await self._send(message)
+                return
+
+            self._compressor = _StreamCompressor(
+                self._encoding, self._config.gzip_level, self._config.brotli_quality
+            )
+            headers["Content-Encoding"] = self._encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                data = self._compressor.compress(body) + self._compressor.finish()
+                headers["Content-Length"] = str(len(data))
+                await self._send(self._start)
+                await self._send({"type": "http.response.body", "body": data})
+                return
+
+            # Streaming: length is unknown once compressed
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self._send(self._start)
+            await self._send({
+                "type": "http.response.body",
+                "body": self._compressor.compress(body),
+                "more_body": True,
+            })
+            return
+
+        if self._compressor is None:
+            await self._send(message)
+            return
+
+        data = self._compressor.compress(body) if body else b""
+        if not more_body:
+            data += self._compressor.finish()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
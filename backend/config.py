@@ -1,5 +1,6 @@
 """Configuration for the LLM Council."""
 
+import json
 import os
 from dotenv import load_dotenv
 
@@ -7,6 +8,17 @@ load_dotenv()
 
 # OpenRouter API key
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# Several OpenRouter keys to spread requests over (comma-separated, used
+# instead of OPENROUTER_API_KEY), with optional weights in the same order
+OPENROUTER_API_KEYS = [k.strip() for k in os.getenv("OPENROUTER_API_KEYS", "").split(",") if k.strip()]
+OPENROUTER_KEY_WEIGHTS = [int(w) for w in os.getenv("OPENROUTER_KEY_WEIGHTS", "").split(",") if w.strip()]
+# How a provider with several keys picks one: "round_robin" (weighted) or
+# "least_loaded" (fewest in-flight requests per unit of weight)
+KEY_SELECTION = os.getenv("KEY_SELECTION", "round_robin").lower()
+# A key answering 401/402/429 sits out KEY_QUARANTINE_SECONDS (or the
+# Retry-After time), doubling per repeated failure up to the maximum
+KEY_QUARANTINE_SECONDS = float(os.getenv("KEY_QUARANTINE_SECONDS", "30"))
+KEY_QUARANTINE_MAX_SECONDS = float(os.getenv("KEY_QUARANTINE_MAX_SECONDS", "900"))
 
 # Paid Models
 COUNCIL_MODELS = [
@@ -34,12 +46,168 @@ COUNCIL_MODELS = [
 # Chairman model - synthesizes final response (using a free model)
 CHAIRMAN_MODEL = "google/gemini-2.5-flash"
 
-# OpenRouter API endpoint
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+# OpenRouter API endpoint (overridable, e.g. to point at a local stand-in)
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Extra model providers: OpenAI-compatible servers such as llama.cpp or vLLM,
+# as JSON {"name": {"base_url": ..., "api_key" or "api_key_env" or "api_keys": [...],
+# "headers": {...}, "timeout": ..., "connect_timeout": ..., "max_connections": ...,
+# "context_tokens": ...}}.
+# A model written "name:model" in COUNCIL_MODELS or CHAIRMAN_MODEL is served by
+# that provider; every other model goes to OpenRouter.
+PROVIDERS = json.loads(os.getenv("PROVIDERS", "{}"))
 
 # Data directory for conversation storage
 DATA_DIR = "data/conversations"
 
+# On-disk format for new conversation writes: "json" or "msgpack"
+# (legacy .json files are always readable)
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "json")
+
+# Log of deleted conversations, read by list deltas (GET /api/conversations/delta)
+DELETIONS_LOG = os.getenv("DELETIONS_LOG", "data/deletions.ndjson")
+# Deletions are kept this long; clients syncing from an older cursor get the full list
+DELETIONS_RETENTION_DAYS = float(os.getenv("DELETIONS_RETENTION_DAYS", "30"))
+
+# Lock files coordinating workers (and hosts) that share the data directory
+LOCK_DIR = os.getenv("LOCK_DIR", "data/locks")
+
+# Archive of cold conversations packed into memory-mapped segment files
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+# Conversations not modified for this many days are moved by the compaction job
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+# Start a new segment once the active one would exceed this size
+ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv("ARCHIVE_SEGMENT_MAX_BYTES", str(256 * 1024 * 1024)))
+# Compaction rewrites segments at least this fraction dead (conversations
+# deleted or written to again since they were archived)
+ARCHIVE_RECLAIM_DEAD_FRACTION = float(os.getenv("ARCHIVE_RECLAIM_DEAD_FRACTION", "0.5"))
+
+# Admission control: council runs executing at once, and how many may wait
+COUNCIL_MAX_CONCURRENT = int(os.getenv("COUNCIL_MAX_CONCURRENT", "4"))
+COUNCIL_MAX_QUEUE = int(os.getenv("COUNCIL_MAX_QUEUE", "32"))
+# Enforce COUNCIL_MAX_CONCURRENT across all workers sharing LOCK_DIR,
+# rather than per process
+COUNCIL_SHARED_LIMITS = os.getenv("COUNCIL_SHARED_LIMITS", "true").lower() == "true"
+# Admit queued runs round-robin across clients instead of strictly FIFO
+COUNCIL_FAIR_QUEUE = os.getenv("COUNCIL_FAIR_QUEUE", "true").lower() == "true"
+
+# Titles: new conversations get an instant keyword title; with LLM_TITLES
+# on, TITLE_MODEL replaces it in the background once it answers
+LLM_TITLES = os.getenv("LLM_TITLES", "false").lower() == "true"
+TITLE_MODEL = os.getenv("TITLE_MODEL", "nvidia/nemotron-nano-12b-v2-vl:free")
+
+# Near-duplicate cache: answered questions are indexed (MinHash/LSH) in
+# SEMANTIC_CACHE_PATH. With SEMANTIC_CACHE on, a question at least
+# SEMANTIC_CACHE_THRESHOLD similar (Jaccard) to an earlier one gets that
+# answer at once, and with SEMANTIC_CACHE_REFRESH a fresh council run
+# replaces it in the background. Requests can override both; answers are
+# only added to the cache while SEMANTIC_CACHE is on.
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "data/semantic_cache.db")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+SEMANTIC_CACHE_REFRESH = os.getenv("SEMANTIC_CACHE_REFRESH", "true").lower() == "true"
+
+# Default council mode for a message: "full", "speculative" (the chairman
+# drafts during stage 2), "lite" (fewer members, no stage 2) or "solo"
+# (chairman only); requests may pick another
+COUNCIL_MODE = os.getenv("COUNCIL_MODE", "full").lower()
+# Members that answer in lite mode (the first N of COUNCIL_MODELS)
+LITE_COUNCIL_SIZE = int(os.getenv("LITE_COUNCIL_SIZE", "3"))
+
+# Token budgets for what earlier stages pass on (0 = unlimited): each stage 1
+# response in a ranking prompt, and each response / ranking in the chairman
+# prompt. Longer texts are condensed to their beginning and end.
+STAGE2_RESPONSE_TOKENS = int(os.getenv("STAGE2_RESPONSE_TOKENS", "1500"))
+STAGE3_RESPONSE_TOKENS = int(os.getenv("STAGE3_RESPONSE_TOKENS", "2000"))
+STAGE3_RANKING_TOKENS = int(os.getenv("STAGE3_RANKING_TOKENS", "800"))
+# Drop <think> blocks of reasoning models before passing responses on
+STRIP_THINKING = os.getenv("STRIP_THINKING", "true").lower() == "true"
+# Context window per model, as JSON {"model": tokens}; models not listed use
+# their provider's "context_tokens", else DEFAULT_CONTEXT_TOKENS. Prompts are
+# trimmed to fit, leaving RESPONSE_RESERVE_TOKENS for the answer.
+MODEL_CONTEXT_TOKENS = json.loads(os.getenv("MODEL_CONTEXT_TOKENS", "{}"))
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("DEFAULT_CONTEXT_TOKENS", "32768"))
+RESPONSE_RESERVE_TOKENS = int(os.getenv("RESPONSE_RESERVE_TOKENS", "2048"))
+
+# Adaptive upstream timeouts: latency is recorded per model and stage, and
+# once there are LATENCY_MIN_SAMPLES samples, a call's deadline becomes the
+# LATENCY_TIMEOUT_QUANTILE latency times LATENCY_TIMEOUT_FACTOR, kept between
+# the floor and ceiling (the provider's fixed timeout applies until then).
+# Connecting has its own deadline, the provider's connect_timeout.
+ADAPTIVE_TIMEOUTS = os.getenv("ADAPTIVE_TIMEOUTS", "true").lower() == "true"
+LATENCY_TIMEOUT_QUANTILE = float(os.getenv("LATENCY_TIMEOUT_QUANTILE", "0.99"))
+LATENCY_TIMEOUT_FACTOR = float(os.getenv("LATENCY_TIMEOUT_FACTOR", "2.0"))
+LATENCY_TIMEOUT_FLOOR = float(os.getenv("LATENCY_TIMEOUT_FLOOR", "10"))
+LATENCY_TIMEOUT_CEILING = float(os.getenv("LATENCY_TIMEOUT_CEILING", "300"))
+LATENCY_MIN_SAMPLES = int(os.getenv("LATENCY_MIN_SAMPLES", "20"))
+# Latency histograms survive restarts in this file
+LATENCY_STATS_PATH = os.getenv("LATENCY_STATS_PATH", "data/latency.json")
+
+# Upstream call scheduling (per worker): calls in flight at once (0 = no
+# limit), slots kept for interactive calls, weighted fair queuing shares of
+# the "interactive", "background" (titles, cache refreshes) and "batch"
+# classes, and the wait after which a queued call goes next regardless
+UPSTREAM_MAX_CONCURRENT = int(os.getenv("UPSTREAM_MAX_CONCURRENT", "24"))
+UPSTREAM_INTERACTIVE_RESERVED = int(os.getenv("UPSTREAM_INTERACTIVE_RESERVED", "6"))
+UPSTREAM_CLASS_WEIGHTS = json.loads(
+    os.getenv("UPSTREAM_CLASS_WEIGHTS", '{"interactive": 8, "background": 2, "batch": 1}')
+)
+UPSTREAM_MAX_WAIT_SECONDS = float(os.getenv("UPSTREAM_MAX_WAIT_SECONDS", "20"))
+
+# Ask stage 2 rankers for JSON-schema structured output instead of the
+# "FINAL RANKING:" text convention (free-text answers are still parsed)
+RANKING_STRUCTURED_OUTPUT = os.getenv("RANKING_STRUCTURED_OUTPUT", "false").lower() == "true"
+
+# When a streaming client disconnects mid-run: "cancel" stops the in-flight
+# upstream calls, "finish" completes and saves the run in the background
+DISCONNECT_POLICY = os.getenv("DISCONNECT_POLICY", "cancel").lower()
+# How often an idle stream checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1.0"))
+
+# Span tracing of council runs (stages, upstream calls, storage, SSE writes)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Where finished traces go: "none", "file" (OTLP JSON lines) or "otlp" (OTLP/HTTP)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "data/traces.ndjson")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+# Recent traces kept in memory per worker for /api/debug/traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+# Default threshold for a "slow" trace in milliseconds
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "30000"))
+
+# Admin diagnostics under /api/debug/ (event-loop lag and stalls, tracemalloc
+# snapshots); off unless DIAGNOSTICS is on, and with DIAGNOSTICS_TOKEN set a
+# request must send it in the X-Admin-Token header
+DIAGNOSTICS = os.getenv("DIAGNOSTICS", "false").lower() == "true"
+DIAGNOSTICS_TOKEN = os.getenv("DIAGNOSTICS_TOKEN", "")
+# How often the event loop is probed, and how long it may be blocked before
+# the blocking stack is logged
+LOOP_PROBE_INTERVAL_SECONDS = float(os.getenv("LOOP_PROBE_INTERVAL_SECONDS", "0.25"))
+LOOP_STALL_MS = float(os.getenv("LOOP_STALL_MS", "100"))
+# Frames kept per allocation once memory tracing starts
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+
+# Browser origins allowed to call the API (CORS) and to open the WebSocket
+# (comma-separated)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:3000").split(",")
+    if origin.strip()
+]
+
+# Compress JSON/text responses (gzip, or brotli when installed), SSE included
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true"
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+
+# Number of uvicorn worker processes for the backend
+BACKEND_WORKERS = int(os.getenv("BACKEND_WORKERS", "1"))
+
+# Full-text search index (SQLite FTS5)
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "data/search.db")
+# Also index individual council member (stage 1) responses
+SEARCH_INDEX_STAGE1 = os.getenv("SEARCH_INDEX_STAGE1", "true").lower() == "true"
+
 
 # Mapping from model index to Sheldon personality name
 COUNCIL_SHELDON_NAMES = [
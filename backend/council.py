@@ -2,8 +2,45 @@
 
 from typing import List, Dict, Any, Tuple, Optional
 import asyncio
-from .openrouter import query_models_parallel, query_model
-from .config import COUNCIL_MODELS, CHAIRMAN_MODEL, COUNCIL_CONTEXT, COUNCIL_SHELDON_NAMES, SHELDON_CONTEXT
+import json
+import re
+import time
+from .budget import estimate_tokens, fit_texts, prompt_budget, strip_thinking
+from .openrouter import query_model
+from .config import (
+    COUNCIL_MODELS,
+    CHAIRMAN_MODEL,
+    COUNCIL_CONTEXT,
+    COUNCIL_MODE,
+    COUNCIL_SHELDON_NAMES,
+    LITE_COUNCIL_SIZE,
+    RANKING_STRUCTURED_OUTPUT,
+    SHELDON_CONTEXT,
+    STAGE2_RESPONSE_TOKENS,
+    STAGE3_RANKING_TOKENS,
+    STAGE3_RESPONSE_TOKENS,
+    TITLE_MODEL,
+)
+from .ranking import (
+    METHOD_JSON,
+    average_positions,
+    flatten,
+    format_ranking,
+    parse_ranking,
+    ranking_response_format,
+    record_parse,
+)
+from .tracing import traced
+
+# Council modes, from most thorough to fastest
+MODE_FULL = "full"                # all members, peer rankings, then synthesis
+MODE_SPECULATIVE = "speculative"  # chairman drafts during stage 2, revises if the rankings disagree
+MODE_LITE = "lite"                # the first LITE_COUNCIL_SIZE members, no stage 2
+MODE_SOLO = "solo"                # the chairman answers alone
+COUNCIL_MODES = (MODE_FULL, MODE_SPECULATIVE, MODE_LITE, MODE_SOLO)
+
+# Line the chairman ends a speculative draft with, naming the response it relied on most
+_RELIED_ON_RE = re.compile(r"\n[ \t*_]*MOST RELIED ON:[ \t*_]*(.+?)[ \t*_]*$", re.IGNORECASE)
 
 
 def get_sheldon_context_for_model(model_index: int) -> Tuple[Optional[str], str]:
@@ -25,83 +62,136 @@ def get_sheldon_context_for_model(model_index: int) -> Tuple[Optional[str], str]
     return sheldon_name, context
 
 
-async def stage1_collect_responses(user_query: str, progress_callback=None) -> List[Dict[str, Any]]:
+def validate_council_config():
+    """
+    Ensure every council model has a matching Sheldon personality.
+
+    Raises:
+        ValueError: If COUNCIL_MODELS and COUNCIL_SHELDON_NAMES differ in length
+    """
+    if len(COUNCIL_MODELS) != len(COUNCIL_SHELDON_NAMES):
+        raise ValueError(
+            f"Mismatch: {len(COUNCIL_MODELS)} models but {len(COUNCIL_SHELDON_NAMES)} Sheldon names. "
+            "Each model must have a corresponding Sheldon personality."
+        )
+
+
+def resolve_mode(mode: Optional[str]) -> str:
+    """
+    Validate a requested council mode, defaulting to COUNCIL_MODE.
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    mode = (mode or COUNCIL_MODE).lower()
+    if mode not in COUNCIL_MODES:
+        raise ValueError(f"Unknown council mode {mode!r} (allowed: {', '.join(COUNCIL_MODES)})")
+    return mode
+
+
+def council_members(mode: str) -> List[int]:
+    """Indices of the COUNCIL_MODELS members that answer in stage 1 for a mode."""
+    if mode == MODE_SOLO:
+        return []
+    if mode == MODE_LITE:
+        return list(range(min(LITE_COUNCIL_SIZE, len(COUNCIL_MODELS))))
+    return list(range(len(COUNCIL_MODELS)))
+
+
+@traced("stage1.member")
+async def stage1_query_member(user_query: str, model_index: int) -> Dict[str, Any]:
+    """
+    Stage 1 for a single council member: query one model with its Sheldon context.
+
+    Args:
+        user_query: The user's question
+        model_index: Index of the member in COUNCIL_MODELS
+
+    Returns:
+        Dict with 'model', 'sheldon_name' and 'response' keys (an error
+        message as the response if the model failed)
+    """
+    model = COUNCIL_MODELS[model_index]
+    sheldon_name, context = get_sheldon_context_for_model(model_index)
+
+    # Build messages with context as system message, then user query
+    messages = []
+    if context:
+        messages.append({
+            "role": "system",
+            "content": f"You are {sheldon_name}: {context}\n\nAnswer the following question in character, embodying this Sheldon personality."
+        })
+    messages.append({"role": "user", "content": user_query})
+
+    response = await query_model(model, messages, stage="stage1")
+
+    if response is not None and response.get('error') is None:
+        # Successful response
+        return {
+            "model": model,
+            "sheldon_name": sheldon_name,
+            "response": response.get('content', '')
+        }
+
+    # Failed response - include with error message so tab still shows
+    error_msg = response.get('error', 'Unknown error') if response else 'No response received'
+    return {
+        "model": model,
+        "sheldon_name": sheldon_name,
+        "response": f"*Error: {error_msg}*"
+    }
+
+
+@traced("stage1")
+async def stage1_collect_responses(
+    user_query: str,
+    progress_callback=None,
+    members: Optional[List[int]] = None
+) -> List[Dict[str, Any]]:
     """
     Stage 1: Collect individual responses from all council models.
 
     Args:
         user_query: The user's question
         progress_callback: Optional callback function(completed, total) called as agents respond
+        members: Indices of the members to ask (defaults to all of them)
 
     Returns:
         List of dicts with 'model' and 'response' keys
     """
     # Validate configuration: ensure we have matching counts
-    if len(COUNCIL_MODELS) != len(COUNCIL_SHELDON_NAMES):
-        raise ValueError(
-            f"Mismatch: {len(COUNCIL_MODELS)} models but {len(COUNCIL_SHELDON_NAMES)} Sheldon names. "
-            "Each model must have a corresponding Sheldon personality."
-        )
-    
-    total_agents = len(COUNCIL_MODELS)
+    validate_council_config()
+
+    if members is None:
+        members = list(range(len(COUNCIL_MODELS)))
+    total_agents = len(members)
     completed_count = 0
-    
-    # Build messages with Sheldon context for each model
-    async def query_with_context(model: str, model_index: int) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
-        """Query a single model with its corresponding Sheldon context."""
+
+    async def query_with_progress(model_index: int) -> Dict[str, Any]:
+        """Query a single member and report progress."""
         nonlocal completed_count
-        sheldon_name, context = get_sheldon_context_for_model(model_index)
-        
-        # Build messages with context as system message, then user query
-        messages = []
-        if context:
-            messages.append({
-                "role": "system",
-                "content": f"You are {sheldon_name}: {context}\n\nAnswer the following question in character, embodying this Sheldon personality."
-            })
-        messages.append({"role": "user", "content": user_query})
-        
-        response = await query_model(model, messages)
+        result = await stage1_query_member(user_query, model_index)
         completed_count += 1
         if progress_callback:
             progress_callback(completed_count, total_agents)
-        return model, response, sheldon_name
+        return result
 
     # Query all models in parallel with their individual contexts
-    # This ensures all 5 Sheldons are queried: Science, Texas, Fanboy, Germaphobe, Humorous
-    tasks = [
-        query_with_context(model, idx)
-        for idx, model in enumerate(COUNCIL_MODELS)
-    ]
-    responses_list = await asyncio.gather(*tasks)
-
-    # Format results with Sheldon names, preserving order
-    # Include all models, even if they failed (so all 5 tabs show in frontend)
-    stage1_results = []
-    for model, response, sheldon_name in responses_list:
-        if response is not None and response.get('error') is None:
-            # Successful response
-            stage1_results.append({
-                "model": model,
-                "sheldon_name": sheldon_name,
-                "response": response.get('content', '')
-            })
-        else:
-            # Failed response - include with error message so tab still shows
-            error_msg = response.get('error', 'Unknown error') if response else 'No response received'
-            stage1_results.append({
-                "model": model,
-                "sheldon_name": sheldon_name,
-                "response": f"*Error: {error_msg}*"
-            })
-
-    return stage1_results
+    # Include all models, even if they failed (so all tabs show in frontend),
+    # preserving order
+    return list(await asyncio.gather(*[
+        query_with_progress(idx)
+        for idx in members
+    ]))
 
 
+@traced("stage2")
 async def stage2_collect_rankings(
     user_query: str,
     stage1_results: List[Dict[str, Any]],
-    progress_callback=None
+    progress_callback=None,
+    structured: Optional[bool] = None,
+    rankers: Optional[List[int]] = None
 ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
     """
     Stage 2: Each model ranks the anonymized responses.
@@ -109,10 +199,15 @@ async def stage2_collect_rankings(
     Args:
         user_query: The original user query
         stage1_results: Results from Stage 1
+        structured: Request JSON-schema structured rankings (defaults to
+            RANKING_STRUCTURED_OUTPUT); free-text answers are still parsed
+        rankers: Indices of the COUNCIL_MODELS members who rank (defaults to all)
 
     Returns:
         Tuple of (rankings list, label_to_model mapping)
     """
+    if structured is None:
+        structured = RANKING_STRUCTURED_OUTPUT
     # Create anonymized labels for responses (Response A, Response B, etc.)
     labels = [chr(65 + i) for i in range(len(stage1_results))]  # A, B, C, ...
 
@@ -122,17 +217,52 @@ async def stage2_collect_rankings(
         for label, result in zip(labels, stage1_results)
     }
 
-    # Build the ranking prompt with Sheldon context for each response
-    responses_text_parts = []
-    for label, result in zip(labels, stage1_results):
-        sheldon_name = result.get('sheldon_name', 'Unknown')
-        response_content = result['response']
-        responses_text_parts.append(
-            f"Response {label} (from {sheldon_name}):\n{response_content}"
-        )
-    responses_text = "\n\n".join(responses_text_parts)
+    # Rankers see each response without its reasoning trace, condensed to
+    # STAGE2_RESPONSE_TOKENS and to what fits their context
+    answers = [strip_thinking(result['response']) for result in stage1_results]
+    headers = [
+        f"Response {label} (from {result.get('sheldon_name', 'Unknown')}):\n"
+        for label, result in zip(labels, stage1_results)
+    ]
+    responses_texts: Dict[int, str] = {}
+
+    def responses_text_within(total_tokens: int) -> str:
+        """The labeled responses, fitted to total_tokens (shared by rankers with the same budget)."""
+        if total_tokens not in responses_texts:
+            fitted = fit_texts(answers, total_tokens, [STAGE2_RESPONSE_TOKENS] * len(answers))
+            responses_texts[total_tokens] = "\n\n".join(
+                header + text for header, text in zip(headers, fitted)
+            )
+        return responses_texts[total_tokens]
+
+    if structured:
+        response_format = ranking_response_format(list(label_to_model))
+        format_instructions = """IMPORTANT: Reply with a JSON object only, with two fields:
+- "evaluation": your evaluation of each response, as text
+- "ranking": every response from best to worst, as objects like {"response": "Response C", "rank": 1}.
+  Responses you consider equally good share the same rank."""
+    else:
+        response_format = None
+        format_instructions = """IMPORTANT: Your final ranking MUST be formatted EXACTLY as follows:
+- Start with the line "FINAL RANKING:" (all caps, with colon)
+- Then list the responses from best to worst as a numbered list
+- Each line should be: number, period, space, then ONLY the response label (e.g., "1. Response A")
+- Do not add any other text or explanations in the ranking section
+
+Example of the correct format for your ENTIRE response:
+
+Response A provides good detail on X but misses Y...
+Response B is accurate but lacks depth on Z...
+Response C offers the most comprehensive answer...
+
+FINAL RANKING:
+1. Response C
+2. Response A
+3. Response B"""
 
-    total_agents = len(COUNCIL_MODELS)
+    if rankers is None:
+        rankers = list(range(len(COUNCIL_MODELS)))
+    total_agents = len(rankers)
     completed_count = 0
     
     # Build ranking prompts with Sheldon context for each model
@@ -140,8 +270,9 @@ async def stage2_collect_rankings(
         """Query a model for ranking with its corresponding Sheldon context."""
         nonlocal completed_count
         sheldon_name, context = get_sheldon_context_for_model(model_index)
-        
-        ranking_prompt = f"""
+
+        def ranking_prompt(responses_text: str) -> str:
+            return f"""
 You are {sheldon_name} from Sheldon Cooper's Council of Sheldons.
 
 {context}
@@ -158,28 +289,16 @@ Your task:
 1. First, evaluate each response individually from your {sheldon_name} perspective.
 2. Then, at the very end of your response, provide a final ranking.
 
-IMPORTANT: Your final ranking MUST be formatted EXACTLY as follows:
-- Start with the line "FINAL RANKING:" (all caps, with colon)
-- Then list the responses from best to worst as a numbered list
-- Each line should be: number, period, space, then ONLY the response label (e.g., "1. Response A")
-- Do not add any other text or explanations in the ranking section
-
-Example of the correct format for your ENTIRE response:
-
-Response A provides good detail on X but misses Y...
-Response B is accurate but lacks depth on Z...
-Response C offers the most comprehensive answer...
-
-FINAL RANKING:
-1. Response C
-2. Response A
-3. Response B
+{format_instructions}
 
 Now provide your evaluation and ranking from your {sheldon_name} perspective:
 
 """
-        messages = [{"role": "user", "content": ranking_prompt}]
-        response = await query_model(model, messages)
+
+        overhead = estimate_tokens(ranking_prompt("")) + sum(estimate_tokens(h) + 1 for h in headers)
+        prompt = ranking_prompt(responses_text_within(prompt_budget(model) - overhead))
+        messages = [{"role": "user", "content": prompt}]
+        response = await query_model(model, messages, response_format=response_format, stage="stage2")
         completed_count += 1
         if progress_callback:
             progress_callback(completed_count, total_agents)
@@ -187,8 +306,8 @@ Now provide your evaluation and ranking from your {sheldon_name} perspective:
 
     # Query all models for rankings in parallel with their individual contexts
     ranking_tasks = [
-        query_ranking_with_context(model, idx)
-        for idx, model in enumerate(COUNCIL_MODELS)
+        query_ranking_with_context(COUNCIL_MODELS[idx], idx)
+        for idx in rankers
     ]
     ranking_responses = await asyncio.gather(*ranking_tasks)
 
@@ -198,13 +317,19 @@ Now provide your evaluation and ranking from your {sheldon_name} perspective:
         
         if response is not None and response.get('error') is None:
             # Successful response
-            full_text = response.get('content', '')
-            parsed = parse_ranking_from_text(full_text)
+            full_text = response.get('content') or ''
+            parsed = parse_ranking(full_text, label_to_model)
+            record_parse(model, parsed['method'])
+            if parsed['method'] == METHOD_JSON:
+                # Show structured answers in the usual text layout
+                full_text = f"{_json_evaluation(full_text)}\n\n{format_ranking(parsed['groups'])}".strip()
             stage2_results.append({
                 "model": model,
                 "sheldon_name": sheldon_name,
                 "ranking": full_text,
-                "parsed_ranking": parsed
+                "parsed_ranking": flatten(parsed['groups']),
+                "parsed_groups": parsed['groups'],
+                "parse_method": parsed['method']
             })
         else:
             # Failed response - include with error message so tab still shows
@@ -213,16 +338,22 @@ Now provide your evaluation and ranking from your {sheldon_name} perspective:
                 "model": model,
                 "sheldon_name": sheldon_name,
                 "ranking": f"*Error: {error_msg}*",
-                "parsed_ranking": []
+                "parsed_ranking": [],
+                "parsed_groups": [],
+                "parse_method": None
             })
 
     return stage2_results, label_to_model
 
 
+@traced("stage3")
 async def stage3_synthesize_final(
     user_query: str,
     stage1_results: List[Dict[str, Any]],
-    stage2_results: List[Dict[str, Any]]
+    stage2_results: List[Dict[str, Any]],
+    chairman_model: Optional[str] = None,
+    draft: Optional[str] = None,
+    speculative: bool = False
 ) -> Dict[str, Any]:
     """
     Stage 3: Chairman synthesizes final response.
@@ -230,23 +361,41 @@ async def stage3_synthesize_final(
     Args:
         user_query: The original user query
         stage1_results: Individual model responses from Stage 1
-        stage2_results: Rankings from Stage 2
+        stage2_results: Rankings from Stage 2 (may be empty)
+        chairman_model: Model to synthesize with (defaults to CHAIRMAN_MODEL)
+        draft: An earlier answer written before the rankings were in, to revise
+        speculative: Ask the chairman to name the response it relied on most,
+            returned as 'relied_on' (see drafts_agree)
 
     Returns:
         Dict with 'model' and 'response' keys
     """
-    # Build comprehensive context for chairman
-    stage1_text = "\n\n".join([
-        f"Model: {result['model']}\nResponse: {result['response']}"
-        for result in stage1_results
-    ])
-
-    stage2_text = "\n\n".join([
-        f"Model: {result['model']}\nRanking: {result['ranking']}"
-        for result in stage2_results
-    ])
-
-    chairman_prompt = f"""
+    chairman_model = chairman_model or CHAIRMAN_MODEL
+
+    # Build comprehensive context for chairman, without reasoning traces and
+    # within the stage 3 budgets and the chairman's context
+    response_headers = [f"Model: {result['model']}\nResponse: " for result in stage1_results]
+    ranking_headers = [f"Model: {result['model']}\nRanking: " for result in stage2_results]
+    texts = [strip_thinking(result['response']) for result in stage1_results]
+    texts += [strip_thinking(result['ranking']) for result in stage2_results]
+    caps = [STAGE3_RESPONSE_TOKENS] * len(stage1_results) + [STAGE3_RANKING_TOKENS] * len(stage2_results)
+
+    extra_instructions = ""
+    if draft:
+        extra_instructions += f"""
+**Your Earlier Draft** (written before the peer rankings were in):
+{draft}
+
+Revise this draft so it reflects the peer rankings above, keeping what still holds.
+"""
+    if speculative:
+        extra_instructions += """
+After your answer, add one final line in exactly this form, naming the model whose response you relied on most:
+MOST RELIED ON: <model>
+"""
+
+    def chairman_prompt_with(stage1_text: str, stage2_text: str) -> str:
+        return f"""
 You are Chairman Sheldon Cooper, presiding over the Council of Sheldons—a synthesis of your various intellectual facets working in concert to provide the most comprehensive answer possible.
 
 {SHELDON_CONTEXT}
@@ -285,60 +434,135 @@ Synthesize the above information into a coherent, comprehensive final answer. Yo
 
 **Format:** Write your response as a first-person monologue delivered directly to the user, as if you're speaking to them in person. Aim for 200-400 words—comprehensive but not rambling. The tone should be intellectually rigorous yet entertaining, with Sheldon's characteristic wit and humor woven naturally throughout. Be helpful, accurate, and insightful while also being engaging and authentically Sheldon.
 
+{extra_instructions}
 **Begin your synthesis:**
 """
 
+    no_rankings = "(No peer rankings this time; weigh the responses on their own merits.)"
+    overhead = estimate_tokens(chairman_prompt_with("", "" if stage2_results else no_rankings))
+    overhead += sum(estimate_tokens(h) + 1 for h in response_headers + ranking_headers)
+    fitted = fit_texts(texts, prompt_budget(chairman_model) - overhead, caps)
+    stage1_text = "\n\n".join(
+        header + text for header, text in zip(response_headers, fitted[:len(stage1_results)])
+    )
+    stage2_text = "\n\n".join(
+        header + text for header, text in zip(ranking_headers, fitted[len(stage1_results):])
+    ) or no_rankings
+    chairman_prompt = chairman_prompt_with(stage1_text, stage2_text)
+
     messages = [{"role": "user", "content": chairman_prompt}]
 
     # Query the chairman model
-    response = await query_model(CHAIRMAN_MODEL, messages)
+    response = await query_model(chairman_model, messages, stage="stage3")
 
     if response is None or response.get('error'):
         # Fallback if chairman fails
         error_msg = response.get('error', 'Unknown error') if response else 'No response received'
         return {
-            "model": CHAIRMAN_MODEL,
+            "model": chairman_model,
+            "response": f"*Error: {error_msg}*"
+        }
+
+    result = {
+        "model": chairman_model,
+        "response": response.get('content') or ''
+    }
+    if speculative:
+        relied_on = _RELIED_ON_RE.search(result["response"])
+        if relied_on is not None:
+            result["response"] = result["response"][:relied_on.start()].rstrip()
+            result["relied_on"] = relied_on.group(1).strip("`'\"")
+    return result
+
+
+@traced("stage3")
+async def stage3_solo_answer(user_query: str, chairman_model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Solo mode: the chairman answers directly, without a council.
+
+    Args:
+        user_query: The user's question
+        chairman_model: Model to answer with (defaults to CHAIRMAN_MODEL)
+
+    Returns:
+        Dict with 'model' and 'response' keys
+    """
+    chairman_model = chairman_model or CHAIRMAN_MODEL
+    prompt = f"""
+You are Chairman Sheldon Cooper. The Council of Sheldons is not in session, so you are answering this question on your own.
+
+{SHELDON_CONTEXT}
+
+**User's Question:** {user_query}
+
+Answer as a first-person monologue in Sheldon's voice: formal and precise, with his characteristic wit, and a clear verdict at the end. Aim for 150-300 words. Be helpful, accurate and insightful.
+"""
+    response = await query_model(chairman_model, [{"role": "user", "content": prompt}], stage="solo")
+
+    if response is None or response.get('error'):
+        error_msg = response.get('error', 'Unknown error') if response else 'No response received'
+        return {
+            "model": chairman_model,
             "response": f"*Error: {error_msg}*"
         }
 
     return {
-        "model": CHAIRMAN_MODEL,
-        "response": response.get('content', '')
+        "model": chairman_model,
+        "response": response.get('content') or ''
     }
 
 
+def drafts_agree(draft: Dict[str, Any], aggregate_rankings: List[Dict[str, Any]]) -> bool:
+    """
+    Whether a speculative draft can stand once the rankings are in.
+
+    The draft stands when the response it relied on most is among the
+    council's top-ranked responses, or when there are no rankings to
+    disagree with. A draft that doesn't say what it relied on is revised.
+
+    Args:
+        draft: Result of stage3_synthesize_final(..., speculative=True)
+        aggregate_rankings: Output of calculate_aggregate_rankings
+
+    Returns:
+        True if the draft can be used as the final answer
+    """
+    if draft.get("response", "").startswith("*Error"):
+        return False
+    if not aggregate_rankings:
+        return True
+    relied_on = draft.get("relied_on")
+    if not relied_on:
+        return False
+    best = aggregate_rankings[0]["average_rank"]
+    top = [entry["model"] for entry in aggregate_rankings if entry["average_rank"] == best]
+    return any(relied_on in (model, model.split("/")[-1]) for model in top)
+
+
 def parse_ranking_from_text(ranking_text: str) -> List[str]:
     """
     Parse the FINAL RANKING section from the model's response.
 
+    Tied responses are returned in the order they were written; use
+    ranking.parse_ranking to keep the ties.
+
     Args:
         ranking_text: The full text response from the model
 
     Returns:
         List of response labels in ranked order
     """
-    import re
-
-    # Look for "FINAL RANKING:" section
-    if "FINAL RANKING:" in ranking_text:
-        # Extract everything after "FINAL RANKING:"
-        parts = ranking_text.split("FINAL RANKING:")
-        if len(parts) >= 2:
-            ranking_section = parts[1]
-            # Try to extract numbered list format (e.g., "1. Response A")
-            # This pattern looks for: number, period, optional space, "Response X"
-            numbered_matches = re.findall(r'\d+\.\s*Response [A-Z]', ranking_section)
-            if numbered_matches:
-                # Extract just the "Response X" part
-                return [re.search(r'Response [A-Z]', m).group() for m in numbered_matches]
-
-            # Fallback: Extract all "Response X" patterns in order
-            matches = re.findall(r'Response [A-Z]', ranking_section)
-            return matches
-
-    # Fallback: try to find any "Response X" patterns in order
-    matches = re.findall(r'Response [A-Z]', ranking_text)
-    return matches
+    return flatten(parse_ranking(ranking_text)['groups'])
+
+
+def _json_evaluation(text: str) -> str:
+    """The free-text evaluation from a structured ranking answer, if any."""
+    try:
+        data = json.loads(text.strip().removeprefix("```json").removesuffix("```"))
+    except ValueError:
+        return ""
+    evaluation = data.get("evaluation") if isinstance(data, dict) else None
+    return evaluation if isinstance(evaluation, str) else ""
 
 
 def calculate_aggregate_rankings(
@@ -361,12 +585,13 @@ def calculate_aggregate_rankings(
     model_positions = defaultdict(list)
 
     for ranking in stage2_results:
-        ranking_text = ranking['ranking']
-
-        # Parse the ranking from the structured format
-        parsed_ranking = parse_ranking_from_text(ranking_text)
+        # Reuse the parse from stage 2; older messages only have the text
+        groups = ranking.get('parsed_groups')
+        if groups is None:
+            groups = parse_ranking(ranking['ranking'], label_to_model)['groups']
 
-        for position, label in enumerate(parsed_ranking, start=1):
+        # Tied responses share the average of the positions they span
+        for label, position in average_positions(groups).items():
             if label in label_to_model:
                 model_name = label_to_model[label]
                 model_positions[model_name].append(position)
@@ -388,6 +613,7 @@ def calculate_aggregate_rankings(
     return aggregate
 
 
+@traced("title")
 async def generate_conversation_title(user_query: str) -> str:
     """
     Generate a short title for a conversation based on the first user message.
@@ -407,8 +633,8 @@ Title:"""
 
     messages = [{"role": "user", "content": title_prompt}]
 
-    # Use nvidia/nemotron-nano-12b-v2-vl for title generation (fast and cheap)
-    response = await query_model("nvidia/nemotron-nano-12b-v2-vl:free", messages, timeout=30.0)
+    # Use a fast, cheap model for titles
+    response = await query_model(TITLE_MODEL, messages, timeout=30.0, stage="title")
 
     if response is None or response.get('error') or not response.get('content'):
         # Fallback to a generic title
@@ -426,43 +652,91 @@ Title:"""
     return title
 
 
-async def run_full_council(user_query: str) -> Tuple[List, List, Dict, Dict]:
+async def run_full_council(user_query: str, mode: Optional[str] = None) -> Tuple[List, List, Dict, Dict]:
     """
-    Run the complete 3-stage council process.
+    Run the council process in the requested mode.
 
     Args:
         user_query: The user's question
+        mode: One of COUNCIL_MODES (defaults to COUNCIL_MODE)
 
     Returns:
-        Tuple of (stage1_results, stage2_results, stage3_result, metadata)
+        Tuple of (stage1_results, stage2_results, stage3_result, metadata);
+        metadata includes the mode and the latency it took in latency_ms
+
+    Raises:
+        ValueError: If the mode is unknown
     """
+    mode = resolve_mode(mode)
+    started = time.perf_counter()
+
+    def finish(stage1_results, stage2_results, stage3_result, metadata):
+        metadata["mode"] = mode
+        metadata["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return stage1_results, stage2_results, stage3_result, metadata
+
+    if mode == MODE_SOLO:
+        return finish([], [], await stage3_solo_answer(user_query), {})
+
     # Stage 1: Collect individual responses
-    stage1_results = await stage1_collect_responses(user_query)
+    stage1_results = await stage1_collect_responses(user_query, members=council_members(mode))
 
     # If no models responded successfully, return error
     if not stage1_results:
-        return [], [], {
+        return finish([], [], {
             "model": "error",
             "response": "All models failed to respond. Please try again."
-        }, {}
+        }, {})
+
+    if mode == MODE_LITE:
+        return finish(stage1_results, [], await stage3_synthesize_final(user_query, stage1_results, []), {})
+
+    # Speculative: the chairman drafts from stage 1 while the rankings are collected
+    draft_task = None
+    if mode == MODE_SPECULATIVE:
+        draft_task = asyncio.create_task(
+            stage3_synthesize_final(user_query, stage1_results, [], speculative=True)
+        )
 
     # Stage 2: Collect rankings
-    stage2_results, label_to_model = await stage2_collect_rankings(user_query, stage1_results)
+    try:
+        stage2_results, label_to_model = await stage2_collect_rankings(user_query, stage1_results)
+    except BaseException:
+        if draft_task is not None:
+            draft_task.cancel()
+        raise
 
     # Calculate aggregate rankings
     aggregate_rankings = calculate_aggregate_rankings(stage2_results, label_to_model)
 
-    # Stage 3: Synthesize final answer
-    stage3_result = await stage3_synthesize_final(
-        user_query,
-        stage1_results,
-        stage2_results
-    )
-
     # Prepare metadata
     metadata = {
         "label_to_model": label_to_model,
         "aggregate_rankings": aggregate_rankings
     }
 
-    return stage1_results, stage2_results, stage3_result, metadata
+    # Stage 3: Synthesize final answer
+    if draft_task is not None:
+        draft = await draft_task
+        accepted = drafts_agree(draft, aggregate_rankings)
+        metadata["speculative"] = {"draft_accepted": accepted, "relied_on": draft.pop("relied_on", None)}
+        if accepted:
+            return finish(stage1_results, stage2_results, draft, metadata)
+        failed = draft["response"].startswith("*Error")
+        stage3_result = await stage3_synthesize_final(
+            user_query, stage1_results, stage2_results, draft=None if failed else draft["response"]
+        )
+    else:
+        stage3_result = await stage3_synthesize_final(
+            user_query,
+            stage1_results,
+            stage2_results
+        )
+
+    return finish(stage1_results, stage2_results, stage3_result, metadata)
+
+
+def persisted_metadata(metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Run metadata stored with the assistant message (the rankings can be recomputed from stage 2)."""
+    stored = {k: v for k, v in metadata.items() if k not in ("label_to_model", "aggregate_rankings")}
+    return stored or None
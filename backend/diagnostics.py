@@ -0,0 +1,295 @@
+"""Admin diagnostics: event-loop lag and stall detection, and tracemalloc memory snapshots."""
+
+import asyncio
+import hmac
+import logging
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+from .config import (
+    DIAGNOSTICS,
+    DIAGNOSTICS_TOKEN,
+    LOOP_PROBE_INTERVAL_SECONDS,
+    LOOP_STALL_MS,
+    TRACEMALLOC_FRAMES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Lag samples kept for the percentiles (a few minutes at the default interval)
+LAG_SAMPLES = 1200
+# Stalls kept with their stack traces
+MAX_STALLS = 50
+# Memory snapshots kept for diffs (each holds every traced allocation)
+MAX_SNAPSHOTS = 5
+
+# Allocation-tracing machinery, left out of snapshots
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def require_admin(request: Request):
+    """
+    FastAPI dependency guarding the diagnostics endpoints.
+
+    Raises:
+        HTTPException: 404 unless DIAGNOSTICS is on; 403 if DIAGNOSTICS_TOKEN
+            is set and the X-Admin-Token header doesn't match it
+    """
+    if not DIAGNOSTICS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if DIAGNOSTICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("x-admin-token", "").encode(), DIAGNOSTICS_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+class LoopMonitor:
+    """
+    Watch an event loop from a separate thread.
+
+    Every `interval` seconds the thread schedules a no-op callback on the
+    loop and times how long it takes to run: that is the loop's lag, how
+    long any ready callback waits its turn. If the callback hasn't run
+    after `stall_ms`, something is blocking the loop (a synchronous file
+    read, a large json.dumps, ...): the loop thread's stack is captured
+    right then, while the blocking code is still on it, and logged once the
+    loop is free again with the stall's duration (a lower bound: the block
+    may have begun before the probe was sent).
+
+    Unlike asyncio's debug mode, this names the blocking line rather than
+    the callback, and costs one thread wake-up per interval.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float, stall_ms: float):
+        self.loop = loop
+        self.interval = interval
+        self.stall_seconds = stall_ms / 1000
+        self.lags: Deque[float] = deque(maxlen=LAG_SAMPLES)
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=MAX_STALLS)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self._loop_thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+
+    def start(self):
+        """Start watching; call from the loop's thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + self.stall_seconds + 1)
+
+    def _watch(self):
+        while not self._stop.is_set():
+            ran = threading.Event()
+            sent = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(ran.set)
+            except RuntimeError:
+                # The loop is closed
+                return
+            stack = None
+            if not ran.wait(self.stall_seconds):
+                stack = self._loop_stack()
+                while not ran.wait(0.1):
+                    if self._stop.is_set():
+                        return
+            lag = time.monotonic() - sent
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if stack is not None:
+                self._record_stall(lag, stack)
+            self._stop.wait(self.interval)
+
+    def _loop_stack(self) -> List[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return []
+        return [line.rstrip("\n") for line in traceback.format_stack(frame)]
+
+    def _record_stall(self, duration: float, stack: List[str]):
+        self.stall_count += 1
+        self.stalls.append({
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration * 1000, 1),
+            "stack": stack,
+        })
+        logger.warning(
+            f"Event loop blocked for at least {duration * 1000:.0f} ms; stack of the loop thread "
+            f"after {self.stall_seconds * 1000:.0f} ms:\n" + "\n".join(stack)
+        )
+
+    def stats(self, stalls: int = 10, stacks: bool = True) -> Dict[str, Any]:
+        """Lag percentiles over the recent samples and the latest stalls."""
+        ordered = sorted(self.lags)
+
+        def percentile_ms(q: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+        recent = list(self.stalls)[-stalls:] if stalls else []
+        return {
+            "interval_s": self.interval,
+            "stall_threshold_ms": self.stall_seconds * 1000,
+            "samples": len(ordered),
+            "lag_p50_ms": percentile_ms(0.5),
+            "lag_p99_ms": percentile_ms(0.99),
+            "lag_max_ms": round(self.max_lag * 1000, 2),
+            "stalls_total": self.stall_count,
+            "stalls": [
+                stall if stacks else {k: v for k, v in stall.items() if k != "stack"}
+                for stall in reversed(recent)
+            ],
+        }
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor():
+    """Watch the running event loop (at startup, when DIAGNOSTICS is on)."""
+    global _monitor
+    if _monitor is not None:
+        return
+    _monitor = LoopMonitor(asyncio.get_running_loop(), LOOP_PROBE_INTERVAL_SECONDS, LOOP_STALL_MS)
+    _monitor.start()
+    logger.info(f"Loop monitor started (stalls over {LOOP_STALL_MS:.0f} ms are logged with stacks)")
+
+
+def stop_loop_monitor():
+    global _monitor
+    if _monitor is not None:
+        _monitor.stop()
+        _monitor = None
+
+
+def loop_stats(stalls: int = 10, stacks: bool = True) -> Dict[str, Any]:
+    """
+    Event-loop lag and recent stalls of this worker.
+
+    Returns:
+        Dict with lag percentiles, stall count and the latest stalls
+        (newest first, with the blocking stack unless stacks is off)
+    """
+    if _monitor is None:
+        return {"running": False}
+    return {"running": True, **_monitor.stats(stalls, stacks)}
+
+
+_snapshots: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_next_snapshot_id = 1
+_snapshot_lock = threading.Lock()
+
+
+def _stat_entry(stat) -> Dict[str, Any]:
+    frame = stat.traceback[0]
+    entry = {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+        entry["count_diff"] = stat.count_diff
+    if len(stat.traceback) > 1:
+        entry["traceback"] = [f"{f.filename}:{f.lineno}" for f in stat.traceback]
+    return entry
+
+
+def take_snapshot(limit: int = 20, group_by: str = "lineno") -> Dict[str, Any]:
+    """
+    Snapshot the traced allocations, starting tracemalloc if needed.
+
+    Allocations made before tracing started are invisible, so the first
+    call only establishes a baseline. Blocking: run it in a thread.
+
+    Args:
+        limit: Largest allocation sites to return
+        group_by: "lineno", "filename" or "traceback"
+
+    Returns:
+        Dict with the snapshot id (for diff_snapshots), traced memory and
+        the top allocation sites
+    """
+    global _next_snapshot_id
+    started_now = not tracemalloc.is_tracing()
+    if started_now:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    current, peak = tracemalloc.get_traced_memory()
+    with _snapshot_lock:
+        snapshot_id = _next_snapshot_id
+        _next_snapshot_id += 1
+        _snapshots[snapshot_id] = {"taken_at": datetime.utcnow().isoformat(), "snapshot": snapshot}
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return {
+        "id": snapshot_id,
+        "tracing_started": started_now,
+        "traced_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "top": [_stat_entry(stat) for stat in snapshot.statistics(group_by)[:limit]],
+    }
+
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    with _snapshot_lock:
+        return [{"id": snapshot_id, "taken_at": s["taken_at"]} for snapshot_id, s in _snapshots.items()]
+
+
+def diff_snapshots(
+    base_id: int,
+    other_id: Optional[int] = None,
+    limit: int = 20,
+    group_by: str = "lineno"
+) -> Dict[str, Any]:
+    """
+    Allocation sites that grew (or shrank) most between two snapshots.
+
+    Args:
+        base_id: Earlier snapshot
+        other_id: Later snapshot (default: a new one, taken now)
+        limit: Sites to return
+        group_by: "lineno", "filename" or "traceback"
+
+    Raises:
+        KeyError: If a snapshot id is unknown (or already discarded)
+    """
+    with _snapshot_lock:
+        base = _snapshots[base_id]
+        other = _snapshots[other_id] if other_id is not None else None
+    if other is None:
+        other_id = take_snapshot(limit=0)["id"]
+        with _snapshot_lock:
+            other = _snapshots[other_id]
+    stats = other["snapshot"].compare_to(base["snapshot"], group_by)
+    return {
+        "base": base_id,
+        "against": other_id,
+        "size_diff_kb": round(sum(stat.size_diff for stat in stats) / 1024, 1),
+        "top": [_stat_entry(stat) for stat in stats[:limit]],
+    }
+
+
+def stop_tracing():
+    """Stop tracemalloc and drop the snapshots, freeing their memory."""
+    with _snapshot_lock:
+        _snapshots.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
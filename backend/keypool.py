@@ -0,0 +1,258 @@
+"""API key pools: spread requests over several keys and sideline the failing ones."""
+
+import re
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from .config import KEY_QUARANTINE_MAX_SECONDS, KEY_QUARANTINE_SECONDS, KEY_SELECTION
+
+# Key selection strategies
+STRATEGY_ROUND_ROBIN = "round_robin"    # smooth weighted round-robin
+STRATEGY_LEAST_LOADED = "least_loaded"  # fewest in-flight requests per unit of weight
+
+# Statuses that take a key out of rotation for a while: invalid key, out of
+# credits, rate limited
+QUARANTINE_STATUSES = (401, 402, 429)
+
+# Parts of an OpenAI-style reset duration such as "6m0s" or "150ms"
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class ApiKey:
+    """One credential in a pool, with its load, rate-limit state and usage counters."""
+
+    def __init__(self, key: str, weight: int = 1):
+        self.key = key
+        self.weight = max(1, weight)
+        self.in_flight = 0
+        self.current_weight = 0  # smooth weighted round-robin state
+        self.quarantined_until = 0.0
+        self.consecutive_failures = 0
+        # From the last response's rate-limit headers
+        self.rate_limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        # Usage since this worker started
+        self.requests = 0
+        self.errors = 0
+        self.statuses: Dict[int, int] = {}
+        self.quarantines = 0
+        self.total_latency = 0.0
+
+    @property
+    def label(self) -> str:
+        """The key with all but its last characters masked, safe to show."""
+        return f"…{self.key[-4:]}" if len(self.key) > 8 else "…"
+
+    def available(self, now: float) -> bool:
+        """Not quarantined and not known to be out of requests until a reset."""
+        if now < self.quarantined_until:
+            return False
+        if self.remaining == 0 and self.reset_at is not None and now < self.reset_at:
+            return False
+        return True
+
+    def available_at(self) -> float:
+        """When this key can next be used."""
+        if self.remaining == 0 and self.reset_at is not None:
+            return max(self.quarantined_until, self.reset_at)
+        return self.quarantined_until
+
+
+class KeyPool:
+    """
+    A set of API keys for one provider.
+
+    Each request takes a key with acquire() and hands it back with
+    release(), which reads the response's status and rate-limit headers.
+    A key answering 401, 402 or 429 is quarantined: for the Retry-After
+    time if the response gives one, otherwise for KEY_QUARANTINE_SECONDS,
+    doubling on each further failure up to KEY_QUARANTINE_MAX_SECONDS.
+    401 and 402 mean the key itself is unusable, so they quarantine for the
+    maximum straight away. A key whose rate-limit headers report no
+    requests left is skipped until the reset time.
+
+    When every key is unavailable, the one that recovers first is used
+    anyway rather than failing the request locally.
+    """
+
+    def __init__(self, keys: Sequence[ApiKey], strategy: str = STRATEGY_ROUND_ROBIN):
+        if not keys:
+            raise ValueError("A key pool needs at least one key")
+        if strategy not in (STRATEGY_ROUND_ROBIN, STRATEGY_LEAST_LOADED):
+            raise ValueError(f"Unknown key selection strategy: {strategy!r}")
+        self.keys = list(keys)
+        self.strategy = strategy
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def acquire(self, exclude: Sequence[ApiKey] = ()) -> ApiKey:
+        """
+        Pick a key for the next request and count it as in flight.
+
+        Args:
+            exclude: Keys already tried for this request
+
+        Returns:
+            The chosen key (release() it when the request is done)
+        """
+        now = time.time()
+        candidates = [k for k in self.keys if k not in exclude and k.available(now)]
+        if not candidates:
+            untried = [k for k in self.keys if k not in exclude] or self.keys
+            candidates = [min(untried, key=ApiKey.available_at)]
+
+        if len(candidates) == 1:
+            chosen = candidates[0]
+        elif self.strategy == STRATEGY_LEAST_LOADED:
+            chosen = min(candidates, key=lambda k: (k.in_flight / k.weight, -(k.remaining or 0)))
+        else:
+            # Smooth weighted round-robin (as in nginx): spreads each key's
+            # turns evenly instead of in bursts
+            total = 0
+            for k in candidates:
+                k.current_weight += k.weight
+                total += k.weight
+            chosen = max(candidates, key=lambda k: k.current_weight)
+            chosen.current_weight -= total
+
+        chosen.in_flight += 1
+        chosen.requests += 1
+        return chosen
+
+    def release(
+        self,
+        key: ApiKey,
+        status: Optional[int],
+        headers: Optional[Mapping[str, str]] = None,
+        latency: float = 0.0,
+    ):
+        """
+        Hand a key back after a request.
+
+        Args:
+            key: The key from acquire()
+            status: HTTP status of the response (None if the request failed to send)
+            headers: Response headers, for rate limits and Retry-After
+            latency: Request duration in seconds
+        """
+        key.in_flight = max(0, key.in_flight - 1)
+        key.total_latency += latency
+        if status is None:
+            key.errors += 1
+            return
+        key.statuses[status] = key.statuses.get(status, 0) + 1
+        now = time.time()
+        if headers is not None:
+            _read_rate_limit(key, headers, now)
+
+        if status in QUARANTINE_STATUSES:
+            key.errors += 1
+            key.consecutive_failures += 1
+            key.quarantines += 1
+            if status == 429:
+                duration = _retry_after(headers) if headers is not None else None
+                if duration is None:
+                    duration = KEY_QUARANTINE_SECONDS * 2 ** (key.consecutive_failures - 1)
+            else:
+                duration = KEY_QUARANTINE_MAX_SECONDS
+            key.quarantined_until = now + min(duration, KEY_QUARANTINE_MAX_SECONDS)
+        else:
+            if status >= 400:
+                key.errors += 1
+            key.consecutive_failures = 0
+
+    def abandon(self, key: ApiKey):
+        """Hand back a key whose request was cancelled, without counting an outcome."""
+        key.in_flight = max(0, key.in_flight - 1)
+
+    def has_alternative(self, tried: Sequence[ApiKey]) -> bool:
+        """Whether an available key not yet tried for this request remains."""
+        now = time.time()
+        return any(k not in tried and k.available(now) for k in self.keys)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Usage and state of every key (masked) since this worker started."""
+        now = time.time()
+        return [
+            {
+                "key": k.label,
+                "weight": k.weight,
+                "in_flight": k.in_flight,
+                "requests": k.requests,
+                "errors": k.errors,
+                "statuses": {str(status): count for status, count in sorted(k.statuses.items())},
+                "quarantines": k.quarantines,
+                "quarantined_for": round(k.quarantined_until - now, 1) if k.quarantined_until > now else 0,
+                "rate_limit": k.rate_limit,
+                "remaining": k.remaining,
+                "reset_in": round(k.reset_at - now, 1) if k.reset_at and k.reset_at > now else None,
+                "avg_latency_ms": round(k.total_latency / k.requests * 1000, 1) if k.requests else None,
+            }
+            for k in self.keys
+        ]
+
+
+def parse_keys(keys: Sequence[Any], weights: Sequence[int] = ()) -> List[ApiKey]:
+    """
+    Build pool keys from configuration.
+
+    Args:
+        keys: Key strings, or dicts with 'key' and optional 'weight'
+        weights: Weights for plain key strings, by position (default 1)
+    """
+    parsed = []
+    for i, entry in enumerate(keys):
+        if isinstance(entry, dict):
+            parsed.append(ApiKey(entry["key"], int(entry.get("weight", 1))))
+        elif entry:
+            parsed.append(ApiKey(entry, weights[i] if i < len(weights) else 1))
+    return parsed
+
+
+def build_pool(keys: Sequence[Any], weights: Sequence[int] = (), strategy: str = KEY_SELECTION) -> Optional[KeyPool]:
+    """A KeyPool for the configured keys, or None when there are none."""
+    parsed = parse_keys(keys, weights)
+    return KeyPool(parsed, strategy) if parsed else None
+
+
+def _read_rate_limit(key: ApiKey, headers: Mapping[str, str], now: float):
+    """Record rate-limit headers: OpenRouter's X-RateLimit-* or OpenAI's *-requests variants."""
+    limit = headers.get("x-ratelimit-limit") or headers.get("x-ratelimit-limit-requests")
+    remaining = headers.get("x-ratelimit-remaining") or headers.get("x-ratelimit-remaining-requests")
+    reset = headers.get("x-ratelimit-reset") or headers.get("x-ratelimit-reset-requests")
+    if limit is not None and limit.isdigit():
+        key.rate_limit = int(limit)
+    if remaining is not None and remaining.isdigit():
+        key.remaining = int(remaining)
+    if reset is not None:
+        reset_at = _parse_reset(reset, now)
+        if reset_at is not None:
+            key.reset_at = reset_at
+
+
+def _parse_reset(value: str, now: float) -> Optional[float]:
+    """
+    A rate-limit reset as a Unix time: an epoch in milliseconds or seconds,
+    or a duration like "20s", "6m0s" or "150ms".
+    """
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        if number > 10 ** 11:
+            return number / 1000
+        return number if number > 10 ** 9 else now + number
+    seconds = sum(float(number) * _UNIT_SECONDS[unit] for number, unit in _DURATION_RE.findall(value))
+    return now + seconds if seconds else None
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
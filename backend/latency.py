@@ -0,0 +1,318 @@
+"""Upstream latency histograms per model and stage, and the timeouts derived from them."""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    ADAPTIVE_TIMEOUTS,
+    LATENCY_MIN_SAMPLES,
+    LATENCY_STATS_PATH,
+    LATENCY_TIMEOUT_CEILING,
+    LATENCY_TIMEOUT_FACTOR,
+    LATENCY_TIMEOUT_FLOOR,
+    LATENCY_TIMEOUT_QUANTILE,
+)
+from .locking import named_lock
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds grow by GROWTH from SMALLEST_BUCKET seconds, so a
+# quantile read from a bucket is at most 20% above the true value
+SMALLEST_BUCKET = 0.05
+GROWTH = 1.2
+NUM_BUCKETS = 64  # up to about 2.4 hours
+
+# Once a histogram holds this many samples, all counts are halved, so
+# recent latencies outweigh old ones
+DECAY_AT = 2000
+
+# Save at most this often (and at shutdown)
+SAVE_INTERVAL_SECONDS = 30.0
+
+_LOG_GROWTH = math.log(GROWTH)
+
+
+def bucket_index(seconds: float) -> int:
+    """The bucket whose upper bound is the first at or above seconds."""
+    if seconds <= SMALLEST_BUCKET:
+        return 0
+    return min(NUM_BUCKETS - 1, math.ceil(math.log(seconds / SMALLEST_BUCKET) / _LOG_GROWTH - 1e-9))
+
+
+def bucket_bound(index: int) -> float:
+    """Upper bound of a bucket in seconds."""
+    return SMALLEST_BUCKET * GROWTH ** index
+
+
+class Histogram:
+    """
+    Log-bucketed latency histogram with exponential decay.
+
+    Timed-out calls are only counted: their true latency is unknown, and
+    recording them at the deadline would push the quantile, and with it the
+    next deadline, up until it reached the ceiling.
+    """
+
+    def __init__(self, counts: Optional[List[float]] = None, timeouts: float = 0.0):
+        self.counts = list(counts) if counts else [0.0] * NUM_BUCKETS
+        self.total = sum(self.counts)
+        self.timeouts = timeouts
+
+    def record(self, seconds: float):
+        self.counts[bucket_index(seconds)] += 1
+        self.total += 1
+        self._decay()
+
+    def record_timeout(self):
+        self.timeouts += 1
+        self._decay()
+
+    def merge(self, other: "Histogram"):
+        """Add another histogram's counts to this one."""
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.timeouts += other.timeouts
+        self._decay()
+
+    def copy(self) -> "Histogram":
+        return Histogram(self.counts, self.timeouts)
+
+    def _decay(self):
+        while self.total + self.timeouts >= DECAY_AT:
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+            self.timeouts /= 2
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        if self.total <= 0:
+            return None
+        target = q * self.total
+        cumulative = 0.0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count:
+                return bucket_bound(index)
+        return bucket_bound(NUM_BUCKETS - 1)
+
+    def to_sparse(self) -> Dict[str, float]:
+        return {str(i): round(count, 3) for i, count in enumerate(self.counts) if count}
+
+    @classmethod
+    def from_sparse(cls, sparse: Dict[str, float]) -> "Histogram":
+        counts = [0.0] * NUM_BUCKETS
+        for index, count in sparse.items():
+            if 0 <= int(index) < NUM_BUCKETS:
+                counts[int(index)] = float(count)
+        return cls(counts)
+
+
+# Every worker's samples as of the last save, plus this worker's since
+_histograms: Dict[Tuple[str, str], Histogram] = {}
+# This worker's samples not yet added to LATENCY_STATS_PATH
+_unsaved: Dict[Tuple[str, str], Histogram] = {}
+_loaded = False
+_last_save = 0.0
+_saving = False
+_lock = threading.Lock()
+
+
+def _read_histograms() -> Dict[Tuple[str, str], Histogram]:
+    """The histograms in LATENCY_STATS_PATH (empty if missing or unreadable)."""
+    try:
+        with open(LATENCY_STATS_PATH, "r", encoding="utf-8") as f:
+            document = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable latency stats {LATENCY_STATS_PATH}: {e}")
+        return {}
+    if document.get("smallest_bucket") != SMALLEST_BUCKET or document.get("growth") != GROWTH:
+        # Saved with other buckets: start over rather than misread them
+        return {}
+    histograms = {}
+    timeouts = document.get("timeouts", {})
+    for model, stages in document.get("histograms", {}).items():
+        for stage, sparse in stages.items():
+            histogram = Histogram.from_sparse(sparse)
+            histogram.timeouts = float(timeouts.get(model, {}).get(stage, 0.0))
+            histograms[(model, stage)] = histogram
+    return histograms
+
+
+def _ensure_loaded():
+    """Load the persisted histograms on first use."""
+    global _loaded
+    if _loaded:
+        return
+    histograms = _read_histograms()
+    with _lock:
+        if not _loaded:
+            _histograms.update(histograms)
+            _loaded = True
+
+
+def _add(model: str, stage: str, update):
+    """Apply a change to both the live and the unsaved histogram of a model and stage."""
+    global _last_save, _saving
+    _ensure_loaded()
+    with _lock:
+        update(_histograms.setdefault((model, stage), Histogram()))
+        update(_unsaved.setdefault((model, stage), Histogram()))
+        due = not _saving and time.monotonic() - _last_save >= SAVE_INTERVAL_SECONDS
+        if due:
+            _saving = True
+            _last_save = time.monotonic()
+    if due:
+        _save_in_background()
+
+
+def record(model: str, stage: str, seconds: float):
+    """Add one upstream call duration."""
+    _add(model, stage, lambda histogram: histogram.record(seconds))
+
+
+def record_timeout(model: str, stage: str):
+    """
+    Count one timed-out upstream call.
+
+    It is not a latency sample, so it never raises the deadline.
+    """
+    _add(model, stage, Histogram.record_timeout)
+
+
+def _save_in_background():
+    """Save from a worker thread when called on the event loop, otherwise right here."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _save_and_clear_flag()
+        return
+    loop.run_in_executor(None, _save_and_clear_flag)
+
+
+def _save_and_clear_flag():
+    global _saving
+    try:
+        save()
+    finally:
+        _saving = False
+
+
+def timeout_for(model: str, stage: str, default: float) -> float:
+    """
+    Deadline for a call to a model in a stage.
+
+    LATENCY_TIMEOUT_QUANTILE of its observed latency times
+    LATENCY_TIMEOUT_FACTOR, between LATENCY_TIMEOUT_FLOOR and
+    LATENCY_TIMEOUT_CEILING; the default until there are
+    LATENCY_MIN_SAMPLES samples (or with ADAPTIVE_TIMEOUTS off).
+
+    Args:
+        model: Model identifier
+        stage: Council stage ("stage1", "stage2", "stage3", "title", ...)
+        default: Fixed timeout to use without enough data
+
+    Returns:
+        Timeout in seconds
+    """
+    if not ADAPTIVE_TIMEOUTS:
+        return default
+    _ensure_loaded()
+    histogram = _histograms.get((model, stage))
+    if histogram is None or histogram.total < LATENCY_MIN_SAMPLES:
+        return default
+    observed = histogram.quantile(LATENCY_TIMEOUT_QUANTILE)
+    return min(LATENCY_TIMEOUT_CEILING, max(LATENCY_TIMEOUT_FLOOR, observed * LATENCY_TIMEOUT_FACTOR))
+
+
+def save():
+    """
+    Add this worker's new samples to LATENCY_STATS_PATH.
+
+    The file is read, merged and rewritten under a lock shared by every
+    worker, so workers add to each other's samples instead of overwriting
+    them; afterwards this worker's timeouts also follow the others' samples.
+    Blocking: from async code, run it in a thread.
+    """
+    global _histograms, _last_save, _unsaved
+    with _lock:
+        _last_save = time.monotonic()
+        if not _unsaved:
+            return
+        unsaved, _unsaved = _unsaved, {}
+
+    with named_lock("latency-stats"):
+        merged = _read_histograms()
+        for key, histogram in unsaved.items():
+            merged.setdefault(key, Histogram()).merge(histogram)
+        written = _write_histograms(merged)
+
+    with _lock:
+        if not written:
+            # Keep the samples for the next attempt
+            for key, histogram in unsaved.items():
+                _unsaved.setdefault(key, Histogram()).merge(histogram)
+            return
+        live = {key: histogram.copy() for key, histogram in merged.items()}
+        for key, histogram in _unsaved.items():
+            # Recorded while the file was being written
+            live.setdefault(key, Histogram()).merge(histogram)
+        _histograms = live
+
+
+def _write_histograms(histograms: Dict[Tuple[str, str], Histogram]) -> bool:
+    sparse: Dict[str, Dict[str, Any]] = {}
+    timeouts: Dict[str, Dict[str, float]] = {}
+    for (model, stage), histogram in histograms.items():
+        sparse.setdefault(model, {})[stage] = histogram.to_sparse()
+        if histogram.timeouts:
+            timeouts.setdefault(model, {})[stage] = round(histogram.timeouts, 3)
+    document = {"smallest_bucket": SMALLEST_BUCKET, "growth": GROWTH, "histograms": sparse, "timeouts": timeouts}
+    directory = os.path.dirname(LATENCY_STATS_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{LATENCY_STATS_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.replace(tmp_path, LATENCY_STATS_PATH)
+    except OSError as e:
+        logger.warning(f"Could not save latency stats to {LATENCY_STATS_PATH}: {e}")
+        return False
+    return True
+
+
+def latency_stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Observed latency and current timeout per model and stage.
+
+    Returns:
+        Dict of model -> stage -> samples, timeouts, p50_s, p90_s, p99_s and
+        timeout_s (None when the fixed default applies)
+    """
+    _ensure_loaded()
+    report: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    with _lock:
+        items = sorted(_histograms.items())
+    for (model, stage), histogram in items:
+        adaptive = ADAPTIVE_TIMEOUTS and histogram.total >= LATENCY_MIN_SAMPLES
+        report.setdefault(model, {})[stage] = {
+            "samples": round(histogram.total, 1),
+            "timeouts": round(histogram.timeouts, 1),
+            "p50_s": _rounded(histogram.quantile(0.5)),
+            "p90_s": _rounded(histogram.quantile(0.9)),
+            "p99_s": _rounded(histogram.quantile(0.99)),
+            "timeout_s": round(timeout_for(model, stage, 0.0), 2) if adaptive else None,
+        }
+    return report
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
@@ -0,0 +1,186 @@
+"""Cross-process locks for several workers (or hosts) sharing one data directory."""
+
+import os
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+
+from .config import LOCK_DIR
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+# Conversations hash onto a fixed set of lock stripes, so locking never
+# creates per-conversation files
+LOCK_STRIPES = 1024
+
+
+class LockFile:
+    """
+    Byte-range locks on a single file, usable across processes.
+
+    OS record locks are owned by the process, so each byte also has a
+    thread lock to serialize threads within this process.
+    """
+
+    def __init__(self, name: str, size: int):
+        self.path = os.path.join(LOCK_DIR, name)
+        self.size = size
+        self._fd: Optional[int] = None
+        self._open_lock = threading.Lock()
+        self._thread_locks = [threading.RLock() for _ in range(size)]
+        self._depth: Dict[int, int] = {}
+
+    def _fileno(self) -> int:
+        with self._open_lock:
+            if self._fd is None:
+                Path(LOCK_DIR).mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            return self._fd
+
+    def _os_lock(self, offset: int, blocking: bool) -> bool:
+        fd = self._fileno()
+        if sys.platform == "win32":
+            while True:
+                os.lseek(fd, offset, os.SEEK_SET)
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    return True
+                except OSError:
+                    if not blocking:
+                        return False
+                    time.sleep(0.01)
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.lockf(fd, flags, 1, offset, os.SEEK_SET)
+            return True
+        except OSError:
+            return False
+
+    def _os_unlock(self, offset: int):
+        fd = self._fileno()
+        if sys.platform == "win32":
+            os.lseek(fd, offset, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset, os.SEEK_SET)
+
+    def acquire(self, offset: int, blocking: bool = True) -> bool:
+        """Lock one byte; re-entrant within a thread."""
+        thread_lock = self._thread_locks[offset]
+        if not thread_lock.acquire(blocking=blocking):
+            return False
+        depth = self._depth.get(offset, 0)
+        if depth == 0 and not self._os_lock(offset, blocking):
+            thread_lock.release()
+            return False
+        self._depth[offset] = depth + 1
+        return True
+
+    def release(self, offset: int):
+        """Unlock one byte."""
+        depth = self._depth[offset] - 1
+        if depth == 0:
+            del self._depth[offset]
+            self._os_unlock(offset)
+        else:
+            self._depth[offset] = depth
+        self._thread_locks[offset].release()
+
+
+# Named locks hash onto this many bytes. Two names landing on the same byte
+# share one lock: that only serializes them needlessly (locks are re-entrant,
+# and named locks are never held while waiting for another one in reverse
+# order), but keep the range large enough that the names in use don't collide;
+# tests/test_locking.py checks them.
+NAMED_LOCK_SLOTS = 4096
+
+_conversation_locks = LockFile("conversations.lock", LOCK_STRIPES)
+_named_locks = LockFile("named.lock", NAMED_LOCK_SLOTS)
+
+
+def _stripe(key: str, size: int) -> int:
+    return zlib.crc32(key.encode("utf-8")) % size
+
+
+@contextmanager
+def conversation_lock(conversation_id: str):
+    """Hold the write lock for a conversation across all workers."""
+    stripe = _stripe(conversation_id, LOCK_STRIPES)
+    _conversation_locks.acquire(stripe)
+    try:
+        yield
+    finally:
+        _conversation_locks.release(stripe)
+
+
+@contextmanager
+def conversation_locks(conversation_ids: Iterable[str]):
+    """Hold the write locks of several conversations (acquired in stripe order)."""
+    stripes = sorted({_stripe(cid, LOCK_STRIPES) for cid in conversation_ids})
+    acquired = []
+    try:
+        for stripe in stripes:
+            _conversation_locks.acquire(stripe)
+            acquired.append(stripe)
+        yield
+    finally:
+        for stripe in reversed(acquired):
+            _conversation_locks.release(stripe)
+
+
+@contextmanager
+def named_lock(name: str):
+    """
+    Hold a global lock for a shared resource (archive index, search rebuild).
+
+    Named locks are always taken after conversation locks, never before.
+    Blocking: from async code, call storage functions that take it through
+    asyncio.to_thread, so waiting on another worker never stalls the event loop.
+    """
+    stripe = _stripe(name, _named_locks.size)
+    _named_locks.acquire(stripe)
+    try:
+        yield
+    finally:
+        _named_locks.release(stripe)
+
+
+class SharedSlots:
+    """
+    A counting semaphore shared by every process using the data directory.
+
+    Each slot is one locked byte, so slots held by a crashed worker are
+    released by the OS automatically.
+    """
+
+    def __init__(self, name: str, count: int):
+        self.count = count
+        self._file = LockFile(name, count)
+        self._held: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[int]:
+        """Take a free slot without blocking, or return None if all are busy."""
+        with self._lock:
+            for slot in range(self.count):
+                # OS locks don't conflict within a process, so track our own slots
+                if slot in self._held:
+                    continue
+                if self._file._os_lock(slot, blocking=False):
+                    self._held.add(slot)
+                    return slot
+        return None
+
+    def release(self, slot: int):
+        """Return a slot taken with try_acquire (from any thread)."""
+        with self._lock:
+            if slot in self._held:
+                self._held.discard(slot)
+                self._file._os_unlock(slot)
@@ -1,18 +1,43 @@
 """FastAPI backend for LLM Council."""
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.requests import HTTPConnection
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 import uuid
-import json
 import asyncio
 import logging
 import os
 
-from . import storage
-from .council import run_full_council, generate_conversation_title, stage1_collect_responses, stage2_collect_rankings, stage3_synthesize_final, calculate_aggregate_rankings
+from . import archive, diagnostics, latency, ranking, rerun, search, semantic_cache, storage, tracing, transfer
+from .admission import AdmissionRejected, Ticket, council_admission
+from .caching import cache_headers, conversation_validators, is_not_modified, list_validators
+from .compression import CompressionMiddleware
+from .config import (
+    ARCHIVE_AFTER_DAYS,
+    BACKEND_WORKERS,
+    COMPRESSION_MIN_SIZE,
+    CORS_ORIGINS,
+    DIAGNOSTICS,
+    DISCONNECT_POLICY,
+    DISCONNECT_POLL_SECONDS,
+    RESPONSE_COMPRESSION,
+    SEMANTIC_CACHE,
+    SEMANTIC_CACHE_REFRESH,
+    TRACE_SLOW_MS,
+)
+from .locking import named_lock
+from .providers import close_providers, key_stats
+from .serialization import sse_event
+from .sessions import CouncilSession
+from .council import persisted_metadata, resolve_mode, run_full_council
+from .runner import CouncilRun, cached_answer, drain_pending_refreshes, refresh_cached_answer
+from .scheduler import priority, upstream_scheduler, validate_priority
+from .titles import drain_pending_titles, set_initial_title
 
 # Configure logging - check for DEBUG environment variable
 debug_mode = os.getenv("DEBUG", "false").lower() == "true"
@@ -28,17 +53,49 @@ logger = logging.getLogger(__name__)
 if debug_mode:
     logger.info("🔍 Debug mode enabled")
 
-app = FastAPI(title="LLM Council API")
+
+def build_search_index_once() -> Optional[int]:
+    """Build the search index unless another worker already did."""
+    with named_lock("search-index"):
+        if search.index_exists():
+            return None
+        return storage.rebuild_search_index()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks."""
+    # Build the search index from existing conversations on first run
+    if not search.index_exists():
+        count = await asyncio.to_thread(build_search_index_once)
+        if count is not None:
+            logger.info(f"Search index built from {count} conversations")
+    if DIAGNOSTICS:
+        diagnostics.start_loop_monitor()
+    yield
+    diagnostics.stop_loop_monitor()
+    await drain_pending_titles()
+    await drain_pending_refreshes()
+    await close_providers()
+    await asyncio.to_thread(latency.save)
+
+
+app = FastAPI(title="LLM Council API", lifespan=lifespan)
 
 # Enable CORS for local development
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://localhost:3000"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
+# Compress large JSON payloads; SSE events are flushed individually
+if RESPONSE_COMPRESSION:
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
 
 class CreateConversationRequest(BaseModel):
     """Request to create a new conversation."""
@@ -48,6 +105,10 @@ class CreateConversationRequest(BaseModel):
 class SendMessageRequest(BaseModel):
     """Request to send a message in a conversation."""
     content: str
+    mode: Optional[str] = None  # council mode; defaults to COUNCIL_MODE
+    use_cache: Optional[bool] = None  # answer near-duplicates from the cache; defaults to SEMANTIC_CACHE
+    refresh: Optional[bool] = None  # after a cached answer, run the council in the background
+    priority: Optional[str] = None  # upstream scheduling class: interactive (default), background or batch
 
 
 class ConversationMetadata(BaseModel):
@@ -56,6 +117,8 @@ class ConversationMetadata(BaseModel):
     created_at: str
     title: str
     message_count: int
+    version: int = 0
+    updated_at: Optional[str] = None
 
 
 class Conversation(BaseModel):
@@ -64,39 +127,246 @@ class Conversation(BaseModel):
     created_at: str
     title: str
     messages: List[Dict[str, Any]]
+    version: int = 0
+    updated_at: Optional[str] = None
+
+
+class MessageChange(BaseModel):
+    """A message added or replaced since the client's version."""
+    index: int
+    message: Dict[str, Any]
+
+
+class ConversationDelta(BaseModel):
+    """Changes to a conversation since a version."""
+    id: str
+    since: int
+    version: int
+    updated_at: Optional[str] = None
+    message_count: int
+    full: bool
+    messages: List[MessageChange]
+    created_at: Optional[str] = None  # only when full
+    title: Optional[str] = None  # only when changed
+
+
+class ConversationListDelta(BaseModel):
+    """Changes to the conversation list since a cursor."""
+    cursor: float
+    reset: bool
+    changed: List[ConversationMetadata]
+    deleted: List[str]
+
+
+class RerunRequest(BaseModel):
+    """Request to re-run part of a stored council answer."""
+    members: Optional[List[Union[int, str]]] = None  # index, Sheldon name or model; defaults to the failed members
+    rerank: str = rerun.RERANK_AFFECTED  # which rankers rank again: affected, all or none
+    chairman_model: Optional[str] = None  # defaults to CHAIRMAN_MODEL
+
+
+class ResynthesizeRequest(BaseModel):
+    """Request to re-run only the chairman of a stored council answer."""
+    chairman_model: Optional[str] = None  # defaults to CHAIRMAN_MODEL
+
+
+class SearchResult(BaseModel):
+    """A single full-text search hit."""
+    conversation_id: str
+    message_index: int
+    kind: str
+    model: Optional[str]
+    snippet: str
+    score: float
+    title: Optional[str]
+    created_at: Optional[str]
+
+
+def get_client_id(request: HTTPConnection) -> str:
+    """Identify the caller for per-client queue fairness."""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+
+def request_mode(request: SendMessageRequest) -> str:
+    """
+    The council mode a message asks for.
+
+    Raises:
+        HTTPException: 400 if the mode is unknown
+    """
+    try:
+        return resolve_mode(request.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def request_priority(request: SendMessageRequest) -> str:
+    """
+    The upstream scheduling class a message asks for.
+
+    Raises:
+        HTTPException: 400 if the class is unknown
+    """
+    try:
+        return validate_priority(request.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def find_cached_answer(request: SendMessageRequest) -> Optional[Dict[str, Any]]:
+    """An earlier answer to a near-duplicate question, if the request allows one."""
+    use_cache = SEMANTIC_CACHE if request.use_cache is None else request.use_cache
+    return await asyncio.to_thread(semantic_cache.lookup, request.content) if use_cache else None
+
+
+def wants_refresh(request: SendMessageRequest) -> bool:
+    return SEMANTIC_CACHE_REFRESH if request.refresh is None else request.refresh
+
+
+def admit_council_run(request: Request) -> Ticket:
+    """
+    Take a slot or queue place for a council run.
+
+    Raises:
+        HTTPException: 429 with Retry-After when the queue is full
+    """
+    try:
+        return council_admission.enqueue(get_client_id(request))
+    except AdmissionRejected as e:
+        logger.warning(f"Rejecting council run: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many council runs in progress, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
 
 
 @app.get("/")
 async def root():
     """Health check endpoint."""
-    return {"status": "ok", "service": "LLM Council API"}
+    return {"status": "ok", "service": "LLM Council API", "councils": council_admission.stats()}
 
 
 @app.get("/api/conversations", response_model=List[ConversationMetadata])
-async def list_conversations():
-    """List all conversations (metadata only)."""
-    return storage.list_conversations()
+async def list_conversations(request: Request, response: Response):
+    """List all conversations (metadata only). Supports conditional GET."""
+    conversations = await asyncio.to_thread(storage.list_conversations)
+    etag, last_modified = list_validators(conversations)
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return conversations
+
+
+@app.get("/api/conversations/delta", response_model=ConversationListDelta)
+async def list_conversation_changes(since: Optional[float] = None):
+    """
+    Conversations created, updated or deleted since `since`, the cursor
+    returned by the previous call. Without a cursor (or with an expired one)
+    the full list is returned with `reset` set.
+    """
+    return await asyncio.to_thread(storage.list_conversation_changes, since)
+
+
+@app.get("/api/search", response_model=List[SearchResult])
+async def search_conversations(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    include_stage1: bool = False
+):
+    """
+    Full-text search over user questions and final answers.
+    Append '*' to a word for prefix matching; snippets highlight matches with <mark>.
+    """
+    return await asyncio.to_thread(search.search, q, limit, include_stage1)
+
+
+@app.post("/api/search/reindex")
+async def reindex_search():
+    """Rebuild the search index from stored conversations."""
+    count = await asyncio.to_thread(storage.rebuild_search_index)
+    return {"status": "ok", "indexed": count}
+
+
+@app.post("/api/archive/compact")
+async def compact_archive(older_than_days: float = Query(ARCHIVE_AFTER_DAYS, ge=0)):
+    """Move conversations not modified for `older_than_days` into packed archive segments, then reclaim dead space."""
+    count = await asyncio.to_thread(storage.archive_cold_conversations, older_than_days)
+    freed = await asyncio.to_thread(archive.reclaim)
+    return {"status": "ok", "archived": count, "reclaimed_bytes": freed}
+
+
+@app.get("/api/export")
+async def export_conversations(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    gzip: bool = False
+):
+    """
+    Stream the conversation store as NDJSON, one conversation per line.
+    Filter by creation date with ISO `since` (inclusive) and `until` (exclusive).
+    """
+    filename = "conversations.ndjson.gz" if gzip else "conversations.ndjson"
+    return StreamingResponse(
+        transfer.iter_export(since, until, gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.post("/api/import")
+async def import_conversations(
+    request: Request,
+    workers: int = Query(4, ge=1, le=32),
+    overwrite: bool = False
+):
+    """Import conversations from an NDJSON request body (plain or gzip-compressed)."""
+    counts = await transfer.import_stream_async(request.stream(), workers, overwrite)
+    logger.info(f"Import finished: {counts}")
+    return {"status": "ok", **counts}
 
 
 @app.post("/api/conversations", response_model=Conversation)
 async def create_conversation(request: CreateConversationRequest):
     """Create a new conversation."""
     conversation_id = str(uuid.uuid4())
-    conversation = storage.create_conversation(conversation_id)
+    conversation = await asyncio.to_thread(storage.create_conversation, conversation_id)
     return conversation
 
 
 @app.get("/api/conversations/{conversation_id}", response_model=Conversation)
-async def get_conversation(conversation_id: str):
-    """Get a specific conversation with all its messages."""
-    conversation = storage.get_conversation(conversation_id)
+async def get_conversation(conversation_id: str, request: Request, response: Response):
+    """Get a specific conversation with all its messages. Supports conditional GET."""
+    conversation = await asyncio.to_thread(storage.get_conversation, conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    etag, last_modified = conversation_validators(conversation)
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return conversation
 
 
+@app.get(
+    "/api/conversations/{conversation_id}/delta",
+    response_model=ConversationDelta,
+    response_model_exclude_unset=True,
+)
+async def get_conversation_delta(conversation_id: str, since: int = Query(0, ge=0)):
+    """
+    Messages and fields of a conversation changed after version `since`.
+    `full` is set when everything was sent (since=0 or an unknown version).
+    """
+    conversation = await asyncio.to_thread(storage.get_conversation, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return storage.conversation_delta(conversation, since)
+
+
 @app.post("/api/conversations/{conversation_id}/message")
-async def send_message(conversation_id: str, request: SendMessageRequest):
+async def send_message(conversation_id: str, request: SendMessageRequest, http_request: Request):
     """
     Send a message and run the 3-stage council process.
     Returns the complete response with all stages.
@@ -104,39 +374,67 @@ async def send_message(conversation_id: str, request: SendMessageRequest):
     logger.debug(f"Received message in conversation {conversation_id}: {request.content[:100]}...")
     
     # Check if conversation exists
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await asyncio.to_thread(storage.get_conversation, conversation_id)
     if conversation is None:
         logger.warning(f"Conversation {conversation_id} not found")
         raise HTTPException(status_code=404, detail="Conversation not found")
+    mode = request_mode(request)
+    priority_class = request_priority(request)
+    cached = await find_cached_answer(request)
+    refresh = wants_refresh(request)
+
+    # Reserve a council slot (or a place in the queue) before doing any work;
+    # an answer from the cache doesn't need one
+    ticket = None if cached else admit_council_run(http_request)
+    try:
+        if ticket is not None:
+            await council_admission.wait(ticket)
+
+        with tracing.span("http.message", conversation_id=conversation_id) as trace_span:
+            # Check if this is the first message
+            is_first_message = len(conversation["messages"]) == 0
+            logger.debug(f"First message: {is_first_message}")
 
-    # Check if this is the first message
-    is_first_message = len(conversation["messages"]) == 0
-    logger.debug(f"First message: {is_first_message}")
-
-    # Add user message
-    storage.add_user_message(conversation_id, request.content)
-
-    # If this is the first message, generate a title
-    if is_first_message:
-        logger.debug("Generating conversation title...")
-        title = await generate_conversation_title(request.content)
-        logger.debug(f"Generated title: {title}")
-        storage.update_conversation_title(conversation_id, title)
-
-    # Run the 3-stage council process
-    logger.info("Starting 3-stage council process...")
-    stage1_results, stage2_results, stage3_result, metadata = await run_full_council(
-        request.content
-    )
-    logger.info("Council process completed")
+            # Add user message
+            await asyncio.to_thread(storage.add_user_message, conversation_id, request.content)
 
-    # Add assistant message with all stages
-    storage.add_assistant_message(
-        conversation_id,
-        stage1_results,
-        stage2_results,
-        stage3_result
-    )
+            # If this is the first message, title it now (an LLM title may follow later)
+            if is_first_message:
+                title = await set_initial_title(conversation_id, request.content)
+                logger.debug(f"Title: {title}")
+
+            if cached is not None:
+                # A near-duplicate was answered before: reply with that answer
+                logger.info(f"Answering from cache ({cached['similarity']:.0%} similar to an earlier question)")
+                stage1_results, stage2_results = [], []
+                stage3_result, cached_info = cached_answer(cached, refresh)
+                metadata = {"mode": mode, "cached": cached_info, "latency_ms": trace_span.elapsed_ms()}
+            else:
+                # Run the 3-stage council process
+                logger.info("Starting 3-stage council process...")
+                with priority(priority_class):
+                    stage1_results, stage2_results, stage3_result, metadata = await run_full_council(
+                        request.content, mode
+                    )
+                logger.info(f"Council process completed ({mode} mode, {metadata['latency_ms']} ms)")
+
+            # Add assistant message with all stages, and where the time went
+            timings = tracing.timing_summary(trace_span)
+            if timings:
+                metadata["timings"] = timings
+            message_index = await asyncio.to_thread(
+                storage.add_assistant_message,
+                conversation_id,
+                stage1_results,
+                stage2_results,
+                stage3_result,
+                metadata=persisted_metadata(metadata)
+            )
+            if cached is not None and refresh:
+                refresh_cached_answer(conversation_id, message_index, request.content, mode)
+    finally:
+        if ticket is not None:
+            council_admission.release(ticket)
 
     # Return the complete response with metadata
     return {
@@ -147,25 +445,77 @@ async def send_message(conversation_id: str, request: SendMessageRequest):
     }
 
 
+async def rerun_stored_answer(
+    conversation_id: str,
+    message_index: int,
+    http_request: Request,
+    **options: Any
+) -> Dict[str, Any]:
+    """Re-run part of a stored answer within a council slot, mapping failures to HTTP errors."""
+    if await asyncio.to_thread(storage.get_conversation, conversation_id) is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    ticket = admit_council_run(http_request)
+    try:
+        await council_admission.wait(ticket)
+        with tracing.span("http.rerun", conversation_id=conversation_id, message_index=message_index):
+            return await rerun.rerun_message(conversation_id, message_index, **options)
+    except rerun.RerunConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        council_admission.release(ticket)
+
+
+@app.post("/api/conversations/{conversation_id}/messages/{message_index}/rerun")
+async def rerun_members(conversation_id: str, message_index: int, request: RerunRequest, http_request: Request):
+    """
+    Re-run chosen stage 1 members of a stored answer (by default the ones that
+    failed), re-rank with the rankers they affect and synthesize again.
+    Every other result is reused from storage. Returns the updated stages.
+    """
+    return await rerun_stored_answer(
+        conversation_id,
+        message_index,
+        http_request,
+        members=request.members,
+        rerank=request.rerank,
+        chairman_model=request.chairman_model
+    )
+
+
+@app.post("/api/conversations/{conversation_id}/messages/{message_index}/resynthesize")
+async def resynthesize(conversation_id: str, message_index: int, request: ResynthesizeRequest, http_request: Request):
+    """Run only the chairman of a stored answer again, optionally with another model."""
+    return await rerun_stored_answer(
+        conversation_id,
+        message_index,
+        http_request,
+        members=[],
+        rerank=rerun.RERANK_NONE,
+        chairman_model=request.chairman_model
+    )
+
+
 @app.delete("/api/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a specific conversation."""
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await asyncio.to_thread(storage.get_conversation, conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    storage.delete_conversation(conversation_id)
+    await asyncio.to_thread(storage.delete_conversation, conversation_id)
     return {"status": "deleted"}
 
 
 @app.delete("/api/conversations")
 async def delete_all_conversations():
     """Delete all conversations."""
-    storage.delete_all_conversations()
+    await asyncio.to_thread(storage.delete_all_conversations)
     return {"status": "deleted", "count": "all"}
 
 
 @app.post("/api/conversations/{conversation_id}/message/stream")
-async def send_message_stream(conversation_id: str, request: SendMessageRequest):
+async def send_message_stream(conversation_id: str, request: SendMessageRequest, http_request: Request):
     """
     Send a message and stream the 3-stage council process.
     Returns Server-Sent Events as each stage completes.
@@ -173,103 +523,74 @@ async def send_message_stream(conversation_id: str, request: SendMessageRequest)
     logger.debug(f"Streaming message in conversation {conversation_id}")
     
     # Check if conversation exists
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await asyncio.to_thread(storage.get_conversation, conversation_id)
     if conversation is None:
         logger.warning(f"Conversation {conversation_id} not found")
         raise HTTPException(status_code=404, detail="Conversation not found")
 
+    mode = request_mode(request)
+    priority_class = request_priority(request)
+    cached = await find_cached_answer(request)
+
     # Check if this is the first message
     is_first_message = len(conversation["messages"]) == 0
 
-    async def event_generator():
-        try:
-            # Add user message
-            storage.add_user_message(conversation_id, request.content)
+    # Reserve a council slot (or a place in the queue); rejects with 429 when full.
+    # An answer from the cache is streamed at once without one.
+    ticket = None if cached else admit_council_run(http_request)
 
-            # Start title generation in parallel (don't await yet)
-            title_task = None
-            if is_first_message:
-                logger.debug("Starting title generation task")
-                title_task = asyncio.create_task(generate_conversation_title(request.content))
-
-            # Stage 1: Collect responses
-            logger.debug("Stage 1: Starting response collection")
-            yield f"data: {json.dumps({'type': 'stage1_start'})}\n\n"
-            
-            # Create a queue to collect progress events
-            stage1_progress_queue = asyncio.Queue()
-            
-            def stage1_progress_callback(completed, total):
-                # Schedule the put operation - we're in async context so this works
-                asyncio.create_task(stage1_progress_queue.put(('stage1_progress', completed, total)))
-            
-            # Stream progress events while collecting responses
-            stage1_task = asyncio.create_task(stage1_collect_responses(request.content, stage1_progress_callback))
-            while not stage1_task.done():
-                try:
-                    event_type, completed, total = await asyncio.wait_for(stage1_progress_queue.get(), timeout=0.1)
-                    yield f"data: {json.dumps({'type': event_type, 'completed': completed, 'total': total})}\n\n"
-                except asyncio.TimeoutError:
-                    await asyncio.sleep(0.05)
-            
-            stage1_results = await stage1_task
-            logger.debug(f"Stage 1: Collected {len(stage1_results)} responses")
-            yield f"data: {json.dumps({'type': 'stage1_complete', 'data': stage1_results})}\n\n"
-
-            # Stage 2: Collect rankings
-            logger.debug("Stage 2: Starting ranking collection")
-            yield f"data: {json.dumps({'type': 'stage2_start'})}\n\n"
-            
-            stage2_progress_queue = asyncio.Queue()
-            
-            def stage2_progress_callback(completed, total):
-                # Schedule the put operation - we're in async context so this works
-                asyncio.create_task(stage2_progress_queue.put(('stage2_progress', completed, total)))
-            
-            stage2_task = asyncio.create_task(stage2_collect_rankings(request.content, stage1_results, stage2_progress_callback))
-            while not stage2_task.done():
-                try:
-                    event_type, completed, total = await asyncio.wait_for(stage2_progress_queue.get(), timeout=0.1)
-                    yield f"data: {json.dumps({'type': event_type, 'completed': completed, 'total': total})}\n\n"
-                except asyncio.TimeoutError:
-                    await asyncio.sleep(0.05)
-            
-            stage2_results, label_to_model = await stage2_task
-            aggregate_rankings = calculate_aggregate_rankings(stage2_results, label_to_model)
-            logger.debug(f"Stage 2: Collected {len(stage2_results)} rankings")
-            yield f"data: {json.dumps({'type': 'stage2_complete', 'data': stage2_results, 'metadata': {'label_to_model': label_to_model, 'aggregate_rankings': aggregate_rankings}})}\n\n"
-
-            # Stage 3: Synthesize final answer
-            logger.debug("Stage 3: Starting final synthesis")
-            yield f"data: {json.dumps({'type': 'stage3_start'})}\n\n"
-            stage3_result = await stage3_synthesize_final(request.content, stage1_results, stage2_results)
-            logger.debug("Stage 3: Synthesis complete")
-            yield f"data: {json.dumps({'type': 'stage3_complete', 'data': stage3_result})}\n\n"
-
-            # Wait for title generation if it was started
-            if title_task:
-                logger.debug("Waiting for title generation")
-                title = await title_task
-                logger.debug(f"Title generated: {title}")
-                storage.update_conversation_title(conversation_id, title)
-                yield f"data: {json.dumps({'type': 'title_complete', 'data': {'title': title}})}\n\n"
-
-            # Save complete assistant message
-            storage.add_assistant_message(
-                conversation_id,
-                stage1_results,
-                stage2_results,
-                stage3_result
-            )
+    run: Optional[CouncilRun] = None
 
-            # Send completion event
-            logger.debug("Streaming complete")
-            yield f"data: {json.dumps({'type': 'complete'})}\n\n"
-
-        except Exception as e:
-            logger.error(f"Error in stream: {e}", exc_info=True)
-            # Send error event
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+    async def event_generator():
+        nonlocal run
+        try:
+            with tracing.span("http.stream", conversation_id=conversation_id):
+                # Wait for a free council slot, reporting our place in the queue
+                last_position = None
+                with tracing.child_span("admission.wait"):
+                    while ticket is not None and not ticket.admitted:
+                        position = council_admission.position(ticket)
+                        if position != last_position:
+                            yield sse_event({'type': 'queued', 'position': position})
+                            last_position = position
+                        await council_admission.wait_for_change()
+
+                # Run the council as its own task; the slot is held until it ends,
+                # even if it keeps going after the client disconnects
+                run = CouncilRun(
+                    conversation_id, request.content, is_first_message, mode, cached, wants_refresh(request),
+                    priority_class=priority_class
+                )
+                run.start()
+                if ticket is not None:
+                    run.task.add_done_callback(lambda _: council_admission.release(ticket))
+
+                while True:
+                    try:
+                        event = await asyncio.wait_for(run.events.get(), timeout=DISCONNECT_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        if await http_request.is_disconnected():
+                            run.handle_disconnect(DISCONNECT_POLICY)
+                            return
+                        if run.done and run.events.empty():
+                            return
+                        continue
+                    # Spans the write until the client has taken the event
+                    with tracing.child_span("sse.write", event=event['type']):
+                        yield sse_event(event)
+                    if event['type'] in ('complete', 'error', 'cancelled'):
+                        return
+        finally:
+            if run is None and ticket is not None:
+                # Left while still queued
+                council_admission.release(ticket)
+            elif run is not None and not run.done:
+                # The response was torn down (client gone) before the run ended
+                run.handle_disconnect(DISCONNECT_POLICY)
+
+    async def release_ticket():
+        if run is None and ticket is not None:
+            council_admission.release(ticket)
 
     return StreamingResponse(
         event_generator(),
@@ -277,10 +598,100 @@ async def send_message_stream(conversation_id: str, request: SendMessageRequest)
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-        }
+        },
+        # Covers a stream that never started; releasing is idempotent
+        background=BackgroundTask(release_ticket)
     )
 
 
+@app.get("/api/debug/traces", dependencies=[Depends(diagnostics.require_admin)])
+async def debug_traces(
+    min_ms: float = Query(TRACE_SLOW_MS, ge=0),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Recent traces from this worker that took at least `min_ms`, slowest first."""
+    return tracing.recent_traces(min_ms, limit)
+
+
+@app.get("/api/stats/rankings")
+async def ranking_stats():
+    """Stage 2 ranking parse success per model since this worker started."""
+    return ranking.parse_stats()
+
+
+@app.get("/api/stats/keys")
+async def api_key_stats():
+    """Per-key requests, errors, quarantines and rate-limit state since this worker started (keys masked)."""
+    return key_stats()
+
+
+@app.get("/api/stats/latency")
+async def latency_stats():
+    """Upstream latency percentiles and the adaptive timeout per model and stage."""
+    return latency.latency_stats()
+
+
+@app.get("/api/stats/upstream")
+async def upstream_stats():
+    """Upstream calls in flight, queued and waited for, per priority class (this worker)."""
+    return upstream_scheduler.stats()
+
+
+@app.get("/api/debug/loop", dependencies=[Depends(diagnostics.require_admin)])
+async def debug_loop(
+    stalls: int = Query(10, ge=0, le=50),
+    stacks: bool = True
+):
+    """Event-loop lag of this worker and its latest stalls, with the stack that blocked the loop."""
+    return diagnostics.loop_stats(stalls, stacks)
+
+
+@app.post("/api/debug/memory/snapshots", dependencies=[Depends(diagnostics.require_admin)])
+async def debug_memory_snapshot(
+    limit: int = Query(20, ge=0, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Snapshot this worker's traced allocations (the first call starts tracing)."""
+    return await asyncio.to_thread(diagnostics.take_snapshot, limit, group_by)
+
+
+@app.get("/api/debug/memory/snapshots", dependencies=[Depends(diagnostics.require_admin)])
+async def debug_memory_snapshots():
+    """Snapshots of this worker still kept for diffs."""
+    return diagnostics.list_snapshots()
+
+
+@app.get("/api/debug/memory/diff", dependencies=[Depends(diagnostics.require_admin)])
+async def debug_memory_diff(
+    base: int,
+    against: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Allocation sites that grew most since snapshot `base` (until `against`, or now)."""
+    try:
+        return await asyncio.to_thread(diagnostics.diff_snapshots, base, against, limit, group_by)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+
+@app.delete("/api/debug/memory", dependencies=[Depends(diagnostics.require_admin)])
+async def debug_memory_stop():
+    """Stop memory tracing in this worker and drop its snapshots."""
+    diagnostics.stop_tracing()
+    return {"status": "stopped"}
+
+
+@app.websocket("/api/ws")
+async def council_websocket(websocket: WebSocket):
+    """
+    Run councils for several conversations over one WebSocket.
+    Streams the same events as the SSE endpoint (tagged with conversation_id)
+    and accepts cancel, skip_stage, regenerate_member and set_chairman messages.
+    """
+    await CouncilSession(websocket, get_client_id(websocket)).serve()
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -297,6 +708,16 @@ if __name__ == "__main__":
             log_level="debug",  # Verbose logging in debug mode
             access_log=True  # Show HTTP request logs
         )
+    elif BACKEND_WORKERS > 1:
+        # Workers coordinate through file locks in LOCK_DIR
+        uvicorn.run(
+            "backend.main:app",  # Import string required for multiple workers
+            host="0.0.0.0",
+            port=8001,
+            workers=BACKEND_WORKERS,
+            log_level="info",
+            access_log=True
+        )
     else:
         uvicorn.run(
             app,  # Can use app object directly when reload is False
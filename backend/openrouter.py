@@ -1,60 +1,113 @@
-"""OpenRouter API client for making LLM requests."""
+"""LLM API client: sends each model's requests to its provider (OpenRouter by default)."""
 
+import asyncio
+import logging
+import time
 import httpx
 from typing import List, Dict, Any, Optional
-from .config import OPENROUTER_API_KEY, OPENROUTER_API_URL
+from . import latency
+from .budget import estimate_messages, fit_messages, prompt_budget
+from .providers import resolve
+from .scheduler import current_priority, upstream_scheduler
+from .tracing import child_span, httpx_trace_hook
+
+logger = logging.getLogger(__name__)
 
 
 async def query_model(
     model: str,
     messages: List[Dict[str, str]],
-    timeout: float = 120.0
+    timeout: Optional[float] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    stage: str = "default"
 ) -> Optional[Dict[str, Any]]:
     """
-    Query a single model via OpenRouter API.
+    Query a single model via its provider.
 
     Args:
-        model: OpenRouter model identifier (e.g., "openai/gpt-4o")
+        model: Model identifier, either an OpenRouter id (e.g., "openai/gpt-4o")
+            or "<provider>:<model>" for a configured provider
         messages: List of message dicts with 'role' and 'content'
-        timeout: Request timeout in seconds
+        timeout: Fixed timeout in seconds (defaults to the provider's), used
+            until the model's latency in this stage has been observed enough
+            to derive one
+        response_format: Optional structured output request (e.g. a JSON schema)
+        stage: Council stage of the call, which keys its latency histogram
+
+    The call waits for an upstream slot in the current priority class (see
+    scheduler.priority); time spent waiting doesn't count against the timeout.
 
     Returns:
         Response dict with 'content' and optional 'reasoning_details', or None if failed
     """
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-    }
+    provider, upstream_model = resolve(model)
+    # Trim prompts that would overflow the model's context rather than fail
+    budget = prompt_budget(model)
+    fitted = fit_messages(messages, budget)
 
     payload = {
-        "model": model,
-        "messages": messages,
+        "model": upstream_model,
+        "messages": fitted,
     }
-
-    try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                OPENROUTER_API_URL,
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-
-            data = response.json()
-            message = data['choices'][0]['message']
-
-            return {
-                'content': message.get('content'),
-                'reasoning_details': message.get('reasoning_details')
-            }
-
-    except Exception as e:
-        error_msg = str(e)
-        print(f"Error querying model {model}: {error_msg}")
-        return {
-            'content': None,
-            'error': error_msg
-        }
+    if response_format:
+        payload["response_format"] = response_format
+
+    deadline = latency.timeout_for(model, stage, timeout or provider.timeout)
+
+    priority = current_priority()
+    with child_span("upstream", model=model, provider=provider.name, stage=stage, priority=priority) as span:
+        span.set(prompt_tokens=estimate_messages(fitted), timeout_s=round(deadline, 2))
+        if fitted is not messages:
+            span.set(trimmed_to=budget)
+        queued = time.perf_counter()
+        # Waiting for a slot doesn't count against the deadline
+        async with upstream_scheduler.slot(priority):
+            started = time.perf_counter()
+            if started - queued >= 0.001:
+                span.set(queued_ms=round((started - queued) * 1000, 1))
+            try:
+                trace_hook = httpx_trace_hook(span)
+                # The read deadline is also enforced over the whole exchange, so a
+                # server trickling bytes can't hold the call open
+                response = await asyncio.wait_for(
+                    provider.post_chat(
+                        payload,
+                        timeout=deadline,
+                        extensions={"trace": trace_hook} if trace_hook else None
+                    ),
+                    deadline + provider.connect_timeout
+                )
+                span.set(status_code=response.status_code)
+                response.raise_for_status()
+                latency.record(model, stage, time.perf_counter() - started)
+
+                data = response.json()
+                message = data['choices'][0]['message']
+
+                return {
+                    'content': message.get('content'),
+                    # llama.cpp and vLLM return reasoning as 'reasoning_content'
+                    'reasoning_details': message.get('reasoning_details') or message.get('reasoning_content')
+                }
+
+            except (asyncio.TimeoutError, httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout):
+                # Only counted: a timeout says nothing about how long the call would have taken
+                latency.record_timeout(model, stage)
+                error_msg = f"Timed out after {deadline:.1f}s"
+                span.set(error=error_msg)
+                logger.warning(f"Error querying model {model}: {error_msg}")
+                return {
+                    'content': None,
+                    'error': error_msg
+                }
+            except Exception as e:
+                error_msg = str(e)
+                span.set(error=error_msg)
+                logger.warning(f"Error querying model {model}: {error_msg}")
+                return {
+                    'content': None,
+                    'error': error_msg
+                }
 
 
 async def query_models_parallel(
@@ -65,7 +118,7 @@ async def query_models_parallel(
     Query multiple models in parallel.
 
     Args:
-        models: List of OpenRouter model identifiers
+        models: List of model identifiers
         messages: List of message dicts to send to each model
 
     Returns:
@@ -0,0 +1,197 @@
+"""Model providers: OpenRouter and any OpenAI-compatible server (llama.cpp, vLLM, ...)."""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_API_KEYS,
+    OPENROUTER_API_URL,
+    OPENROUTER_KEY_WEIGHTS,
+    PROVIDERS,
+)
+from .keypool import QUARANTINE_STATUSES, ApiKey, KeyPool, build_pool
+
+# Name of the built-in provider, used for models without a provider prefix
+DEFAULT_PROVIDER = "openrouter"
+
+
+class Provider:
+    """
+    One chat-completions endpoint with its own credentials and connection settings.
+
+    Each provider keeps a pooled HTTP client, so repeated calls to the same
+    server (a local one especially) reuse open connections. A provider with
+    several API keys spreads requests over them (see KeyPool) and retries a
+    request on another key when one is rejected with 401, 402 or 429.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        keys: Optional[KeyPool] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 120.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 20,
+        context_tokens: Optional[int] = None,
+    ):
+        self.name = name
+        self.url = url
+        self.keys = keys
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.context_tokens = context_tokens
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_config(cls, name: str, settings: Dict[str, Any]) -> "Provider":
+        """
+        Build a provider from its PROVIDERS entry.
+
+        Raises:
+            ValueError: If the entry has neither 'url' nor 'base_url'
+        """
+        url = settings.get("url")
+        if not url and settings.get("base_url"):
+            url = settings["base_url"].rstrip("/") + "/chat/completions"
+        if not url:
+            raise ValueError(f"Provider {name!r} needs a 'url' or 'base_url'")
+        keys = settings.get("api_keys") or []
+        if not keys and settings.get("api_key"):
+            keys = [settings["api_key"]]
+        if not keys and settings.get("api_key_env"):
+            keys = [k.strip() for k in os.getenv(settings["api_key_env"], "").split(",") if k.strip()]
+        return cls(
+            name,
+            url,
+            keys=build_pool(keys, settings.get("key_weights", ())),
+            headers=settings.get("headers"),
+            timeout=float(settings.get("timeout", 120.0)),
+            connect_timeout=float(settings.get("connect_timeout", 10.0)),
+            max_connections=int(settings.get("max_connections", 20)),
+            context_tokens=int(settings["context_tokens"]) if settings.get("context_tokens") else None,
+        )
+
+    def client(self) -> httpx.AsyncClient:
+        """The pooled client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections),
+            )
+            self._loop = loop
+        return self._client
+
+    async def post_chat(
+        self,
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+        extensions: Optional[Dict[str, Any]] = None,
+    ) -> httpx.Response:
+        """
+        POST a chat-completions payload.
+
+        Args:
+            payload: Request body (model, messages, ...)
+            timeout: Overall timeout in seconds (defaults to the provider's)
+            extensions: httpx request extensions (e.g. a trace hook)
+
+        Returns:
+            The HTTP response, whatever its status
+        """
+        headers = {"Content-Type": "application/json", **self.headers}
+        request_timeout = httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout)
+        if self.keys is None:
+            return await self.client().post(
+                self.url, headers=headers, json=payload, timeout=request_timeout, extensions=extensions
+            )
+
+        tried: List[ApiKey] = []
+        while True:
+            key = self.keys.acquire(exclude=tried)
+            tried.append(key)
+            started = time.perf_counter()
+            try:
+                response = await self.client().post(
+                    self.url,
+                    headers={**headers, "Authorization": f"Bearer {key.key}"},
+                    json=payload,
+                    timeout=request_timeout,
+                    extensions=extensions,
+                )
+            except asyncio.CancelledError:
+                self.keys.abandon(key)
+                raise
+            except Exception:
+                self.keys.release(key, None, latency=time.perf_counter() - started)
+                raise
+            self.keys.release(key, response.status_code, response.headers, time.perf_counter() - started)
+            if response.status_code not in QUARANTINE_STATUSES or not self.keys.has_alternative(tried):
+                return response
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+
+def _load_providers() -> Dict[str, Provider]:
+    openrouter_keys = build_pool(OPENROUTER_API_KEYS or [OPENROUTER_API_KEY], OPENROUTER_KEY_WEIGHTS)
+    providers = {DEFAULT_PROVIDER: Provider(DEFAULT_PROVIDER, OPENROUTER_API_URL, keys=openrouter_keys)}
+    for name, settings in PROVIDERS.items():
+        providers[name] = Provider.from_config(name, settings)
+    return providers
+
+
+_providers = _load_providers()
+
+
+def get_provider(name: str) -> Provider:
+    """
+    Look up a provider by name.
+
+    Raises:
+        ValueError: If no such provider is configured
+    """
+    try:
+        return _providers[name]
+    except KeyError:
+        raise ValueError(f"Unknown provider: {name!r}") from None
+
+
+def resolve(model: str) -> Tuple[Provider, str]:
+    """
+    Find the provider serving a council model.
+
+    A model written "<provider>:<name>" (e.g. "local:qwen3-8b") goes to that
+    provider as <name>; anything else, including OpenRouter ids such as
+    "x-ai/grok-4.1-fast:free", goes to OpenRouter unchanged.
+
+    Returns:
+        (provider, model name to send it)
+    """
+    prefix, sep, name = model.partition(":")
+    if sep and name and prefix in _providers:
+        return _providers[prefix], name
+    return _providers[DEFAULT_PROVIDER], model
+
+
+def key_stats() -> Dict[str, List[Dict[str, Any]]]:
+    """Per-key usage of every provider with API keys, since this worker started."""
+    return {name: provider.keys.stats() for name, provider in _providers.items() if provider.keys is not None}
+
+
+async def close_providers():
+    """Close every provider's connection pool (at shutdown)."""
+    for provider in _providers.values():
+        await provider.aclose()
@@ -0,0 +1,357 @@
+"""Parsing of stage 2 rankings: structured JSON output with a single-pass text fallback."""
+
+import itertools
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# How a ranking was recovered, from most to least reliable
+METHOD_JSON = "json"
+METHOD_FINAL_RANKING = "final_ranking"
+METHOD_NUMBERED_LIST = "numbered_list"
+METHOD_MENTIONS = "mentions"
+METHOD_NONE = "none"
+
+# Methods that count as a successful parse; "mentions" is only a guess
+PARSE_SUCCESS_METHODS = (METHOD_JSON, METHOD_FINAL_RANKING, METHOD_NUMBERED_LIST)
+
+# The exact header is found with str.rfind first: a case-insensitive regex
+# scan of a long evaluation costs far more than the rest of the parse
+_HEADER_RE = re.compile(r"FINAL RANKING\s*:?")
+_HEADER_ANY_CASE_RE = re.compile(r"FINAL\s+RANKING\s*:?", re.IGNORECASE)
+
+# Rank number at the start of a line: "1.", "2)", "**3.**", "- 4:"
+_RANK_PATTERN = r"[ \t>*_#-]*\(?(?P<rank>\d{1,2})\s*[.):\]]"
+_RANK_RE = re.compile(_RANK_PATTERN)
+
+# One scan handles everything in a ranking list: line breaks (with the rank
+# number that may follow) and response labels. Every token starts with a
+# newline or "R", which lets the regex engine skip the text in between.
+_TOKEN_RE = re.compile(rf"\n(?:{_RANK_PATTERN})?|Response\s+(?P<label>[A-Z])\b")
+
+# Text between two labels that ties them: on a numbered line any of
+# "=", ",", "/", "&", "and", "tied with"; on an unnumbered line only "=" or "tied"
+_TIE_GAP_RE = re.compile(r"[\s*_]*(?:=|,|/|&|\band\b|\btied?(?:\s+with)?\b)[\s*_]*", re.IGNORECASE)
+_EQUAL_GAP_RE = re.compile(r"[\s*_]*(?:=|\btied?(?:\s+with)?\b)[\s*_]*", re.IGNORECASE)
+
+# Text between two labels on an unnumbered line that orders them ("A > B", "A, B")
+_SEQUENCE_GAP_RE = re.compile(r"[\s*_]*(?:,|>|->|→|;|\bthen\b)?[\s*_]*", re.IGNORECASE)
+
+# Text allowed before a label at the start of an unnumbered list line
+_BULLET_RE = re.compile(r"[ \t>*_#•-]*")
+
+# One line of a plain "N. Response X" list, the format the prompt asks for
+_PLAIN_ITEM_RE = re.compile(r"\n[ \t]*(\d{1,2})\.[ \t]*Response ([A-Z])[ \t]*(?=\n|\Z)")
+
+# Start of a numbered list ("1." at the start of a line after the first)
+_LIST_START_RE = re.compile(r"\n[ \t>*_#-]*\(?1\s*[.):\]]")
+_LABEL_RE = re.compile(r"Response\s+([A-Z])\b")
+
+_JSON_START_RE = re.compile(r"\s*\{")
+
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.DOTALL)
+
+# Per-model parse outcomes since this worker started
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def ranking_response_format(labels: List[str]) -> Dict[str, Any]:
+    """
+    JSON-schema structured output request for a ranking of the given labels.
+
+    Tied responses share a rank.
+
+    Args:
+        labels: Response labels being ranked (e.g. "Response A")
+
+    Returns:
+        An OpenAI/OpenRouter `response_format` value
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "council_ranking",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "evaluation": {
+                        "type": "string",
+                        "description": "Your evaluation of each response",
+                    },
+                    "ranking": {
+                        "type": "array",
+                        "description": "Every response, best first; tied responses share a rank",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "response": {"type": "string", "enum": labels},
+                                "rank": {"type": "integer", "minimum": 1},
+                            },
+                            "required": ["response", "rank"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["evaluation", "ranking"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def parse_ranking(text: str, valid_labels: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Recover a ranking from a model's stage 2 output.
+
+    Tries, in order: structured JSON, the "FINAL RANKING:" section, the last
+    numbered list in the text, and finally the order in which labels are
+    first mentioned. Ties ("1. Response A = Response B", repeated rank
+    numbers, equal JSON ranks) become groups; repeated labels and labels
+    outside `valid_labels` are dropped.
+
+    Args:
+        text: Full model response
+        valid_labels: Labels that may appear (e.g. "Response A"); any if None
+
+    Returns:
+        Dict with 'groups' (list of tied label groups, best first) and
+        'method' (one of the METHOD_* constants)
+    """
+    valid = set(valid_labels) if valid_labels is not None else None
+
+    groups = _parse_json(text, valid)
+    if groups:
+        return {"groups": groups, "method": METHOD_JSON}
+
+    position = text.rfind("FINAL RANKING")
+    header = _HEADER_RE.match(text, position) if position >= 0 else None
+    if header is None and ("ANKING" in text or "anking" in text):
+        header = _last_match(_HEADER_ANY_CASE_RE, text)
+    if header is not None:
+        groups = _plain_list(text, header.end(), valid) or _scan_list(text, header.end(), valid, False)
+        if groups:
+            return {"groups": groups, "method": METHOD_FINAL_RANKING}
+
+    list_start = _last_match(_LIST_START_RE, text)
+    if list_start is not None or _RANK_RE.match(text):
+        start = list_start.start() if list_start else 0
+        groups = _plain_list(text, start, valid) or _scan_list(text, start, valid, True)
+        if groups:
+            return {"groups": groups, "method": METHOD_NUMBERED_LIST}
+
+    groups = _scan_mentions(text, valid)
+    if groups:
+        return {"groups": groups, "method": METHOD_MENTIONS}
+    return {"groups": [], "method": METHOD_NONE}
+
+
+def flatten(groups: List[List[str]]) -> List[str]:
+    """Labels in ranked order, with ties in the order they were written."""
+    return [label for group in groups for label in group]
+
+
+def format_ranking(groups: List[List[str]]) -> str:
+    """Render groups in the FINAL RANKING text convention (ties joined by '=')."""
+    lines = [f"{position}. {' = '.join(group)}" for position, group in enumerate(groups, start=1)]
+    return "FINAL RANKING:\n" + "\n".join(lines)
+
+
+def average_positions(groups: List[List[str]]) -> Dict[str, float]:
+    """
+    Position of each label, with tied labels sharing the average of the
+    positions they span (a two-way tie for first is 1.5 each).
+    """
+    positions = {}
+    start = 1
+    for group in groups:
+        shared = start + (len(group) - 1) / 2
+        for label in group:
+            positions[label] = shared
+        start += len(group)
+    return positions
+
+
+def _last_match(pattern: "re.Pattern", text: str) -> Optional["re.Match"]:
+    match = None
+    for match in pattern.finditer(text):
+        pass
+    return match
+
+
+def _parse_json(text: str, valid: Optional[set]) -> List[List[str]]:
+    if _JSON_START_RE.match(text):
+        candidate = text.strip()
+    elif "`" not in text:
+        return []
+    else:
+        block = _JSON_BLOCK_RE.search(text)
+        if block is None:
+            return []
+        candidate = block.group(1)
+    try:
+        data = json.loads(candidate)
+    except ValueError:
+        return []
+    ranking = data.get("ranking") if isinstance(data, dict) else None
+    if not isinstance(ranking, list):
+        return []
+
+    # Accept [{"response", "rank"}], ["Response A", ...] and [["Response A", "Response B"], ...]
+    by_rank: Dict[float, List[str]] = {}
+    for position, item in enumerate(ranking, start=1):
+        if isinstance(item, dict):
+            labels, rank = [item.get("response")], item.get("rank", position)
+        elif isinstance(item, list):
+            labels, rank = item, position
+        else:
+            labels, rank = [item], position
+        if not isinstance(rank, (int, float)):
+            rank = position
+        by_rank.setdefault(rank, []).extend(labels)
+
+    seen = set()
+    groups = []
+    for rank in sorted(by_rank):
+        group = []
+        for label in by_rank[rank]:
+            if isinstance(label, str) and label not in seen and (valid is None or label in valid):
+                seen.add(label)
+                group.append(label)
+        if group:
+            groups.append(group)
+    return groups
+
+
+def _plain_list(text: str, start: int, valid: Optional[set]) -> List[List[str]]:
+    """
+    Fast path for a well-formed list: ranks 1..n, one label per line and no
+    other labels after `start`. Returns [] for anything else.
+    """
+    items = _PLAIN_ITEM_RE.findall(text, start)
+    if not items or text.count("Response", start) != len(items):
+        return []
+    labels = [f"Response {letter}" for _, letter in items]
+    if len(set(labels)) != len(labels) or (valid is not None and not valid.issuperset(labels)):
+        return []
+    if [int(rank) for rank, _ in items] != list(range(1, len(items) + 1)):
+        return []
+    return [[label] for label in labels]
+
+
+def _scan_list(text: str, start: int, valid: Optional[set], restart_on_first: bool) -> List[List[str]]:
+    """
+    Single pass over a ranking list starting at `start`.
+
+    Args:
+        restart_on_first: Start over at every "1." so only the last
+            numbered list in the text counts (used when there is no header)
+    """
+    groups: List[List[str]] = []
+    seen = set()
+    line_start = start
+    line_rank: Optional[int] = None
+    last_rank: Optional[int] = None
+    line_has_label = False
+    last_label_end = start
+    numbered = False
+
+    tokens: Iterable["re.Match"] = _TOKEN_RE.finditer(text, start)
+    if start == 0:
+        # A list at the very start of the text has no newline before its "1."
+        first = _RANK_RE.match(text)
+        if first:
+            tokens = itertools.chain([first], tokens)
+
+    for match in tokens:
+        letter = match.group("label") if match.re is _TOKEN_RE else None
+        if letter is None:
+            if match.group(0)[0] == "\n":
+                line_start = match.start() + 1
+                line_rank = None
+                line_has_label = False
+            rank = match.group("rank")
+            if rank is not None:
+                rank = int(rank)
+                if restart_on_first and rank == 1:
+                    groups, seen, last_rank = [], set(), None
+                numbered = True
+                line_rank = rank
+                last_label_end = match.end()
+            continue
+
+        label = f"Response {letter}"
+        if label in seen or (valid is not None and label not in valid):
+            continue
+        if line_rank is not None:
+            if not line_has_label:
+                # First label after a rank number; a repeated number is a tie
+                if line_rank == last_rank and groups:
+                    groups[-1].append(label)
+                else:
+                    groups.append([label])
+                last_rank = line_rank
+            elif _TIE_GAP_RE.fullmatch(text, last_label_end, match.start()):
+                groups[-1].append(label)
+            else:
+                # A label mentioned in passing (e.g. "better than Response B")
+                continue
+        elif restart_on_first:
+            # Without a header only numbered lists count
+            continue
+        elif not line_has_label and _BULLET_RE.fullmatch(text, line_start, match.start()):
+            # Unnumbered list line under the header ("- Response A")
+            groups.append([label])
+        elif line_has_label and _EQUAL_GAP_RE.fullmatch(text, last_label_end, match.start()):
+            groups[-1].append(label)
+        elif line_has_label and _SEQUENCE_GAP_RE.fullmatch(text, last_label_end, match.start()):
+            # Inline ordering ("Response C > Response A, Response B")
+            groups.append([label])
+        else:
+            # A label mentioned in passing (e.g. "better than Response B")
+            continue
+        seen.add(label)
+        line_has_label = True
+        last_label_end = match.end()
+
+    if restart_on_first and not numbered:
+        return []
+    return groups
+
+
+def _scan_mentions(text: str, valid: Optional[set]) -> List[List[str]]:
+    """Last resort: labels in the order they are first mentioned."""
+    seen = {}
+    for match in _LABEL_RE.finditer(text):
+        label = f"Response {match.group(1)}"
+        if label not in seen and (valid is None or label in valid):
+            seen[label] = None
+            if valid is not None and len(seen) == len(valid):
+                break
+    return [[label] for label in seen]
+
+
+def record_parse(model: str, method: str):
+    """Count one ranking parse outcome for a model."""
+    counts = _stats.setdefault(model, {})
+    counts[method] = counts.get(method, 0) + 1
+
+
+def parse_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Ranking parse success per model since this worker started.
+
+    Returns:
+        Dict of model -> attempts, parsed, success_rate and counts per method
+    """
+    report = {}
+    for model, counts in sorted(_stats.items()):
+        attempts = sum(counts.values())
+        parsed = sum(counts.get(method, 0) for method in PARSE_SUCCESS_METHODS)
+        report[model] = {
+            "attempts": attempts,
+            "parsed": parsed,
+            "success_rate": round(parsed / attempts, 3) if attempts else None,
+            "methods": dict(counts),
+        }
+    return report
@@ -0,0 +1,251 @@
+"""Partial re-runs of a stored council answer: chosen members, the rankers they affect, and the chairman."""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from . import storage
+from .config import CHAIRMAN_MODEL, COUNCIL_MODELS, COUNCIL_SHELDON_NAMES
+from .council import (
+    calculate_aggregate_rankings,
+    stage1_query_member,
+    stage2_collect_rankings,
+    stage3_solo_answer,
+    stage3_synthesize_final,
+)
+from .ranking import flatten, parse_ranking
+from .runner import resolve_member
+from .tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Which rankers rank again after members are re-run
+RERANK_AFFECTED = "affected"  # rankers that failed, or whose ranking placed a re-run response
+RERANK_ALL = "all"
+RERANK_NONE = "none"
+RERANK_POLICIES = (RERANK_AFFECTED, RERANK_ALL, RERANK_NONE)
+
+# Answers currently being re-run in this worker, as (conversation_id, message_index).
+# Across workers, the first re-run to finish is saved and the others conflict.
+_running: set = set()
+
+
+class RerunConflict(Exception):
+    """Raised when the same answer is already being re-run, or changed during a re-run."""
+
+
+def is_failed(text: Optional[str]) -> bool:
+    """Whether a stored stage 1 response or stage 2 ranking is an error placeholder."""
+    return not text or text.startswith("*Error")
+
+
+def _find(entries: Sequence[Dict[str, Any]], member: int) -> Optional[int]:
+    """Position of a council member's entry in a stored stage 1 or stage 2 list."""
+    model = COUNCIL_MODELS[member]
+    sheldon_name = COUNCIL_SHELDON_NAMES[member] if member < len(COUNCIL_SHELDON_NAMES) else None
+    for position, entry in enumerate(entries):
+        if entry.get("model") == model and entry.get("sheldon_name") == sheldon_name:
+            return position
+    return None
+
+
+def _ranked_labels(entry: Dict[str, Any], label_to_model: Dict[str, str]) -> List[List[str]]:
+    """A stored ranking's groups, parsed from its text for messages that predate parsed_groups."""
+    groups = entry.get("parsed_groups")
+    if groups is None:
+        groups = parse_ranking(entry["ranking"], label_to_model)["groups"]
+    return groups
+
+
+def rankers_to_rerun(
+    stage2: List[Dict[str, Any]],
+    changed_labels: Sequence[str],
+    label_to_model: Dict[str, str],
+    policy: str
+) -> List[int]:
+    """
+    Council members whose stage 2 ranking has to be redone.
+
+    With RERANK_AFFECTED that is every ranker without a usable ranking,
+    plus every ranker that placed one of the changed responses (its view
+    of that response is out of date). Rankers that left a changed response
+    out, typically because it was an error, keep their ranking.
+
+    Args:
+        stage2: Stored stage 2 results
+        changed_labels: Labels ("Response B") of the re-run stage 1 responses
+        label_to_model: Labels of the updated stage 1 responses
+        policy: One of RERANK_POLICIES
+
+    Returns:
+        Indices into COUNCIL_MODELS
+    """
+    if policy == RERANK_NONE or not stage2:
+        return []
+    if policy == RERANK_ALL:
+        return list(range(len(COUNCIL_MODELS)))
+    changed = set(changed_labels)
+    rankers = []
+    for member in range(len(COUNCIL_MODELS)):
+        position = _find(stage2, member)
+        if position is None or is_failed(stage2[position]["ranking"]):
+            rankers.append(member)
+            continue
+        groups = _ranked_labels(stage2[position], label_to_model)
+        if changed & set(flatten(groups)):
+            rankers.append(member)
+    return rankers
+
+
+@traced("rerun")
+async def rerun_message(
+    conversation_id: str,
+    message_index: int,
+    members: Optional[Sequence[Any]] = None,
+    rerank: str = RERANK_AFFECTED,
+    chairman_model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Re-run part of a stored council answer and save the result in its place.
+
+    Only the chosen stage 1 members are queried again; every other response
+    is reused from storage, under the same label. The rankers chosen by
+    `rerank` (see rankers_to_rerun) rank the updated responses; the rest keep
+    their rankings, without their votes on responses that changed. The
+    chairman then synthesizes again from the updated stages.
+
+    Args:
+        conversation_id: Conversation identifier
+        message_index: Position of the assistant message
+        members: Members to re-run (index, Sheldon name or model id);
+            defaults to those whose response failed, [] for none
+        rerank: One of RERANK_POLICIES
+        chairman_model: Model to synthesize with (defaults to CHAIRMAN_MODEL)
+
+    Returns:
+        The updated message's stage1, stage2, stage3 and metadata (with
+        label_to_model and aggregate_rankings, as a council run returns)
+
+    Raises:
+        ValueError: If the conversation, answer or a member doesn't exist,
+            or the answer has no council results to reuse
+        RerunConflict: If the answer is already being re-run in this worker,
+            or was changed (e.g. by a re-run in another worker) before this
+            one finished; the changed answer is kept
+    """
+    if rerank not in RERANK_POLICIES:
+        raise ValueError(f"Unknown rerank policy {rerank!r} (allowed: {', '.join(RERANK_POLICIES)})")
+    conversation = await asyncio.to_thread(storage.get_conversation, conversation_id)
+    if conversation is None:
+        raise ValueError(f"Conversation {conversation_id} not found")
+    messages = conversation["messages"]
+    if (
+        not 0 < message_index < len(messages)
+        or messages[message_index].get("role") != "assistant"
+        or messages[message_index - 1].get("role") != "user"
+    ):
+        raise ValueError(f"No council answer at {message_index} in {conversation_id}")
+
+    message = messages[message_index]
+    started_from = message.get("version", 0)
+    user_query = messages[message_index - 1]["content"]
+    stage1 = [dict(result) for result in message.get("stage1") or []]
+    stage2 = [dict(result) for result in message.get("stage2") or []]
+    metadata = dict(message.get("metadata") or {})
+    if not stage1 and metadata.get("cached"):
+        raise ValueError("This answer came from the cache and has no council results to reuse")
+
+    if members is None:
+        chosen = [
+            member for member in range(len(COUNCIL_MODELS))
+            if _find(stage1, member) is not None and is_failed(stage1[_find(stage1, member)]["response"])
+        ]
+    else:
+        chosen = list(dict.fromkeys(resolve_member(member) for member in members))
+    if chosen and not stage1:
+        raise ValueError("This answer was given by the chairman alone; only the chairman can be re-run")
+
+    key = (conversation_id, message_index)
+    if key in _running:
+        raise RerunConflict(f"Message {message_index} of {conversation_id} is already being re-run")
+    _running.add(key)
+    try:
+        started = time.perf_counter()
+
+        # Stage 1: the chosen members only; a member skipped in the original
+        # run joins under the next free label
+        fresh = await asyncio.gather(*(stage1_query_member(user_query, member) for member in chosen))
+        changed_labels = []
+        for member, result in zip(chosen, fresh):
+            position = _find(stage1, member)
+            if position is None:
+                stage1.append(result)
+                position = len(stage1) - 1
+            else:
+                stage1[position] = result
+            changed_labels.append(f"Response {chr(65 + position)}")
+        label_to_model = {f"Response {chr(65 + i)}": result["model"] for i, result in enumerate(stage1)}
+
+        # Stage 2: affected rankers rank again, the others lose their votes on changed responses
+        rankers = rankers_to_rerun(stage2, changed_labels, label_to_model, rerank)
+        if rankers:
+            reranked, _ = await stage2_collect_rankings(user_query, stage1, rankers=rankers)
+            for member, result in zip(rankers, reranked):
+                position = _find(stage2, member)
+                if position is None:
+                    stage2.append(result)
+                else:
+                    stage2[position] = result
+        refreshed = {COUNCIL_MODELS[member] for member in rankers}
+        for entry in stage2:
+            if entry["model"] in refreshed or is_failed(entry["ranking"]):
+                continue
+            groups = _ranked_labels(entry, label_to_model)
+            stale = [label for label in flatten(groups) if label in changed_labels]
+            if stale:
+                groups = [[label for label in group if label not in stale] for group in groups]
+                entry["parsed_groups"] = [group for group in groups if group]
+                entry["parsed_ranking"] = flatten(entry["parsed_groups"])
+                entry["stale_labels"] = sorted(set(entry.get("stale_labels", [])) | set(stale))
+        aggregate_rankings = calculate_aggregate_rankings(stage2, label_to_model)
+
+        # Stage 3
+        chairman_model = chairman_model or CHAIRMAN_MODEL
+        if stage1:
+            stage3 = await stage3_synthesize_final(user_query, stage1, stage2, chairman_model=chairman_model)
+        else:
+            stage3 = await stage3_solo_answer(user_query, chairman_model)
+
+        # The answer is no longer the speculative draft (if it was one)
+        metadata.pop("speculative", None)
+        metadata["reruns"] = metadata.get("reruns", []) + [{
+            "at": datetime.utcnow().isoformat(),
+            "members": [COUNCIL_MODELS[member] for member in chosen],
+            "rankers": [COUNCIL_MODELS[member] for member in rankers],
+            "chairman_model": chairman_model,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }]
+        replaced = await asyncio.to_thread(
+            storage.replace_assistant_message,
+            conversation_id, message_index, stage1, stage2, stage3,
+            metadata=metadata, expected_version=started_from
+        )
+        if not replaced:
+            raise RerunConflict(
+                f"Message {message_index} of {conversation_id} changed during the re-run; reload it and retry"
+            )
+        logger.info(
+            f"Re-ran {len(chosen)} member(s) and {len(rankers)} ranker(s) of message {message_index} "
+            f"in {conversation_id}"
+        )
+    finally:
+        _running.discard(key)
+
+    return {
+        "stage1": stage1,
+        "stage2": stage2,
+        "stage3": stage3,
+        "metadata": {**metadata, "label_to_model": label_to_model, "aggregate_rankings": aggregate_rankings},
+    }
@@ -0,0 +1,536 @@
+"""Background council runs that stream events and survive (or stop on) client disconnects."""
+
+import asyncio
+import logging
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+from . import storage
+from .admission import AdmissionRejected, Ticket, council_admission
+from .config import CHAIRMAN_MODEL, COUNCIL_MODELS, COUNCIL_SHELDON_NAMES, SEMANTIC_CACHE_REFRESH
+from .council import (
+    MODE_LITE,
+    MODE_SOLO,
+    MODE_SPECULATIVE,
+    calculate_aggregate_rankings,
+    council_members,
+    drafts_agree,
+    persisted_metadata,
+    resolve_mode,
+    run_full_council,
+    stage1_query_member,
+    stage2_collect_rankings,
+    stage3_solo_answer,
+    stage3_synthesize_final,
+    validate_council_config,
+)
+from .scheduler import BACKGROUND, INTERACTIVE, priority, run_with_priority
+from .titles import set_initial_title
+from .tracing import root_span, span, timing_summary, traced
+
+logger = logging.getLogger(__name__)
+
+# What to do with a run when its client goes away
+POLICY_CANCEL = "cancel"
+POLICY_FINISH = "finish"
+
+# Stages a client may skip: stage 1 keeps the members that already answered
+SKIPPABLE_STAGES = ("stage1", "stage2")
+
+# Background council runs refreshing answers that were served from the cache
+_refreshes: set = set()
+
+# Admission queue shared by those refreshes, so they queue behind each other
+# rather than taking a client's turn
+REFRESH_CLIENT_ID = "cache-refresh"
+
+
+class CouncilRun:
+    """
+    One streamed council run for a conversation.
+
+    The run executes as its own asyncio task and publishes the same events
+    the SSE endpoint sends onto `events`. Because it is decoupled from the
+    response, a client disconnect can either cancel it (which cancels the
+    in-flight upstream requests) or let it finish and persist in the
+    background. Either outcome is recorded in the stored assistant message.
+
+    Clients with a two-way connection can also steer a run in flight with
+    cancel(), skip_stage(), regenerate_member() and set_chairman().
+    """
+
+    def __init__(
+        self,
+        conversation_id: str,
+        user_query: str,
+        is_first_message: bool,
+        mode: Optional[str] = None,
+        cached: Optional[Dict[str, Any]] = None,
+        refresh: bool = SEMANTIC_CACHE_REFRESH,
+        priority_class: str = INTERACTIVE
+    ):
+        self.conversation_id = conversation_id
+        self.user_query = user_query
+        self.is_first_message = is_first_message
+        self.mode = resolve_mode(mode)
+        self.members = council_members(self.mode)
+        # A near-duplicate match from semantic_cache.lookup() to answer with,
+        # and whether to run the council in the background afterwards
+        self.cached = cached
+        self.refresh = refresh
+        # Scheduling class of the run's upstream calls
+        self.priority_class = priority_class
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self.stage: Optional[str] = None
+        self.disconnected = False
+        self.cancel_reason: Optional[str] = None
+        self.user_message_saved = False
+        self.chairman_model = CHAIRMAN_MODEL
+
+        # Control state
+        self._skipped: set = set()
+        self._stage_task: Optional[asyncio.Task] = None
+        self._member_tasks: Dict[int, asyncio.Task] = {}
+        self._member_results: Dict[int, Dict[str, Any]] = {}
+        self._members_changed = asyncio.Event()
+        self._span = None
+
+        # Partial results, kept so cancelled work can still be recorded
+        self.stage1_results: Optional[List[Dict[str, Any]]] = None
+        self.stage2_results: Optional[List[Dict[str, Any]]] = None
+        self.stage3_result: Optional[Dict[str, Any]] = None
+        self.metadata: Dict[str, Any] = {'mode': self.mode}
+
+    def emit(self, event: Dict[str, Any]):
+        """Publish an event to whoever is streaming this run."""
+        self.events.put_nowait(event)
+
+    def start(self) -> asyncio.Task:
+        """Start the run in the background."""
+        self.task = asyncio.create_task(run_with_priority(self.priority_class, self._run()))
+        return self.task
+
+    @property
+    def done(self) -> bool:
+        return self.task is not None and self.task.done()
+
+    def handle_disconnect(self, policy: str):
+        """
+        React to the client going away.
+
+        Args:
+            policy: POLICY_CANCEL to stop upstream calls now, POLICY_FINISH
+                to let the run complete and persist without a listener
+        """
+        if self.disconnected or self.task is None or self.task.done():
+            return
+        self.disconnected = True
+        if policy == POLICY_CANCEL:
+            logger.info(f"Client disconnected from {self.conversation_id} during {self.stage}; cancelling run")
+            self.cancel_reason = "disconnect"
+            self.task.cancel()
+        else:
+            logger.info(f"Client disconnected from {self.conversation_id} during {self.stage}; finishing in background")
+
+    def cancel(self):
+        """Stop the run at the client's request, saving the finished stages."""
+        if self.task is None or self.task.done():
+            return
+        logger.info(f"Cancelling run for {self.conversation_id} during {self.stage} on request")
+        self.cancel_reason = "requested"
+        self.task.cancel()
+
+    def skip_stage(self, stage: str):
+        """
+        Skip a stage of the run.
+
+        Skipping stage 1 stops waiting for members that have not answered yet
+        and continues with those that have (or, if none has, with the first
+        to answer). Skipping stage 2 goes straight to the chairman without
+        peer rankings. A stage that has not started yet is skipped when the
+        run reaches it.
+
+        Raises:
+            ValueError: If the stage can't be skipped (anymore)
+        """
+        if stage not in SKIPPABLE_STAGES:
+            raise ValueError(f"Stage {stage!r} can't be skipped (allowed: {', '.join(SKIPPABLE_STAGES)})")
+        if self.stage is not None and SKIPPABLE_STAGES.index(stage) < self._stage_position():
+            raise ValueError(f"{stage} has already finished")
+        self._skipped.add(stage)
+        if stage == "stage1":
+            self._members_changed.set()
+        elif self.stage == stage and self._stage_task is not None:
+            self._stage_task.cancel()
+
+    def regenerate_member(self, member):
+        """
+        Re-query one council member during stage 1, discarding its current
+        answer or in-flight request.
+
+        Args:
+            member: Member index, Sheldon name or model id
+
+        Raises:
+            ValueError: If the member is unknown or stage 1 is over
+        """
+        index = resolve_member(member)
+        if self.stage != "stage1" or "stage1" in self._skipped:
+            raise ValueError("Members can only be regenerated during stage 1")
+        if index not in self.members:
+            raise ValueError(f"Member {member!r} is not sitting on this {self.mode} council")
+        old = self._member_tasks.get(index)
+        if old is not None:
+            old.cancel()
+        self._member_results.pop(index, None)
+        self._member_tasks[index] = asyncio.create_task(
+            run_with_priority(self.priority_class, stage1_query_member(self.user_query, index))
+        )
+        self._members_changed.set()
+        self.emit({'type': 'member_regenerating', 'member': index, 'model': COUNCIL_MODELS[index]})
+
+    def set_chairman(self, model: str):
+        """
+        Use a different chairman model for this run.
+
+        Raises:
+            ValueError: If synthesis has already started
+        """
+        if self._stage_position() >= len(SKIPPABLE_STAGES):
+            raise ValueError("The chairman can't be changed once stage 3 has started")
+        self.chairman_model = model
+
+    def _stage_position(self) -> int:
+        """How far the run has got: 0 for stage 1, 1 for stage 2, 2 from stage 3 on."""
+        if self.stage in SKIPPABLE_STAGES:
+            return SKIPPABLE_STAGES.index(self.stage)
+        return 0 if self.stage is None else len(SKIPPABLE_STAGES)
+
+    async def _run_stage(self, coro):
+        """
+        Run one stage as a task that skip_stage() can cancel.
+
+        Returns:
+            The stage result, or None if the stage was skipped
+        """
+        self._stage_task = asyncio.create_task(coro)
+        try:
+            await asyncio.wait({self._stage_task})
+        except asyncio.CancelledError:
+            self._stage_task.cancel()
+            raise
+        if self._stage_task.cancelled():
+            return None
+        return self._stage_task.result()
+
+    @traced("stage1")
+    async def _run_stage1(self) -> List[Dict[str, Any]]:
+        """Query every member, allowing single members to be restarted and slow ones skipped."""
+        validate_council_config()
+        total = len(self.members)
+        self._member_tasks = {
+            index: asyncio.create_task(stage1_query_member(self.user_query, index))
+            for index in self.members
+        }
+        changed = None
+        try:
+            # A skip keeps waiting until at least one member has answered
+            while len(self._member_results) < total and not ("stage1" in self._skipped and self._member_results):
+                self._members_changed.clear()
+                pending = [task for index, task in self._member_tasks.items() if index not in self._member_results]
+                changed = asyncio.create_task(self._members_changed.wait())
+                await asyncio.wait(pending + [changed], return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+                for index, task in self._member_tasks.items():
+                    if index not in self._member_results and task.done() and not task.cancelled():
+                        self._member_results[index] = task.result()
+                        self.emit({'type': 'stage1_progress', 'completed': len(self._member_results), 'total': total})
+        finally:
+            # Drop members that were skipped (or everything, if the run was cancelled)
+            for task in self._member_tasks.values():
+                task.cancel()
+            if changed is not None:
+                changed.cancel()
+
+        if len(self._member_results) < total:
+            self.metadata.setdefault('skipped_stages', []).append('stage1')
+            self.emit({'type': 'stage_skipped', 'stage': 'stage1', 'completed': len(self._member_results), 'total': total})
+        return [self._member_results[index] for index in sorted(self._member_results)]
+
+    async def _run(self):
+        with span("council.run", conversation_id=self.conversation_id) as self._span:
+            await self._run_stages()
+
+    async def _run_stages(self):
+        started = time.perf_counter()
+        try:
+            # Add user message
+            await asyncio.to_thread(storage.add_user_message, self.conversation_id, self.user_query)
+            self.user_message_saved = True
+
+            # Title the conversation right away; an LLM title may replace it later
+            if self.is_first_message:
+                title = await set_initial_title(self.conversation_id, self.user_query)
+                logger.debug(f"Title: {title}")
+                self.emit({'type': 'title_complete', 'data': {'title': title}})
+
+            # A near-duplicate of an answered question gets the earlier answer
+            if self.cached is not None:
+                self._use_cached_answer()
+            else:
+                await self._deliberate()
+            self.metadata['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            logger.debug(f"Stage 3: Answer ready ({self.mode} mode, {self.metadata['latency_ms']} ms)")
+            self.emit({
+                'type': 'stage3_complete',
+                'data': self.stage3_result,
+                'metadata': {'mode': self.mode, 'latency_ms': self.metadata['latency_ms']}
+            })
+
+            # Save complete assistant message
+            self.stage = "complete"
+            if self.disconnected:
+                self.metadata['status'] = 'completed_after_disconnect'
+            self.metadata['timings'] = timing_summary(self._span)
+            message_index = await asyncio.to_thread(
+                storage.add_assistant_message,
+                self.conversation_id,
+                self.stage1_results,
+                self.stage2_results,
+                self.stage3_result,
+                metadata=self._stored_metadata()
+            )
+            if self.cached is not None and self.refresh:
+                refresh_cached_answer(self.conversation_id, message_index, self.user_query, self.mode)
+
+            # Send completion event
+            logger.debug("Streaming complete")
+            self.emit({'type': 'complete'})
+
+        except asyncio.CancelledError:
+            await self._record_cancelled()
+            self.emit({'type': 'cancelled', 'stage': self.stage, 'reason': self.cancel_reason or 'disconnect'})
+            raise
+
+        except Exception as e:
+            logger.error(f"Error in stream: {e}", exc_info=True)
+            # Send error event
+            self.emit({'type': 'error', 'message': str(e)})
+
+    async def _deliberate(self):
+        """Run the council stages for the run's mode, leaving the results on the run."""
+        draft_task = None
+        try:
+            # Stage 1: Collect responses (none in solo mode)
+            self.stage = "stage1"
+            self.stage1_results = []
+            if self.members:
+                logger.debug(f"Stage 1: Starting response collection ({self.mode} mode)")
+                self.emit({'type': 'stage1_start'})
+                self.stage1_results = await self._run_stage1()
+            logger.debug(f"Stage 1: Collected {len(self.stage1_results)} responses")
+            self.emit({'type': 'stage1_complete', 'data': self.stage1_results})
+
+            # Stage 2: Collect rankings (full and speculative modes only)
+            self.stage = "stage2"
+            ranked = self.mode not in (MODE_LITE, MODE_SOLO)
+            stage2 = None
+            if ranked and "stage2" not in self._skipped:
+                if self.mode == MODE_SPECULATIVE:
+                    # The chairman drafts from stage 1 while the rankings come in
+                    draft_task = asyncio.create_task(stage3_synthesize_final(
+                        self.user_query, self.stage1_results, [], self.chairman_model, speculative=True
+                    ))
+                logger.debug("Stage 2: Starting ranking collection")
+                self.emit({'type': 'stage2_start'})
+                stage2 = await self._run_stage(stage2_collect_rankings(
+                    self.user_query,
+                    self.stage1_results,
+                    lambda completed, total: self.emit({'type': 'stage2_progress', 'completed': completed, 'total': total})
+                ))
+            if stage2 is None:
+                if ranked:
+                    logger.debug("Stage 2: Skipped")
+                    self.metadata.setdefault('skipped_stages', []).append('stage2')
+                    self.emit({'type': 'stage_skipped', 'stage': 'stage2'})
+                stage2 = ([], {})
+            self.stage2_results, label_to_model = stage2
+            aggregate_rankings = calculate_aggregate_rankings(self.stage2_results, label_to_model)
+            self.metadata.update({'label_to_model': label_to_model, 'aggregate_rankings': aggregate_rankings})
+            logger.debug(f"Stage 2: Collected {len(self.stage2_results)} rankings")
+            self.emit({'type': 'stage2_complete', 'data': self.stage2_results, 'metadata': dict(self.metadata)})
+
+            # Stage 3: Synthesize final answer
+            self.stage = "stage3"
+            logger.debug("Stage 3: Starting final synthesis")
+            self.emit({'type': 'stage3_start'})
+            if self.mode == MODE_SOLO:
+                self.stage3_result = await stage3_solo_answer(self.user_query, self.chairman_model)
+            elif draft_task is not None:
+                self.stage3_result = await self._settle_draft(draft_task, aggregate_rankings)
+            else:
+                self.stage3_result = await stage3_synthesize_final(
+                    self.user_query, self.stage1_results, self.stage2_results, self.chairman_model
+                )
+        finally:
+            if draft_task is not None:
+                draft_task.cancel()
+
+    def _use_cached_answer(self):
+        """Answer with the cached stage 3 of a near-duplicate question, skipping the council."""
+        logger.debug(
+            f"Answering from cache: {self.cached['similarity']:.0%} similar to a question in {self.cached['conversation_id']}"
+        )
+        self.stage = "stage3"
+        self.stage1_results, self.stage2_results = [], []
+        self.stage3_result, self.metadata['cached'] = cached_answer(self.cached, self.refresh)
+        self.emit({'type': 'stage1_complete', 'data': []})
+        self.emit({'type': 'stage2_complete', 'data': [], 'metadata': dict(self.metadata)})
+
+    async def _settle_draft(self, draft_task: asyncio.Task, aggregate_rankings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Use the speculative draft as the final answer if the rankings agree
+        with it, otherwise have the chairman revise it with the rankings.
+        """
+        draft = await draft_task
+        accepted = draft['model'] == self.chairman_model and drafts_agree(draft, aggregate_rankings)
+        relied_on = draft.pop('relied_on', None)
+        self.metadata['speculative'] = {'draft_accepted': accepted, 'relied_on': relied_on}
+        if accepted:
+            logger.debug("Stage 3: Rankings agree with the draft; using it")
+            return draft
+        logger.debug("Stage 3: Rankings disagree with the draft; revising")
+        failed = draft['response'].startswith("*Error")
+        return await stage3_synthesize_final(
+            self.user_query, self.stage1_results, self.stage2_results, self.chairman_model,
+            draft=None if failed else draft['response']
+        )
+
+    def _stored_metadata(self) -> Optional[Dict[str, Any]]:
+        """Metadata persisted with the assistant message (beyond what is recomputed on load)."""
+        return persisted_metadata(self.metadata)
+
+    async def _record_cancelled(self):
+        """Persist whatever finished before the run was cancelled."""
+        if not self.user_message_saved or self.stage == "complete":
+            return
+        logger.info(f"Recording cancelled run for {self.conversation_id} (stopped during {self.stage})")
+        self.metadata.update({
+            'status': 'cancelled',
+            'cancelled_during': self.stage,
+            'cancel_reason': self.cancel_reason or 'disconnect'
+        })
+        if self.cancel_reason == "requested":
+            note = "*Cancelled before the council finished.*"
+        else:
+            note = "*Cancelled: the client disconnected before the council finished.*"
+        stage3 = self.stage3_result or {"model": self.chairman_model, "response": note}
+        stage1 = self.stage1_results or []
+        if self.stage == "stage1":
+            # Stage 1 didn't finish: keep the members that had already answered
+            stage1 = [self._member_results[index] for index in sorted(self._member_results)]
+        self.metadata['timings'] = timing_summary(self._span)
+        try:
+            # Shielded: a second cancellation must not lose the record
+            await asyncio.shield(asyncio.to_thread(
+                storage.add_assistant_message,
+                self.conversation_id,
+                stage1,
+                self.stage2_results or [],
+                stage3,
+                metadata=self._stored_metadata()
+            ))
+        except Exception as e:
+            logger.error(f"Failed to record cancelled run: {e}", exc_info=True)
+
+
+def resolve_member(member) -> int:
+    """
+    Find a council member by index, Sheldon name or model id.
+
+    Raises:
+        ValueError: If no member matches
+    """
+    if isinstance(member, int) and not isinstance(member, bool):
+        if 0 <= member < len(COUNCIL_MODELS):
+            return member
+    elif isinstance(member, str):
+        if member in COUNCIL_SHELDON_NAMES[:len(COUNCIL_MODELS)]:
+            return COUNCIL_SHELDON_NAMES.index(member)
+        if member in COUNCIL_MODELS:
+            return COUNCIL_MODELS.index(member)
+    raise ValueError(f"Unknown council member: {member!r}")
+
+
+def cached_answer(match: Dict[str, Any], refresh: bool) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Stage 3 result and metadata entry for answering from a cache match.
+
+    Args:
+        match: Result of semantic_cache.lookup()
+        refresh: Whether a fresh council run will replace the answer
+
+    Returns:
+        Tuple of (stage3 result tagged as cached, 'cached' metadata describing the match)
+    """
+    info = {key: match[key] for key in ('conversation_id', 'message_index', 'question', 'similarity', 'created_at')}
+    info['refreshing'] = refresh
+    return dict(match['stage3'], cached=True), info
+
+
+def refresh_cached_answer(conversation_id: str, message_index: int, user_query: str, mode: str):
+    """
+    Run the council in the background for a question that was answered from
+    the cache, replacing the cached answer once the fresh one is ready.
+
+    The run waits for a council slot like any other; if the queue is full
+    the cached answer is simply kept.
+
+    Args:
+        conversation_id: Conversation holding the cached answer
+        message_index: Position of the cached assistant message
+        user_query: The question
+        mode: Council mode to run in
+    """
+    try:
+        ticket = council_admission.enqueue(REFRESH_CLIENT_ID)
+    except AdmissionRejected:
+        logger.debug(f"Council queue is full, keeping the cached answer in {conversation_id}")
+        return
+    task = asyncio.create_task(_refresh(ticket, conversation_id, message_index, user_query, mode))
+    _refreshes.add(task)
+    task.add_done_callback(_refreshes.discard)
+    task.add_done_callback(lambda _: council_admission.release(ticket))
+
+
+async def drain_pending_refreshes(timeout: float = 5.0):
+    """Give background refreshes a moment to finish (e.g. at shutdown), then cancel the rest."""
+    if not _refreshes:
+        return
+    _, pending = await asyncio.wait(set(_refreshes), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+
+
+async def _refresh(ticket: Ticket, conversation_id: str, message_index: int, user_query: str, mode: str):
+    with root_span("council.refresh", conversation_id=conversation_id) as refresh_span, priority(BACKGROUND):
+        try:
+            await council_admission.wait(ticket)
+            stage1, stage2, stage3, metadata = await run_full_council(user_query, mode)
+            if stage3.get("model") == "error":
+                return
+            metadata["refreshed_cached_answer"] = True
+            metadata["timings"] = timing_summary(refresh_span)
+            await asyncio.to_thread(
+                storage.replace_assistant_message,
+                conversation_id, message_index, stage1, stage2, stage3, metadata=persisted_metadata(metadata)
+            )
+            logger.debug(f"Replaced cached answer in {conversation_id} with a fresh council run")
+        except ValueError as e:
+            # The conversation (or message) is gone
+            logger.debug(f"Dropping refreshed answer for {conversation_id}: {e}")
+        except Exception as e:
+            logger.error(f"Background refresh of a cached answer failed: {e}", exc_info=True)
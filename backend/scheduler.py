@@ -0,0 +1,225 @@
+"""Priority scheduling of upstream calls: interactive work first, background and batch work fairly."""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Deque, Dict, Iterator, Optional
+
+from .config import (
+    UPSTREAM_CLASS_WEIGHTS,
+    UPSTREAM_INTERACTIVE_RESERVED,
+    UPSTREAM_MAX_CONCURRENT,
+    UPSTREAM_MAX_WAIT_SECONDS,
+)
+
+# Priority classes of upstream calls
+INTERACTIVE = "interactive"  # a user is waiting on the answer
+BACKGROUND = "background"    # titles, refreshes of cached answers
+BATCH = "batch"              # bulk runs submitted by scripts
+PRIORITIES = (INTERACTIVE, BACKGROUND, BATCH)
+
+# Class of the calls made by the current task (inherited by tasks it creates)
+_priority: ContextVar[str] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+def validate_priority(name: Optional[str]) -> str:
+    """
+    Check a requested priority class.
+
+    Returns:
+        The class, INTERACTIVE if none was given
+
+    Raises:
+        ValueError: If the class is unknown
+    """
+    if name is None:
+        return INTERACTIVE
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name!r} (allowed: {', '.join(PRIORITIES)})")
+    return name
+
+
+def current_priority() -> str:
+    """Priority class of upstream calls made from here."""
+    return _priority.get()
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Make the upstream calls inside the block (and tasks created there) use a priority class."""
+    token = _priority.set(validate_priority(name))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+async def run_with_priority(name: str, coro: Awaitable[Any]) -> Any:
+    """Await coro with a priority class; meant to be wrapped in a task of its own."""
+    _priority.set(validate_priority(name))
+    return await coro
+
+
+class _Waiter:
+    """A queued upstream call."""
+
+    def __init__(self, priority_class: str, finish: float):
+        self.priority_class = priority_class
+        self.finish = finish
+        self.enqueued_at = time.monotonic()
+        self.granted = asyncio.get_running_loop().create_future()
+
+
+class UpstreamScheduler:
+    """
+    Limit the upstream calls in flight and decide which queued call goes next.
+
+    Queued calls are served by weighted fair queuing across the priority
+    classes: each call gets a virtual finish time of the later of the
+    scheduler's virtual clock and its class's last finish time, plus
+    1 / weight. The call with the earliest finish time goes next, so under
+    load each class gets slots in proportion to its weight, and an idle
+    class can't bank credit for later.
+
+    The last `reserved` slots only go to interactive calls, so a user's
+    stage-1 requests never wait for a slot held by bulk work. A call queued
+    for `max_wait` seconds or longer goes before everything else and may
+    use a reserved slot, so background and batch work can't starve.
+
+    The limit is per worker. With max_concurrent 0 calls are only counted.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        weights: Dict[str, float],
+        reserved: int = 0,
+        max_wait: float = 20.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.weights = {cls: float(weights.get(cls, 1.0)) for cls in PRIORITIES}
+        self.reserved = min(reserved, max(0, max_concurrent - 1))
+        self.max_wait = max_wait
+        self._queues: Dict[str, Deque[_Waiter]] = {cls: deque() for cls in PRIORITIES}
+        self._last_finish = {cls: 0.0 for cls in PRIORITIES}
+        self._virtual_time = 0.0
+        self._active = {cls: 0 for cls in PRIORITIES}
+        # Counters since this worker started
+        self._admitted = {cls: 0 for cls in PRIORITIES}
+        self._queued_total = {cls: 0 for cls in PRIORITIES}
+        self._wait_total = {cls: 0.0 for cls in PRIORITIES}
+        self._wait_max = {cls: 0.0 for cls in PRIORITIES}
+        self._promoted = {cls: 0 for cls in PRIORITIES}
+
+    @property
+    def active(self) -> int:
+        return sum(self._active.values())
+
+    def _has_slot(self, waiter: _Waiter, starving: bool) -> bool:
+        if self.active >= self.max_concurrent:
+            return False
+        if waiter.priority_class == INTERACTIVE or starving:
+            return True
+        return self.active < self.max_concurrent - self.reserved
+
+    def _next(self) -> Optional[_Waiter]:
+        """The queued call to start now, if any can."""
+        now = time.monotonic()
+        heads = [queue[0] for queue in self._queues.values() if queue]
+        starving = [w for w in heads if now - w.enqueued_at >= self.max_wait and self._has_slot(w, True)]
+        if starving:
+            waiter = min(starving, key=lambda w: w.enqueued_at)
+            self._promoted[waiter.priority_class] += 1
+            return waiter
+        ready = [w for w in heads if self._has_slot(w, False)]
+        return min(ready, key=lambda w: w.finish) if ready else None
+
+    def _dispatch(self):
+        while True:
+            waiter = self._next()
+            if waiter is None:
+                return
+            self._queues[waiter.priority_class].popleft()
+            self._virtual_time = max(self._virtual_time, waiter.finish)
+            self._start(waiter.priority_class, time.monotonic() - waiter.enqueued_at)
+            waiter.granted.set_result(None)
+
+    def _start(self, priority_class: str, waited: float):
+        self._active[priority_class] += 1
+        self._admitted[priority_class] += 1
+        self._wait_total[priority_class] += waited
+        self._wait_max[priority_class] = max(self._wait_max[priority_class], waited)
+
+    def _release(self, priority_class: str):
+        self._active[priority_class] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority_class: Optional[str] = None):
+        """
+        Hold a slot for one upstream call, waiting in its class's queue if needed.
+
+        Args:
+            priority_class: Class of the call (defaults to current_priority())
+        """
+        priority_class = priority_class or current_priority()
+        if self.max_concurrent <= 0:
+            self._start(priority_class, 0.0)
+            try:
+                yield
+            finally:
+                self._active[priority_class] -= 1
+            return
+
+        start = max(self._virtual_time, self._last_finish[priority_class])
+        waiter = _Waiter(priority_class, start + 1.0 / self.weights[priority_class])
+        self._last_finish[priority_class] = waiter.finish
+        self._queues[priority_class].append(waiter)
+        self._dispatch()
+        if not waiter.granted.done():
+            self._queued_total[priority_class] += 1
+            try:
+                await asyncio.shield(waiter.granted)
+            except asyncio.CancelledError:
+                if waiter.granted.done():
+                    # Granted as we were cancelled: hand the slot on
+                    self._release(priority_class)
+                else:
+                    self._queues[priority_class].remove(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self._release(priority_class)
+
+    def stats(self) -> Dict[str, Any]:
+        """Load and waiting times per class since this worker started."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "interactive_reserved": self.reserved,
+            "max_wait_s": self.max_wait,
+            "classes": {
+                cls: {
+                    "weight": self.weights[cls],
+                    "active": self._active[cls],
+                    "queued": len(self._queues[cls]),
+                    "admitted": self._admitted[cls],
+                    "had_to_wait": self._queued_total[cls],
+                    "avg_wait_ms": round(self._wait_total[cls] / self._admitted[cls] * 1000, 1)
+                    if self._admitted[cls] else None,
+                    "max_wait_ms": round(self._wait_max[cls] * 1000, 1),
+                    "starvation_promotions": self._promoted[cls],
+                }
+                for cls in PRIORITIES
+            },
+        }
+
+
+upstream_scheduler = UpstreamScheduler(
+    UPSTREAM_MAX_CONCURRENT,
+    UPSTREAM_CLASS_WEIGHTS,
+    reserved=UPSTREAM_INTERACTIVE_RESERVED,
+    max_wait=UPSTREAM_MAX_WAIT_SECONDS,
+)
@@ -0,0 +1,346 @@
+"""Full-text search over conversation history (SQLite FTS5)."""
+
+import html
+import os
+import re
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+from .config import SEARCH_INDEX_PATH, SEARCH_INDEX_STAGE1
+
+# Message kinds stored in the index
+KIND_USER = "user"
+KIND_STAGE1 = "stage1"
+KIND_STAGE3 = "stage3"
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+    content,
+    conversation_id UNINDEXED,
+    message_index UNINDEXED,
+    kind UNINDEXED,
+    model UNINDEXED,
+    tokenize = 'porter unicode61',
+    prefix = '2 3'
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    created_at TEXT
+);
+"""
+
+_TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+# Control characters marking matches in snippet() output; the snippet is
+# HTML-escaped before they become <mark> tags, so stored text can't inject markup
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+_INSERT_MESSAGE = (
+    "INSERT INTO messages (content, conversation_id, message_index, kind, model) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+
+# Index databases this process has already set up (WAL mode, schema)
+_initialized: set = set()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the index database, creating the schema on first use in this process."""
+    fresh = SEARCH_INDEX_PATH not in _initialized or not os.path.exists(SEARCH_INDEX_PATH)
+    if fresh:
+        Path(SEARCH_INDEX_PATH).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(SEARCH_INDEX_PATH, timeout=10.0)
+    if fresh:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized.add(SEARCH_INDEX_PATH)
+    return conn
+
+
+def index_exists() -> bool:
+    """Check whether the index database has been created."""
+    return os.path.exists(SEARCH_INDEX_PATH)
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Convert free text into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted term (so FTS5 operators in user input are
+    inert) and all terms must match. A trailing '*' makes a term a prefix
+    query, e.g. "quant* physics".
+
+    Args:
+        query: Raw user query
+
+    Returns:
+        MATCH expression, or None if the query has no searchable terms
+    """
+    terms = []
+    for token in _TERM_RE.findall(query):
+        if token.endswith("*"):
+            word = token[:-1]
+            if word:
+                terms.append(f'"{word}"*')
+        else:
+            terms.append(f'"{token}"')
+    if not terms:
+        return None
+    return " ".join(terms)
+
+
+def index_conversation_meta(conversation_id: str, title: str, created_at: str):
+    """Record or update the title and creation time of a conversation."""
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT INTO conversations (id, title, created_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET title = excluded.title",
+            (conversation_id, title, created_at),
+        )
+
+
+def index_user_message(conversation_id: str, message_index: int, content: str):
+    """
+    Add a user question to the index.
+
+    Args:
+        conversation_id: Conversation identifier
+        message_index: Position of the message in the conversation
+        content: Question text
+    """
+    with closing(_connect()) as conn, conn:
+        conn.execute(_INSERT_MESSAGE, (content, conversation_id, message_index, KIND_USER, None))
+
+
+def index_assistant_message(
+    conversation_id: str,
+    message_index: int,
+    stage1: List[Dict[str, Any]],
+    stage3: Dict[str, Any]
+):
+    """
+    Add an assistant turn to the index.
+
+    The stage-3 answer is always indexed; stage-1 responses are indexed when
+    SEARCH_INDEX_STAGE1 is enabled. Error placeholders are skipped.
+
+    Args:
+        conversation_id: Conversation identifier
+        message_index: Position of the message in the conversation
+        stage1: Individual model responses
+        stage3: Final synthesized response
+    """
+    rows = _assistant_rows(conversation_id, message_index, stage1, stage3)
+    if not rows:
+        return
+
+    with closing(_connect()) as conn, conn:
+        conn.executemany(_INSERT_MESSAGE, rows)
+
+
+def replace_assistant_message(
+    conversation_id: str,
+    message_index: int,
+    stage1: List[Dict[str, Any]],
+    stage3: Dict[str, Any]
+):
+    """
+    Re-index an assistant turn whose content changed.
+
+    The old rows are removed and the new ones added in one transaction, so
+    a failure leaves the previous content indexed rather than none.
+    """
+    rows = _assistant_rows(conversation_id, message_index, stage1, stage3)
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "DELETE FROM messages WHERE conversation_id = ? AND message_index = ?",
+            (conversation_id, message_index),
+        )
+        conn.executemany(_INSERT_MESSAGE, rows)
+
+
+def _assistant_rows(
+    conversation_id: str,
+    message_index: int,
+    stage1: List[Dict[str, Any]],
+    stage3: Dict[str, Any]
+) -> List[Tuple]:
+    """Index rows for an assistant turn (stage 3, plus stage 1 if configured)."""
+    rows = []
+    final = stage3.get("response", "")
+    if final and not final.startswith("*Error:"):
+        rows.append((final, conversation_id, message_index, KIND_STAGE3, stage3.get("model")))
+
+    if SEARCH_INDEX_STAGE1:
+        for result in stage1:
+            response = result.get("response", "")
+            if response and not response.startswith("*Error:"):
+                rows.append((response, conversation_id, message_index, KIND_STAGE1, result.get("model")))
+    return rows
+
+
+def _message_rows(conversation: Dict[str, Any]) -> List[Tuple]:
+    """Index rows for every message of a conversation."""
+    conversation_id = conversation["id"]
+    rows: List[Tuple] = []
+    for message_index, message in enumerate(conversation["messages"]):
+        if message["role"] == "user":
+            rows.append((message["content"], conversation_id, message_index, KIND_USER, None))
+        else:
+            rows.extend(_assistant_rows(
+                conversation_id,
+                message_index,
+                message.get("stage1", []),
+                message.get("stage3", {}),
+            ))
+    return rows
+
+
+def index_conversation(conversation: Dict[str, Any]):
+    """
+    Index every message of a stored conversation, replacing what was indexed for it.
+
+    Runs in one transaction: on failure the previous index content stays.
+
+    Args:
+        conversation: Full conversation dict
+    """
+    conversation_id = conversation["id"]
+    rows = _message_rows(conversation)
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        conn.execute(
+            "INSERT INTO conversations (id, title, created_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET title = excluded.title, created_at = excluded.created_at",
+            (
+                conversation_id,
+                conversation.get("title", "New Conversation"),
+                conversation.get("created_at", ""),
+            ),
+        )
+        conn.executemany(_INSERT_MESSAGE, rows)
+
+
+def index_conversations(conversations: Iterable[Dict[str, Any]], batch_size: int = 500) -> int:
+    """
+    Bulk-index conversations into an empty index (used for rebuilds).
+
+    Unlike index_conversation, nothing is removed first, and rows are
+    written in batches over a single connection.
+
+    Args:
+        conversations: Full conversation dicts
+        batch_size: Conversations per transaction
+
+    Returns:
+        Number of conversations indexed
+    """
+    count = 0
+    meta_rows: List[Tuple] = []
+    message_rows: List[Tuple] = []
+    with closing(_connect()) as conn:
+        def flush():
+            with conn:
+                conn.executemany(
+                    "INSERT INTO conversations (id, title, created_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET title = excluded.title",
+                    meta_rows,
+                )
+                conn.executemany(_INSERT_MESSAGE, message_rows)
+            meta_rows.clear()
+            message_rows.clear()
+
+        for conversation in conversations:
+            meta_rows.append((
+                conversation["id"],
+                conversation.get("title", "New Conversation"),
+                conversation.get("created_at", ""),
+            ))
+            message_rows.extend(_message_rows(conversation))
+            count += 1
+            if count % batch_size == 0:
+                flush()
+        flush()
+    return count
+
+
+def remove_conversation(conversation_id: str):
+    """Remove all indexed content for a conversation."""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+
+def clear_index():
+    """Remove all indexed content."""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM messages")
+        conn.execute("DELETE FROM conversations")
+
+
+def search(
+    query: str,
+    limit: int = 20,
+    include_stage1: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Search conversation history.
+
+    Results are ranked by BM25 and include a highlighted snippet: HTML-escaped
+    text with matches wrapped in <mark></mark>.
+
+    Args:
+        query: Free-text query; append '*' to a word for prefix matching
+        limit: Maximum number of results
+        include_stage1: Also search individual council member responses
+
+    Returns:
+        List of result dicts, best match first
+    """
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    kinds = [KIND_USER, KIND_STAGE3]
+    if include_stage1:
+        kinds.append(KIND_STAGE1)
+    placeholders = ", ".join("?" for _ in kinds)
+
+    sql = f"""
+        SELECT messages.conversation_id, messages.message_index, messages.kind, messages.model,
+               snippet(messages, 0, char(2), char(3), '…', 16) AS snippet,
+               bm25(messages) AS score,
+               conversations.title, conversations.created_at
+        FROM messages
+        LEFT JOIN conversations ON conversations.id = messages.conversation_id
+        WHERE messages MATCH ? AND messages.kind IN ({placeholders})
+        ORDER BY score
+        LIMIT ?
+    """
+
+    with closing(_connect()) as conn:
+        rows = conn.execute(sql, (match, *kinds, limit)).fetchall()
+
+    return [
+        {
+            "conversation_id": conversation_id,
+            "message_index": int(message_index),
+            "kind": kind,
+            "model": model,
+            "snippet": _highlight(snippet),
+            # bm25() is lower-is-better; flip it so higher scores rank first
+            "score": round(-score, 4),
+            "title": title,
+            "created_at": created_at,
+        }
+        for conversation_id, message_index, kind, model, snippet, score, title, created_at in rows
+    ]
+
+
+def _highlight(snippet: str) -> str:
+    """Escape a snippet for HTML and turn its match markers into <mark> tags."""
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
@@ -0,0 +1,213 @@
+"""Near-duplicate question cache: MinHash/LSH over past questions, stored in SQLite."""
+
+import hashlib
+import random
+import re
+import sqlite3
+import struct
+import zlib
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from .config import SEMANTIC_CACHE_PATH, SEMANTIC_CACHE_THRESHOLD
+from .serialization import dumps, loads
+
+# MinHash signature length, split into LSH bands of ROWS values. With 16
+# bands of 4 rows, questions with a Jaccard similarity of 0.8 share a band
+# 99.98% of the time and unrelated ones (0.2) 2.5% of the time.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Character shingle length over the normalized question
+SHINGLE = 4
+
+# Shingles kept per question: only the start of a very long question is
+# compared, which bounds the MinHash work (NUM_PERM hashes per shingle)
+MAX_SHINGLES = 512
+
+# Candidates checked exactly per lookup, those sharing the most bands first
+MAX_CANDIDATES = 32
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)  # fixed, so every worker computes the same signatures
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Words that rarely change what a question asks
+_STOPWORDS = frozenset("""
+a about an and any are as at be been but by can could did do does for from had has have how i i'm if in
+into is it it's its me my of on or our please should so some tell than that the their them then there
+these they this those to us was we were what what's when where which who why why's will with would you
+your
+""".split())
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    message_index INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    stage3 BLOB NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_conversation ON answers (conversation_id);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    answer_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket);
+CREATE INDEX IF NOT EXISTS buckets_answer ON buckets (answer_id);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the cache database, creating the schema if needed."""
+    Path(SEMANTIC_CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(SEMANTIC_CACHE_PATH, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def shingles(text: str) -> FrozenSet[str]:
+    """
+    Character shingles of a question after dropping case, punctuation and stopwords.
+
+    Shingles span word boundaries, so word order still counts for something.
+    At most MAX_SHINGLES are taken, from the start of the question.
+    """
+    words = [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+    normalized = " ".join(words)[:MAX_SHINGLES + SHINGLE - 1]
+    if len(normalized) <= SHINGLE:
+        return frozenset([normalized]) if normalized else frozenset()
+    return frozenset(normalized[i:i + SHINGLE] for i in range(len(normalized) - SHINGLE + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def signature(shingle_set: Iterable[str]) -> List[int]:
+    """MinHash signature: the minimum of each permuted shingle hash."""
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_buckets(sig: List[int]) -> List[int]:
+    """One bucket id per LSH band (a signed 64-bit hash of the band's rows)."""
+    buckets = []
+    for band in range(BANDS):
+        rows = struct.pack(f"<{ROWS}Q", *sig[band * ROWS:(band + 1) * ROWS])
+        buckets.append(int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), "little", signed=True))
+    return buckets
+
+
+def is_cacheable(stage3: Dict[str, Any], metadata: Optional[Dict[str, Any]]) -> bool:
+    """Whether an answer may be served again: not an error, a cancelled run or itself a cached answer."""
+    if stage3.get("cached") or str(stage3.get("response", "")).startswith("*"):
+        return False
+    return not (metadata and metadata.get("status") == "cancelled")
+
+
+def remember(conversation_id: str, message_index: int, question: str, stage3: Dict[str, Any]):
+    """
+    Add an answered question to the cache.
+
+    Blocking (MinHash and SQLite): run it in a thread.
+
+    Args:
+        conversation_id: Conversation identifier
+        message_index: Position of the assistant message in the conversation
+        question: The user question it answered
+        stage3: The final answer
+    """
+    shingle_set = shingles(question)
+    if not shingle_set:
+        return
+    buckets = band_buckets(signature(shingle_set))
+    with closing(_connect()) as conn, conn:
+        # A refreshed answer replaces the one stored for the same message
+        _delete_where(conn, "conversation_id = ? AND message_index = ?", (conversation_id, message_index))
+        cursor = conn.execute(
+            "INSERT INTO answers (conversation_id, message_index, question, stage3, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (conversation_id, message_index, question, dumps(stage3), datetime.utcnow().isoformat()),
+        )
+        conn.executemany(
+            "INSERT INTO buckets (band, bucket, answer_id) VALUES (?, ?, ?)",
+            [(band, bucket, cursor.lastrowid) for band, bucket in enumerate(buckets)],
+        )
+
+
+def lookup(question: str, threshold: float = SEMANTIC_CACHE_THRESHOLD) -> Optional[Dict[str, Any]]:
+    """
+    Find the most similar earlier question, if it is a near-duplicate.
+
+    LSH buckets narrow the search to likely matches; the MAX_CANDIDATES
+    sharing the most bands are then checked by the exact Jaccard similarity
+    of their shingles. Blocking (MinHash and SQLite): run it in a thread.
+
+    Args:
+        question: The new user question
+        threshold: Minimum Jaccard similarity to count as a near-duplicate
+
+    Returns:
+        Dict with the matched 'conversation_id', 'message_index', 'question',
+        'similarity', 'created_at' and its 'stage3' answer, or None
+    """
+    shingle_set = shingles(question)
+    if not shingle_set:
+        return None
+    buckets = band_buckets(signature(shingle_set))
+    clauses = " OR ".join(["(b.band = ? AND b.bucket = ?)"] * BANDS)
+    params = [value for pair in enumerate(buckets) for value in pair]
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            f"SELECT a.conversation_id, a.message_index, a.question, a.stage3, a.created_at "
+            f"FROM (SELECT answer_id, COUNT(*) AS shared FROM buckets b WHERE {clauses} "
+            f"      GROUP BY answer_id ORDER BY shared DESC LIMIT ?) c "
+            f"JOIN answers a ON a.id = c.answer_id",
+            params + [MAX_CANDIDATES],
+        ).fetchall()
+
+    best = None
+    for conversation_id, message_index, candidate, stage3, created_at in rows:
+        similarity = jaccard(shingle_set, shingles(candidate))
+        if similarity >= threshold and (best is None or similarity > best["similarity"]):
+            best = {
+                "conversation_id": conversation_id,
+                "message_index": message_index,
+                "question": candidate,
+                "similarity": similarity,
+                "created_at": created_at,
+                "stage3": stage3,
+            }
+    if best is not None:
+        best["similarity"] = round(best["similarity"], 3)
+        best["stage3"] = loads(best["stage3"])
+    return best
+
+
+def _delete_where(conn: sqlite3.Connection, where: str, params: tuple):
+    conn.execute(f"DELETE FROM buckets WHERE answer_id IN (SELECT id FROM answers WHERE {where})", params)
+    conn.execute(f"DELETE FROM answers WHERE {where}", params)
+
+
+def remove_conversation(conversation_id: str):
+    """Forget every cached answer from a conversation."""
+    with closing(_connect()) as conn, conn:
+        _delete_where(conn, "conversation_id = ?", (conversation_id,))
+
+
+def clear():
+    """Forget every cached answer."""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM buckets")
+        conn.execute("DELETE FROM answers")
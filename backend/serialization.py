@@ -0,0 +1,143 @@
+"""Pluggable serialization for conversation storage and SSE events."""
+
+import json
+from typing import Any, Dict, Optional
+
+from .config import STORAGE_FORMAT
+
+# Optional fast encoders - fall back to the stdlib when not installed
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on environment
+    msgpack = None
+
+
+# File extension for each supported on-disk format
+STORAGE_EXTENSIONS: Dict[str, str] = {
+    "json": ".json",
+    "msgpack": ".msgpack",
+}
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode an object as compact UTF-8 JSON for the wire.
+
+    Args:
+        obj: JSON-serializable object
+
+    Returns:
+        Encoded JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """
+    Decode JSON from bytes or str.
+
+    Args:
+        data: JSON document
+
+    Returns:
+        Decoded object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def sse_event(payload: Dict[str, Any]) -> bytes:
+    """
+    Format a payload as a single Server-Sent Events message.
+
+    Args:
+        payload: Event dict (must include 'type')
+
+    Returns:
+        Bytes ready to be yielded from a StreamingResponse
+    """
+    return b"data: " + dumps(payload) + b"\n\n"
+
+
+def get_storage_format(fmt: Optional[str] = None) -> str:
+    """
+    Resolve the on-disk format to use for writes.
+
+    Falls back to JSON when msgpack is requested but not installed.
+
+    Args:
+        fmt: Requested format, defaults to STORAGE_FORMAT from config
+
+    Returns:
+        A key of STORAGE_EXTENSIONS
+    """
+    fmt = (fmt or STORAGE_FORMAT).lower()
+    if fmt not in STORAGE_EXTENSIONS:
+        raise ValueError(f"Unknown storage format: {fmt}")
+    if fmt == "msgpack" and msgpack is None:
+        return "json"
+    return fmt
+
+
+def format_for_path(path: str) -> Optional[str]:
+    """
+    Detect the storage format of a file from its extension.
+
+    Args:
+        path: File path or name
+
+    Returns:
+        Format name, or None if the extension is not a storage format
+    """
+    for fmt, ext in STORAGE_EXTENSIONS.items():
+        if path.endswith(ext):
+            return fmt
+    return None
+
+
+def encode_document(obj: Dict[str, Any], fmt: Optional[str] = None) -> bytes:
+    """
+    Encode a conversation document for storage.
+
+    JSON output keeps the indented layout of legacy files so they stay
+    human-readable; msgpack is compact binary.
+
+    Args:
+        obj: Conversation dict
+        fmt: Storage format, defaults to the configured one
+
+    Returns:
+        Encoded bytes
+    """
+    fmt = get_storage_format(fmt)
+    if fmt == "msgpack":
+        return msgpack.packb(obj, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
+def decode_document(data: bytes, fmt: str) -> Dict[str, Any]:
+    """
+    Decode a stored conversation document.
+
+    Args:
+        data: Raw file contents
+        fmt: Format the data was written in
+
+    Returns:
+        Conversation dict
+    """
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("msgpack is required to read .msgpack conversation files")
+        return msgpack.unpackb(data, raw=False)
+    return loads(data)
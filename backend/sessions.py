@@ -0,0 +1,214 @@
+"""WebSocket council sessions: several conversations over one connection, steered in-band."""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from . import semantic_cache, storage
+from .admission import AdmissionRejected, council_admission
+from .config import CORS_ORIGINS, DISCONNECT_POLICY, SEMANTIC_CACHE, SEMANTIC_CACHE_REFRESH
+from .council import resolve_mode
+from .runner import CouncilRun
+from .scheduler import validate_priority
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+class CouncilSession:
+    """
+    One WebSocket connection carrying council runs for any number of conversations.
+
+    Clients send JSON messages with a `type` and a `conversation_id`:
+
+    - send: start a run with `content` and optionally `mode`, `use_cache`,
+      `refresh` and `priority` (one active run per conversation)
+    - cancel: stop the run, saving the stages that finished
+    - skip_stage: skip `stage` ("stage1" keeps the members that answered,
+      or the first to answer if none has yet; "stage2" goes straight to the
+      chairman)
+    - regenerate_member: re-query `member` (index, Sheldon name or model) during stage 1
+    - set_chairman: synthesize with `model` instead of the configured chairman
+
+    Every event is the same as on the SSE endpoint, tagged with its
+    `conversation_id`, so the client can demultiplex them.
+    """
+
+    def __init__(self, websocket: WebSocket, client_id: str):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.runs: Dict[str, Optional[CouncilRun]] = {}
+        self._forwarders: Dict[str, asyncio.Task] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, conversation_id: Optional[str], event: Dict[str, Any]):
+        """Send one event, tagged with its conversation."""
+        async with self._send_lock:
+            await self.websocket.send_text(dumps({**event, 'conversation_id': conversation_id}).decode("utf-8"))
+
+    async def serve(self):
+        """Handle control messages until the client disconnects."""
+        # CORS doesn't cover WebSockets: without this check any web page could
+        # open the socket with the user's browser and start councils. Clients
+        # that aren't browsers send no Origin.
+        origin = self.websocket.headers.get("origin")
+        if origin is not None and origin not in CORS_ORIGINS:
+            logger.warning(f"Rejecting WebSocket from origin {origin}")
+            await self.websocket.close(code=1008)
+            return
+        await self.websocket.accept()
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                await self.handle(message.get("text") or message.get("bytes") or b"")
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.close()
+
+    async def handle(self, raw):
+        """Dispatch one control message."""
+        try:
+            message = loads(raw)
+        except ValueError:
+            await self.send(None, {'type': 'error', 'message': 'Invalid JSON'})
+            return
+        if not isinstance(message, dict):
+            await self.send(None, {'type': 'error', 'message': 'Messages must be JSON objects'})
+            return
+
+        conversation_id = message.get('conversation_id')
+        if conversation_id is not None and not isinstance(conversation_id, str):
+            await self.send(None, {'type': 'error', 'message': "'conversation_id' must be a string"})
+            return
+        handler = self._handlers().get(message.get('type'))
+        if handler is None:
+            await self.send(conversation_id, {'type': 'error', 'message': f"Unknown message type: {message.get('type')!r}"})
+            return
+        try:
+            result = handler(conversation_id, message)
+            if asyncio.iscoroutine(result):
+                await result
+        except ValueError as e:
+            await self.send(conversation_id, {'type': 'error', 'message': str(e)})
+        except Exception as e:
+            # One bad message must not take down the other runs on this connection
+            logger.error(f"Error handling {message.get('type')!r} message: {e}", exc_info=True)
+            await self.send(conversation_id, {'type': 'error', 'message': 'Internal error'})
+
+    def _handlers(self) -> Dict[str, Callable]:
+        return {
+            'send': self._start_run,
+            'cancel': self._cancel,
+            'skip_stage': lambda cid, m: self._active_run(cid).skip_stage(_required(m, 'stage')),
+            'regenerate_member': lambda cid, m: self._active_run(cid).regenerate_member(m.get('member')),
+            'set_chairman': lambda cid, m: self._active_run(cid).set_chairman(_required(m, 'model')),
+        }
+
+    def _active_run(self, conversation_id: Optional[str]) -> CouncilRun:
+        run = self.runs.get(conversation_id)
+        if run is None:
+            raise ValueError("No council is running for this conversation")
+        return run
+
+    async def _cancel(self, conversation_id: Optional[str], message: Dict[str, Any]):
+        if conversation_id in self._forwarders and self.runs.get(conversation_id) is None:
+            # Still queued: just leave the queue
+            self._forwarders[conversation_id].cancel()
+            await self.send(conversation_id, {'type': 'cancelled', 'stage': None, 'reason': 'requested'})
+            return
+        self._active_run(conversation_id).cancel()
+
+    async def _start_run(self, conversation_id: Optional[str], message: Dict[str, Any]):
+        content = _required(message, 'content')
+        mode = resolve_mode(_optional(message, 'mode', str))
+        priority_class = validate_priority(_optional(message, 'priority', str))
+        use_cache = _optional(message, 'use_cache', bool, SEMANTIC_CACHE)
+        refresh = _optional(message, 'refresh', bool, SEMANTIC_CACHE_REFRESH)
+        if conversation_id in self._forwarders:
+            raise ValueError("A council is already running for this conversation")
+
+        conversation = (
+            await asyncio.to_thread(storage.get_conversation, conversation_id) if conversation_id else None
+        )
+        if conversation is None:
+            raise ValueError("Conversation not found")
+
+        # A near-duplicate of an answered question is answered at once, without a council slot
+        cached = await asyncio.to_thread(semantic_cache.lookup, content) if use_cache else None
+
+        ticket = None
+        if cached is None:
+            try:
+                ticket = council_admission.enqueue(self.client_id)
+            except AdmissionRejected as e:
+                await self.send(conversation_id, {'type': 'error', 'message': str(e), 'retry_after': e.retry_after})
+                return
+
+        is_first_message = len(conversation["messages"]) == 0
+        self.runs[conversation_id] = None
+        run = CouncilRun(
+            conversation_id, content, is_first_message, mode, cached, refresh,
+            priority_class=priority_class
+        )
+        self._forwarders[conversation_id] = asyncio.create_task(self._forward(run, ticket))
+
+    async def _forward(self, run: CouncilRun, ticket):
+        """Wait for a council slot (if the run needs one), run the council and relay its events."""
+        conversation_id = run.conversation_id
+        started = False
+        try:
+            last_position = None
+            while ticket is not None and not ticket.admitted:
+                position = council_admission.position(ticket)
+                if position != last_position:
+                    await self.send(conversation_id, {'type': 'queued', 'position': position})
+                    last_position = position
+                await council_admission.wait_for_change()
+
+            self.runs[conversation_id] = run
+            run.start()
+            started = True
+            if ticket is not None:
+                run.task.add_done_callback(lambda _: council_admission.release(ticket))
+
+            while True:
+                event = await run.events.get()
+                await self.send(conversation_id, event)
+                if event['type'] in ('complete', 'error', 'cancelled'):
+                    break
+        finally:
+            if not started and ticket is not None:
+                council_admission.release(ticket)
+            elif started and not run.done:
+                # We can no longer deliver events (the socket closed)
+                run.handle_disconnect(DISCONNECT_POLICY)
+            self.runs.pop(conversation_id, None)
+            self._forwarders.pop(conversation_id, None)
+
+    def close(self):
+        """Connection gone: stop relaying, which applies the disconnect policy to every run."""
+        for task in list(self._forwarders.values()):
+            task.cancel()
+
+
+def _required(message: Dict[str, Any], field: str, kind: type = str):
+    value = message.get(field)
+    if not value:
+        raise ValueError(f"'{field}' is required")
+    if not isinstance(value, kind):
+        raise ValueError(f"'{field}' must be a {kind.__name__}")
+    return value
+
+
+def _optional(message: Dict[str, Any], field: str, kind: type, default: Any = None):
+    value = message.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, kind):
+        raise ValueError(f"'{field}' must be a {kind.__name__}")
+    return value
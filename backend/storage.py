@@ -1,11 +1,22 @@
-"""JSON-based storage for conversations."""
+"""File-based storage for conversations."""
 
 import json
 import os
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Iterator
 from pathlib import Path
-from .config import DATA_DIR
+from . import archive, search, semantic_cache
+from .config import DATA_DIR, DELETIONS_LOG, DELETIONS_RETENTION_DAYS, SEMANTIC_CACHE
+from .locking import conversation_lock, conversation_locks, named_lock
+from .tracing import traced
+from .serialization import (
+    STORAGE_EXTENSIONS,
+    decode_document,
+    encode_document,
+    format_for_path,
+    get_storage_format,
+)
 
 
 def ensure_data_dir():
@@ -13,11 +24,63 @@ def ensure_data_dir():
     Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
 
 
-def get_conversation_path(conversation_id: str) -> str:
-    """Get the file path for a conversation."""
-    return os.path.join(DATA_DIR, f"{conversation_id}.json")
+def get_conversation_path(conversation_id: str, fmt: Optional[str] = None) -> str:
+    """Get the file path for a conversation in the given (or configured) format."""
+    ext = STORAGE_EXTENSIONS[get_storage_format(fmt)]
+    return os.path.join(DATA_DIR, f"{conversation_id}{ext}")
 
 
+def find_conversation_file(conversation_id: str) -> Optional[Tuple[str, str]]:
+    """
+    Locate the stored file for a conversation in any supported format.
+
+    The configured write format is checked first, then legacy formats.
+
+    Returns:
+        Tuple of (path, format) or None if not found
+    """
+    preferred = get_storage_format()
+    formats = [preferred] + [fmt for fmt in STORAGE_EXTENSIONS if fmt != preferred]
+    for fmt in formats:
+        path = os.path.join(DATA_DIR, f"{conversation_id}{STORAGE_EXTENSIONS[fmt]}")
+        if os.path.exists(path):
+            return path, fmt
+    return None
+
+
+def read_document(path: str, fmt: str) -> Dict[str, Any]:
+    """Read and decode a single conversation file."""
+    with open(path, 'rb') as f:
+        return decode_document(f.read(), fmt)
+
+
+def write_document(conversation: Dict[str, Any]):
+    """
+    Write a conversation in the configured format.
+
+    The file is replaced atomically, so readers in other workers never see
+    a partial write. Copies of the same conversation in other formats are
+    removed, so legacy files migrate on their next write.
+    """
+    fmt = get_storage_format()
+    path = get_conversation_path(conversation['id'], fmt)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_document(conversation, fmt))
+    os.replace(tmp_path, path)
+
+    for other_fmt, ext in STORAGE_EXTENSIONS.items():
+        if other_fmt == fmt:
+            continue
+        stale = os.path.join(DATA_DIR, f"{conversation['id']}{ext}")
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    # A written conversation is hot again; drop its archived copy
+    archive.forget(conversation['id'])
+
+
+@traced("storage.create_conversation")
 def create_conversation(conversation_id: str) -> Dict[str, Any]:
     """
     Create a new conversation.
@@ -30,21 +93,24 @@ def create_conversation(conversation_id: str) -> Dict[str, Any]:
     """
     ensure_data_dir()
 
+    now = datetime.utcnow().isoformat()
     conversation = {
         "id": conversation_id,
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": now,
+        "updated_at": now,
+        "version": 1,
         "title": "New Conversation",
         "messages": []
     }
 
     # Save to file
-    path = get_conversation_path(conversation_id)
-    with open(path, 'w') as f:
-        json.dump(conversation, f, indent=2)
+    write_document(conversation)
+    search.index_conversation_meta(conversation_id, conversation["title"], conversation["created_at"])
 
     return conversation
 
 
+@traced("storage.get_conversation")
 def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
     """
     Load a conversation from storage.
@@ -55,29 +121,104 @@ def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         Conversation dict or None if not found
     """
-    path = get_conversation_path(conversation_id)
-
-    if not os.path.exists(path):
-        return None
-
-    with open(path, 'r') as f:
-        return json.load(f)
-
-
-def save_conversation(conversation: Dict[str, Any]):
+    # The hot file can be archived, deleted or migrated to another format
+    # between finding and opening it: look again before falling back
+    for _ in range(2):
+        found = find_conversation_file(conversation_id)
+        if found is None:
+            break
+        path, fmt = found
+        try:
+            return read_document(path, fmt)
+        except FileNotFoundError:
+            continue
+
+    # Fall back to the packed archive of cold conversations
+    return archive.read(conversation_id)
+
+
+# List deltas re-send conversations written this many seconds before the
+# cursor, covering writes that were in flight during the previous listing
+# and small clock differences between hosts sharing the data directory
+LIST_SYNC_OVERLAP_SECONDS = 5.0
+
+# Rewrite the deletions log without expired entries once it grows past this
+DELETIONS_LOG_COMPACT_BYTES = 256 * 1024
+
+
+@traced("storage.save_conversation")
+def save_conversation(
+    conversation: Dict[str, Any],
+    changed_messages: Iterable[int] = (),
+    changed_fields: Iterable[str] = ()
+):
     """
     Save a conversation to storage.
 
+    Bumps the conversation's monotonic version and updated_at timestamp,
+    which back the ETag and Last-Modified headers, and stamps the changed
+    messages and fields with the new version for delta sync.
+
     Args:
         conversation: Conversation dict to save
+        changed_messages: Positions of the messages added or replaced
+        changed_fields: Top-level fields changed (e.g. "title")
     """
     ensure_data_dir()
+    version = conversation.get("version", 0) + 1
+    conversation["version"] = version
+    conversation["updated_at"] = datetime.utcnow().isoformat()
+    for index in changed_messages:
+        conversation["messages"][index]["version"] = version
+    if changed_fields:
+        field_versions = conversation.setdefault("field_versions", {})
+        for field in changed_fields:
+            field_versions[field] = version
+    write_document(conversation)
+
+
+def conversation_delta(conversation: Dict[str, Any], since: int) -> Dict[str, Any]:
+    """
+    What changed in a conversation after a version the client already has.
 
-    path = get_conversation_path(conversation['id'])
-    with open(path, 'w') as f:
-        json.dump(conversation, f, indent=2)
+    Messages and fields written before versions were stamped on them count
+    as version 0, so they are only sent to clients starting from scratch.
+    A client claiming a version newer than the stored one (e.g. after a
+    restore from an export) gets everything, marked full.
+
+    Args:
+        conversation: The current conversation
+        since: Version the client last saw (0 for none)
+
+    Returns:
+        Dict with id, version, updated_at, message_count, full, the messages
+        changed since then as {index, message} and, if changed, the title
+    """
+    version = conversation.get("version", 0)
+    full = since <= 0 or since > version
+    field_versions = conversation.get("field_versions", {})
+    delta = {
+        "id": conversation["id"],
+        "since": since,
+        "version": version,
+        "updated_at": conversation.get("updated_at"),
+        "message_count": len(conversation["messages"]),
+        "full": full,
+        "messages": [
+            {"index": index, "message": message}
+            for index, message in enumerate(conversation["messages"])
+            if full or message.get("version", 0) > since
+        ],
+    }
+    if full:
+        delta["created_at"] = conversation["created_at"]
+    for field in ("title",):
+        if full or field_versions.get(field, 0) > since:
+            delta[field] = conversation.get(field)
+    return delta
 
 
+@traced("storage.list_conversations")
 def list_conversations() -> List[Dict[str, Any]]:
     """
     List all conversations (metadata only).
@@ -89,17 +230,19 @@ def list_conversations() -> List[Dict[str, Any]]:
 
     conversations = []
     for filename in os.listdir(DATA_DIR):
-        if filename.endswith('.json'):
-            path = os.path.join(DATA_DIR, filename)
-            with open(path, 'r') as f:
-                data = json.load(f)
-                # Return metadata only
-                conversations.append({
-                    "id": data["id"],
-                    "created_at": data["created_at"],
-                    "title": data.get("title", "New Conversation"),
-                    "message_count": len(data["messages"])
-                })
+        fmt = format_for_path(filename)
+        if fmt is None:
+            continue
+        path = os.path.join(DATA_DIR, filename)
+        try:
+            conversations.append(_metadata(read_document(path, fmt)))
+        except FileNotFoundError:
+            # Deleted or archived since the scan started (archived ones are listed below)
+            continue
+
+    # Archived conversations are listed from the archive index
+    hot_ids = {c["id"] for c in conversations}
+    conversations.extend(c for c in archive.list_metadata() if c["id"] not in hot_ids)
 
     # Sort by creation time, newest first
     conversations.sort(key=lambda x: x["created_at"], reverse=True)
@@ -107,6 +250,112 @@ def list_conversations() -> List[Dict[str, Any]]:
     return conversations
 
 
+def _metadata(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The list-view metadata of a conversation."""
+    return {
+        "id": data["id"],
+        "created_at": data["created_at"],
+        "title": data.get("title", "New Conversation"),
+        "message_count": len(data["messages"]),
+        "version": data.get("version", 0),
+        "updated_at": data.get("updated_at")
+    }
+
+
+@traced("storage.list_conversation_changes")
+def list_conversation_changes(since: Optional[float]) -> Dict[str, Any]:
+    """
+    Changes to the conversation list after a cursor from a previous call.
+
+    Only conversation files modified since the cursor are read, and
+    deletions come from the deletions log. Without a cursor, with one older
+    than the log's retention, or after a delete-all, the whole list is
+    returned with reset set and the client should replace its copy.
+
+    Args:
+        since: Cursor returned by the previous call (None for the first)
+
+    Returns:
+        Dict with cursor (pass it to the next call), reset, changed
+        (metadata, newest first) and deleted (conversation ids)
+    """
+    ensure_data_dir()
+    started = time.time()
+    cursor = started - LIST_SYNC_OVERLAP_SECONDS
+    deleted: List[str] = []
+    reset = since is None or since < started - DELETIONS_RETENTION_DAYS * 86400
+    if not reset:
+        for entry in _read_deletions():
+            if entry["deleted_at"] < since:
+                continue
+            if entry["id"] == "*":
+                reset = True
+                break
+            deleted.append(entry["id"])
+    if reset:
+        return {"cursor": cursor, "reset": True, "changed": list_conversations(), "deleted": []}
+
+    changed = []
+    with os.scandir(DATA_DIR) as entries:
+        for entry in entries:
+            fmt = format_for_path(entry.name)
+            if fmt is None:
+                continue
+            try:
+                if entry.stat().st_mtime < since:
+                    continue
+                changed.append(_metadata(read_document(entry.path, fmt)))
+            except FileNotFoundError:
+                # Deleted or archived since the scan started
+                continue
+    changed.sort(key=lambda x: x["created_at"], reverse=True)
+
+    # A conversation re-imported after its deletion is back
+    changed_ids = {c["id"] for c in changed}
+    deleted = [conversation_id for conversation_id in dict.fromkeys(deleted) if conversation_id not in changed_ids]
+    return {"cursor": cursor, "reset": False, "changed": changed, "deleted": deleted}
+
+
+def _record_deletion(conversation_id: str):
+    """
+    Append a deletion to the deletions log ("*" for all conversations).
+
+    Entries older than DELETIONS_RETENTION_DAYS are dropped when the log
+    grows past DELETIONS_LOG_COMPACT_BYTES.
+    """
+    directory = os.path.dirname(DELETIONS_LOG)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps({"id": conversation_id, "deleted_at": time.time()}) + "\n"
+    with named_lock("deletions-log"):
+        with open(DELETIONS_LOG, "a", encoding="utf-8") as f:
+            f.write(line)
+        if os.path.getsize(DELETIONS_LOG) > DELETIONS_LOG_COMPACT_BYTES:
+            cutoff = time.time() - DELETIONS_RETENTION_DAYS * 86400
+            kept = [entry for entry in _read_deletions() if entry["deleted_at"] >= cutoff]
+            tmp_path = f"{DELETIONS_LOG}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in kept)
+            os.replace(tmp_path, DELETIONS_LOG)
+
+
+def _read_deletions() -> List[Dict[str, Any]]:
+    """Entries of the deletions log, oldest first (skipping a torn last line)."""
+    try:
+        with open(DELETIONS_LOG, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+@traced("storage.add_user_message")
 def add_user_message(conversation_id: str, content: str):
     """
     Add a user message to a conversation.
@@ -115,24 +364,28 @@ def add_user_message(conversation_id: str, content: str):
         conversation_id: Conversation identifier
         content: User message content
     """
-    conversation = get_conversation(conversation_id)
-    if conversation is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
+    with conversation_lock(conversation_id):
+        conversation = get_conversation(conversation_id)
+        if conversation is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
 
-    conversation["messages"].append({
-        "role": "user",
-        "content": content
-    })
+        conversation["messages"].append({
+            "role": "user",
+            "content": content
+        })
 
-    save_conversation(conversation)
+        save_conversation(conversation, changed_messages=[len(conversation["messages"]) - 1])
+    search.index_user_message(conversation_id, len(conversation["messages"]) - 1, content)
 
 
+@traced("storage.add_assistant_message")
 def add_assistant_message(
     conversation_id: str,
     stage1: List[Dict[str, Any]],
     stage2: List[Dict[str, Any]],
-    stage3: Dict[str, Any]
-):
+    stage3: Dict[str, Any],
+    metadata: Optional[Dict[str, Any]] = None
+) -> int:
     """
     Add an assistant message with all 3 stages to a conversation.
 
@@ -141,37 +394,130 @@ def add_assistant_message(
         stage1: List of individual model responses
         stage2: List of model rankings
         stage3: Final synthesized response
+        metadata: Optional run details (status, timings, ...)
+
+    Returns:
+        Position of the new message in the conversation
     """
-    conversation = get_conversation(conversation_id)
-    if conversation is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
+    with conversation_lock(conversation_id):
+        conversation = get_conversation(conversation_id)
+        if conversation is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
+
+        message = {
+            "role": "assistant",
+            "stage1": stage1,
+            "stage2": stage2,
+            "stage3": stage3
+        }
+        if metadata:
+            message["metadata"] = metadata
+        conversation["messages"].append(message)
+
+        save_conversation(conversation, changed_messages=[len(conversation["messages"]) - 1])
+    message_index = len(conversation["messages"]) - 1
+    search.index_assistant_message(conversation_id, message_index, stage1, stage3)
+    _remember_answer(conversation, message_index, stage3, metadata)
+    return message_index
+
+
+@traced("storage.replace_assistant_message")
+def replace_assistant_message(
+    conversation_id: str,
+    message_index: int,
+    stage1: List[Dict[str, Any]],
+    stage2: List[Dict[str, Any]],
+    stage3: Dict[str, Any],
+    metadata: Optional[Dict[str, Any]] = None,
+    expected_version: Optional[int] = None
+) -> bool:
+    """
+    Replace the stages of an existing assistant message (e.g. a cached answer
+    with a fresh council run).
 
-    conversation["messages"].append({
-        "role": "assistant",
-        "stage1": stage1,
-        "stage2": stage2,
-        "stage3": stage3
-    })
+    Args:
+        conversation_id: Conversation identifier
+        message_index: Position of the assistant message
+        stage1: List of individual model responses
+        stage2: List of model rankings
+        stage3: Final synthesized response
+        metadata: Optional run details
+        expected_version: Only replace the message if it still has this
+            version (e.g. the one a re-run started from)
 
-    save_conversation(conversation)
+    Returns:
+        False if the message changed since expected_version, else True
 
+    Raises:
+        ValueError: If the conversation or assistant message doesn't exist
+    """
+    with conversation_lock(conversation_id):
+        conversation = get_conversation(conversation_id)
+        if conversation is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
+        messages = conversation["messages"]
+        if not 0 <= message_index < len(messages) or messages[message_index].get("role") != "assistant":
+            raise ValueError(f"No assistant message at {message_index} in {conversation_id}")
+        if expected_version is not None and messages[message_index].get("version", 0) != expected_version:
+            return False
+
+        message = {
+            "role": "assistant",
+            "stage1": stage1,
+            "stage2": stage2,
+            "stage3": stage3
+        }
+        if metadata:
+            message["metadata"] = metadata
+        messages[message_index] = message
+
+        save_conversation(conversation, changed_messages=[message_index])
+    search.replace_assistant_message(conversation_id, message_index, stage1, stage3)
+    _remember_answer(conversation, message_index, stage3, metadata)
+    return True
+
+
+def _remember_answer(
+    conversation: Dict[str, Any],
+    message_index: int,
+    stage3: Dict[str, Any],
+    metadata: Optional[Dict[str, Any]]
+):
+    """Add an answer to the near-duplicate cache, keyed by the question before it."""
+    if not SEMANTIC_CACHE or message_index == 0 or not semantic_cache.is_cacheable(stage3, metadata):
+        return
+    question = conversation["messages"][message_index - 1]
+    if question.get("role") == "user":
+        semantic_cache.remember(conversation["id"], message_index, question["content"], stage3)
 
-def update_conversation_title(conversation_id: str, title: str):
+
+@traced("storage.update_conversation_title")
+def update_conversation_title(conversation_id: str, title: str, expected: Optional[str] = None) -> bool:
     """
     Update the title of a conversation.
 
     Args:
         conversation_id: Conversation identifier
         title: New title for the conversation
+        expected: Only update if the current title is still this one
+
+    Returns:
+        True if the title was updated
     """
-    conversation = get_conversation(conversation_id)
-    if conversation is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
+    with conversation_lock(conversation_id):
+        conversation = get_conversation(conversation_id)
+        if conversation is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
+        if expected is not None and conversation["title"] != expected:
+            return False
 
-    conversation["title"] = title
-    save_conversation(conversation)
+        conversation["title"] = title
+        save_conversation(conversation, changed_fields=["title"])
+    search.index_conversation_meta(conversation_id, title, conversation["created_at"])
+    return True
 
 
+@traced("storage.delete_conversation")
 def delete_conversation(conversation_id: str):
     """
     Delete a conversation file.
@@ -179,17 +525,161 @@ def delete_conversation(conversation_id: str):
     Args:
         conversation_id: Conversation identifier
     """
-    path = get_conversation_path(conversation_id)
-    if os.path.exists(path):
-        os.remove(path)
+    with conversation_lock(conversation_id):
+        _remove_conversation_files(conversation_id)
+        archive.forget(conversation_id)
+    _record_deletion(conversation_id)
+    search.remove_conversation(conversation_id)
+    semantic_cache.remove_conversation(conversation_id)
+
+
+def _remove_conversation_files(conversation_id: str):
+    """Remove a conversation's hot files, in every storage format."""
+    for ext in STORAGE_EXTENSIONS.values():
+        path = os.path.join(DATA_DIR, f"{conversation_id}{ext}")
+        if os.path.exists(path):
+            os.remove(path)
 
 
 def delete_all_conversations():
     """
     Delete all conversation files.
+
+    Holds the lock of every conversation found, so a write in progress
+    finishes before the sweep instead of restoring its file after it.
+    """
+    ensure_data_dir()
+    files = []
+    for filename in os.listdir(DATA_DIR):
+        fmt = format_for_path(filename)
+        if fmt is not None:
+            files.append((filename[:-len(STORAGE_EXTENSIONS[fmt])], os.path.join(DATA_DIR, filename)))
+
+    with conversation_locks(conversation_id for conversation_id, _ in files):
+        for _, path in files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Deleted or archived by another worker meanwhile
+                pass
+        archive.clear()
+        _record_deletion("*")
+    search.clear_index()
+    semantic_cache.clear()
+
+
+def rebuild_search_index() -> int:
+    """
+    Rebuild the full-text search index from the stored conversations.
+
+    Returns:
+        Number of conversations indexed
+    """
+    search.clear_index()
+    return search.index_conversations(iter_conversations())
+
+
+def iter_conversations() -> Iterator[Dict[str, Any]]:
+    """
+    Yield every stored conversation (hot files, then archived), one at a time.
+
+    Only one conversation is held in memory at once, regardless of store size.
     """
     ensure_data_dir()
+    hot_ids = set()
+    with os.scandir(DATA_DIR) as entries:
+        for entry in entries:
+            fmt = format_for_path(entry.name)
+            if fmt is None:
+                continue
+            try:
+                conversation = read_document(entry.path, fmt)
+            except FileNotFoundError:
+                # Deleted or archived since the scan started
+                continue
+            hot_ids.add(conversation["id"])
+            yield conversation
+
+    for conversation in archive.iter_conversations():
+        if conversation["id"] not in hot_ids:
+            yield conversation
+
+
+@traced("storage.import_conversation")
+def import_conversation(conversation: Dict[str, Any], overwrite: bool = False) -> bool:
+    """
+    Store a complete conversation (e.g. from an export) and index it.
+
+    The record must already be validated (transfer.validate_conversation).
+    If indexing fails, the previous state is restored and the error re-raised.
+
+    Args:
+        conversation: Full conversation dict
+        overwrite: Replace an existing conversation with the same id
+
+    Returns:
+        True if stored, False if it already existed and overwrite is off
+    """
+    with conversation_lock(conversation["id"]):
+        existing = get_conversation(conversation["id"])
+        if not overwrite and existing is not None:
+            return False
+
+        # Written as-is so the exported version and timestamps are preserved
+        ensure_data_dir()
+        write_document(conversation)
+        try:
+            search.index_conversation(conversation)
+        except Exception:
+            # Roll back, so a record reported as failed leaves nothing behind
+            if existing is None:
+                _remove_conversation_files(conversation["id"])
+            else:
+                write_document(existing)
+            raise
+    return True
+
+
+def archive_cold_conversations(older_than_days: float, batch_size: int = 100) -> int:
+    """
+    Move conversations not modified recently into packed archive segments.
+
+    Archived conversations stay readable through get_conversation and
+    list_conversations; writing to one moves it back to a hot file.
+
+    Args:
+        older_than_days: Minimum age since the last write, in days
+        batch_size: Conversations packed per segment append
+
+    Returns:
+        Number of conversations archived
+    """
+    ensure_data_dir()
+    cutoff = time.time() - older_than_days * 86400
+
+    def is_cold(path: str) -> bool:
+        try:
+            return os.path.getmtime(path) < cutoff
+        except FileNotFoundError:
+            return False
+
+    cold_files = []
     for filename in os.listdir(DATA_DIR):
-        if filename.endswith('.json'):
-            path = os.path.join(DATA_DIR, filename)
-            os.remove(path)
\ No newline at end of file
+        fmt = format_for_path(filename)
+        path = os.path.join(DATA_DIR, filename)
+        if fmt is not None and is_cold(path):
+            cold_files.append((filename[:-len(STORAGE_EXTENSIONS[fmt])], path, fmt))
+
+    count = 0
+    for start in range(0, len(cold_files), batch_size):
+        batch = cold_files[start:start + batch_size]
+        with conversation_locks(conversation_id for conversation_id, _, _ in batch):
+            # Another worker may have written to a conversation since the scan
+            batch = [(cid, path, fmt) for cid, path, fmt in batch if is_cold(path)]
+            conversations = [read_document(path, fmt) for _, path, fmt in batch]
+            count += archive.append(conversations)
+            # Only remove hot files once the archive index points at their copies
+            for _, path, _ in batch:
+                os.remove(path)
+
+    return count
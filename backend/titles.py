@@ -0,0 +1,134 @@
+"""Conversation titles: an instant local heuristic, optionally replaced by an LLM title later."""
+
+import asyncio
+import logging
+import re
+from collections import Counter
+from typing import List, Set
+
+from . import storage
+from .config import LLM_TITLES
+from .council import generate_conversation_title
+from .scheduler import BACKGROUND, priority
+from .tracing import root_span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TITLE = "New Conversation"
+MAX_TITLE_WORDS = 5
+MAX_TITLE_CHARS = 50
+
+_WORD_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9'+#.-]*[A-Za-z0-9+#]|[A-Za-z0-9]")
+
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being
+below between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down
+during each else ever every few for from further get gets getting give given go going got had hadn't has
+hasn't have haven't having he he'd he'll he's her here here's hers herself him himself his how how's i
+i'd i'll i'm i've if in into is isn't it it's its itself just know let let's like make me mean might
+more most much must mustn't my myself need no nor not now of off on once one only or other ought our ours
+ourselves out over own please really same say shall shan't she she'd she'll she's should shouldn't so some
+such tell than thank thanks that that's the their theirs them themselves then there there's these they
+they'd they'll they're they've thing things think this those through to too try under until up us use
+used using very want was wasn't way we we'd we'll we're we've well were weren't what what's when when's
+where where's whether which while who who's whom why why's will with won't would wouldn't yes yet you
+you'd you'll you're you've your yours yourself yourselves
+back best better compare describe difference explain forth good help keep show versus vs write
+""".split())
+
+# Background LLM title jobs, kept referenced until they finish
+_pending: Set[asyncio.Task] = set()
+
+
+def heuristic_title(text: str) -> str:
+    """
+    Build a short title from the keywords of a message, without any network call.
+
+    Words that aren't stopwords are scored by how often they appear, their
+    length and whether they look like names or acronyms; the best few are
+    kept in their original order.
+
+    Args:
+        text: The first user message
+
+    Returns:
+        A title of at most MAX_TITLE_WORDS words (DEFAULT_TITLE if nothing fits)
+    """
+    words = _WORD_RE.findall(text[:2000])
+    candidates: List[str] = []
+    counts: Counter = Counter()
+    for word in words:
+        key = word.lower()
+        if key in _STOPWORDS or (len(key) < 3 and not word.isupper()) or key.isdigit():
+            continue
+        if key not in counts:
+            candidates.append(word)
+        counts[key] += 1
+
+    if not candidates:
+        return DEFAULT_TITLE
+
+    def score(item):
+        index, word = item
+        key = word.lower()
+        capitalized = word[0].isupper() and (index > 0 or word.isupper())
+        return counts[key] * 2 + min(len(key), 10) / 4 + (2 if capitalized else 0) - index / 100
+
+    best = sorted(enumerate(candidates), key=score, reverse=True)[:MAX_TITLE_WORDS]
+    picked = [word for _, word in sorted(best)]
+
+    title = ""
+    for word in picked:
+        word = word if word.isupper() or any(c.isupper() for c in word[1:]) else word.capitalize()
+        if len(title) + len(word) + 1 > MAX_TITLE_CHARS:
+            break
+        title = f"{title} {word}".strip()
+    return title or DEFAULT_TITLE
+
+
+async def set_initial_title(conversation_id: str, user_query: str) -> str:
+    """
+    Give a new conversation its heuristic title now and, if LLM_TITLES is
+    on, schedule an LLM title to replace it in the background.
+
+    Args:
+        conversation_id: Conversation identifier
+        user_query: The first user message
+
+    Returns:
+        The title stored now
+    """
+    title = heuristic_title(user_query)
+    await asyncio.to_thread(storage.update_conversation_title, conversation_id, title)
+    if LLM_TITLES:
+        task = asyncio.create_task(_replace_with_llm_title(conversation_id, user_query, title))
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+    return title
+
+
+async def _replace_with_llm_title(conversation_id: str, user_query: str, heuristic: str):
+    """Swap the heuristic title for an LLM one, unless the title changed meanwhile."""
+    # A trace of its own: the request that scheduled this has usually finished
+    with root_span("title.background", conversation_id=conversation_id), priority(BACKGROUND):
+        title = await generate_conversation_title(user_query)
+        if title in (DEFAULT_TITLE, heuristic):
+            return
+        try:
+            replaced = await asyncio.to_thread(
+                storage.update_conversation_title, conversation_id, title, expected=heuristic
+            )
+        except ValueError:
+            # The conversation was deleted in the meantime
+            return
+        if replaced:
+            logger.debug(f"Replaced title of {conversation_id} with LLM title: {title}")
+
+
+async def drain_pending_titles(timeout: float = 5.0):
+    """Give background title jobs a moment to finish (e.g. at shutdown), then cancel the rest."""
+    if not _pending:
+        return
+    _, pending = await asyncio.wait(set(_pending), timeout=timeout)
+    for task in pending:
+        task.cancel()
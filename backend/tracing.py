@@ -0,0 +1,374 @@
+"""Lightweight span tracing for council runs, with file and OTLP/HTTP exporters."""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from .config import (
+    TRACE_BUFFER_SIZE,
+    TRACE_EXPORTER,
+    TRACE_FILE,
+    TRACE_OTLP_ENDPOINT,
+    TRACING_ENABLED,
+)
+
+logger = logging.getLogger(__name__)
+
+# Stage spans reported in the timing summary of an assistant message
+SUMMARY_STAGES = ("stage1", "stage2", "stage3", "title")
+
+# httpcore trace events -> upstream span attribute holding the phase duration
+_UPSTREAM_PHASES = {
+    "connect_tcp": "connect_ms",
+    "start_tls": "tls_ms",
+    "send_request_headers": "send_ms",
+    "send_request_body": "send_ms",
+    "receive_response_headers": "wait_ms",
+    "receive_response_body": "body_ms",
+}
+
+
+class Trace:
+    """All spans of one traced operation; exported once its last span ends."""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List["Span"] = []
+        self.open = 0
+
+    @property
+    def root(self) -> "Span":
+        return self.spans[0]
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    def __init__(self, name: str, trace: Trace, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = os.urandom(8).hex()
+        self.attributes = dict(attributes)
+        self.events: List[Dict[str, Any]] = []
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.duration_ns: Optional[int] = None
+        trace.spans.append(self)
+        trace.open += 1
+
+    def set(self, **attributes):
+        """Add or update span attributes."""
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes):
+        """Record a point-in-time event on the span."""
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+    def elapsed_ms(self) -> float:
+        """Duration so far (or in total, once ended) in milliseconds."""
+        ns = self.duration_ns if self.duration_ns is not None else time.perf_counter_ns() - self._start_perf
+        return round(ns / 1e6, 2)
+
+    def end(self):
+        if self.duration_ns is not None:
+            return
+        self.duration_ns = time.perf_counter_ns() - self._start_perf
+        self.trace.open -= 1
+        if self.trace.open == 0:
+            _finish_trace(self.trace)
+
+
+class _NoopSpan:
+    """Stand-in yielded when tracing is off, so callers never need to check."""
+
+    def set(self, **attributes):
+        pass
+
+    def add_event(self, name: str, **attributes):
+        pass
+
+    def elapsed_ms(self) -> float:
+        return 0.0
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+# Recently finished traces, for the slow-trace debug endpoint
+_recent: Deque[Trace] = deque(maxlen=TRACE_BUFFER_SIZE)
+_file_lock = threading.Lock()
+_pending_exports: set = set()
+
+
+def current_span() -> Optional[Span]:
+    """The innermost active span in this context, if any."""
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a span, starting a new trace if none is active.
+
+    Tasks created inside the block inherit it as their parent span.
+
+    Args:
+        name: Span name
+        **attributes: Initial span attributes
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+    parent = _current_span.get()
+    s = Span(name, parent.trace if parent else Trace(), parent, attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.set(error=type(e).__name__)
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Exited from another context (e.g. a generator finalized elsewhere)
+            pass
+        s.end()
+
+
+@contextmanager
+def root_span(name: str, **attributes):
+    """Like span(), but always starts a new trace (for background work spawned from a traced request)."""
+    token = _current_span.set(None)
+    try:
+        with span(name, **attributes) as s:
+            yield s
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def child_span(name: str, **attributes):
+    """Like span(), but a no-op unless a trace is already active."""
+    if _current_span.get() is None:
+        yield _NOOP_SPAN
+        return
+    with span(name, **attributes) as s:
+        yield s
+
+
+def traced(name: str) -> Callable:
+    """Decorator recording each call of a sync or async function as a child span."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with child_span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with child_span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def httpx_trace_hook(s) -> Optional[Callable]:
+    """
+    Build an httpx `trace` extension that records connection phases on a span.
+
+    DNS resolution happens inside httpcore's connect_tcp, so it is part of
+    connect_ms. ttfb_ms is measured from the start of the span.
+
+    Returns:
+        The async callback, or None when the span isn't recording
+    """
+    if not isinstance(s, Span):
+        return None
+    started: Dict[str, int] = {}
+
+    async def hook(event_name: str, info: Dict[str, Any]):
+        phase, _, state = event_name.split(".", 1)[-1].rpartition(".")
+        attribute = _UPSTREAM_PHASES.get(phase)
+        if attribute is None:
+            return
+        now = time.perf_counter_ns()
+        if state == "started":
+            started[phase] = now
+            return
+        elapsed = (now - started.pop(phase, now)) / 1e6
+        s.set(**{attribute: round(s.attributes.get(attribute, 0) + elapsed, 2)})
+        if phase == "receive_response_headers":
+            s.set(ttfb_ms=round((now - s._start_perf) / 1e6, 2))
+        if state == "failed":
+            s.add_event(f"{phase}.failed", error=repr(info.get("exception")))
+
+    return hook
+
+
+def timing_summary(root: Span) -> Dict[str, Any]:
+    """
+    Summarize where the time went under a span, for storing with a message.
+
+    Returns:
+        Dict with total_ms, per-stage durations, per upstream call timings
+        and total storage time
+    """
+    if not isinstance(root, Span):
+        return {}
+    descendants = {root.span_id}
+    stages: Dict[str, float] = {}
+    upstream = []
+    storage_ms = 0.0
+    # Parents always start before their children, so one pass finds every descendant
+    for s in root.trace.spans:
+        if s.parent_id not in descendants:
+            continue
+        descendants.add(s.span_id)
+        if s.duration_ns is None:
+            continue
+        if s.name in SUMMARY_STAGES:
+            stages[s.name] = s.elapsed_ms()
+        elif s.name == "upstream":
+            call = {"model": s.attributes.get("model"), "ms": s.elapsed_ms()}
+            if "ttfb_ms" in s.attributes:
+                call["ttfb_ms"] = s.attributes["ttfb_ms"]
+            upstream.append(call)
+        elif s.name.startswith("storage."):
+            storage_ms += s.elapsed_ms()
+    return {
+        "total_ms": root.elapsed_ms(),
+        "stages": stages,
+        "upstream": upstream,
+        "storage_ms": round(storage_ms, 2),
+    }
+
+
+def recent_traces(min_ms: float = 0.0, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Recently finished traces in this worker, slowest first.
+
+    Args:
+        min_ms: Only include traces at least this long
+        limit: Maximum number of traces
+
+    Returns:
+        List of trace dicts with their spans (offsets relative to the trace start)
+    """
+    slow = [t for t in list(_recent) if t.root.elapsed_ms() >= min_ms]
+    slow.sort(key=lambda t: t.root.elapsed_ms(), reverse=True)
+    return [_trace_to_dict(t) for t in slow[:limit]]
+
+
+def _trace_to_dict(trace: Trace) -> Dict[str, Any]:
+    root = trace.root
+    return {
+        "trace_id": trace.trace_id,
+        "name": root.name,
+        "start": root.start_ns / 1e9,
+        "duration_ms": root.elapsed_ms(),
+        "attributes": root.attributes,
+        "spans": [
+            {
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "name": s.name,
+                "offset_ms": round((s.start_ns - root.start_ns) / 1e6, 2),
+                "duration_ms": s.elapsed_ms(),
+                "attributes": s.attributes,
+            }
+            for s in trace.spans
+        ],
+    }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def to_otlp(trace: Trace) -> Dict[str, Any]:
+    """Encode a trace as an OTLP/HTTP JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in trace.spans:
+        end_ns = s.start_ns + (s.duration_ns or 0)
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.parent_id or "",
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": _otlp_attributes(s.attributes),
+            "events": [
+                {"name": e["name"], "timeUnixNano": str(e["time_ns"]), "attributes": _otlp_attributes(e["attributes"])}
+                for e in s.events
+            ],
+            "status": {"code": 2 if "error" in s.attributes else 1},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": "llm-council"})},
+            "scopeSpans": [{"scope": {"name": "backend.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+def _export_file(document: Dict[str, Any]):
+    """Append one OTLP JSON document per line (the collector file exporter layout)."""
+    Path(TRACE_FILE).parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(document, separators=(",", ":")) + "\n"
+    with _file_lock:
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+async def _export_otlp(document: Dict[str, Any]):
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            response = await client.post(TRACE_OTLP_ENDPOINT, json=document)
+            response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"OTLP trace export failed: {e}")
+
+
+def _finish_trace(trace: Trace):
+    """Keep a finished trace for the debug endpoint and hand it to the exporter."""
+    _recent.append(trace)
+    if TRACE_EXPORTER == "file":
+        try:
+            _export_file(to_otlp(trace))
+        except OSError as e:
+            logger.warning(f"Trace file export failed: {e}")
+    elif TRACE_EXPORTER == "otlp":
+        try:
+            task = asyncio.get_running_loop().create_task(_export_otlp(to_otlp(trace)))
+            _pending_exports.add(task)
+            task.add_done_callback(_pending_exports.discard)
+        except RuntimeError:
+            # Finished outside the event loop (e.g. in a worker thread)
+            threading.Thread(target=asyncio.run, args=(_export_otlp(to_otlp(trace)),), daemon=True).start()
@@ -0,0 +1,337 @@
+"""Streaming NDJSON export and import of the conversation store."""
+
+import asyncio
+import itertools
+import logging
+import re
+import sys
+import zlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Iterable, Iterator, AsyncIterable
+
+from . import storage
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Conversation ids become file names, so only allow a safe character set
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def _in_range(conversation: Dict[str, Any], since: Optional[str], until: Optional[str]) -> bool:
+    """Check created_at against an inclusive start and exclusive end (ISO strings)."""
+    created_at = conversation.get("created_at", "")
+    if since and created_at < since:
+        return False
+    if until and created_at >= until:
+        return False
+    return True
+
+
+def iter_export(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    compress: bool = False
+) -> Iterator[bytes]:
+    """
+    Yield the store as NDJSON, one conversation per line.
+
+    Args:
+        since: Only export conversations created at or after this ISO date
+        until: Only export conversations created before this ISO date
+        compress: Emit a gzip stream instead of plain text
+
+    Yields:
+        Chunks of NDJSON (or gzip) bytes
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    for conversation in storage.iter_conversations():
+        if not _in_range(conversation, since, until):
+            continue
+        line = dumps(conversation) + b"\n"
+        if compressor is None:
+            yield line
+        else:
+            chunk = compressor.compress(line)
+            if chunk:
+                yield chunk
+
+    if compressor is not None:
+        yield compressor.flush()
+
+
+class NDJSONLineReader:
+    """
+    Incrementally split NDJSON byte chunks into lines.
+
+    Gzip input is detected from its magic bytes and decompressed on the fly.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._decompressor = None
+        self._detected = False
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Consume a chunk and return the lines completed by it."""
+        if not self._detected:
+            self._buffer += chunk
+            if len(self._buffer) < len(GZIP_MAGIC):
+                return []
+            self._detected = True
+            if self._buffer.startswith(GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(wbits=31)
+            chunk, self._buffer = self._buffer, b""
+
+        if self._decompressor is not None:
+            chunk = self._decompressor.decompress(chunk)
+
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        return [line for line in lines if line.strip()]
+
+    def close(self) -> List[bytes]:
+        """Flush any trailing line without a final newline."""
+        if self._decompressor is not None:
+            self._buffer += self._decompressor.flush()
+        remaining, self._buffer = self._buffer, b""
+        return [remaining] if remaining.strip() else []
+
+
+def _is_iso_timestamp(value: Any) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _validate_message(position: int, message: Any):
+    """Check one stored message: a user question or a council answer."""
+    if not isinstance(message, dict):
+        raise ValueError(f"Message {position} is not an object")
+    role = message.get("role")
+    if role == "user":
+        if not isinstance(message.get("content"), str):
+            raise ValueError(f"User message {position} needs a string 'content'")
+    elif role == "assistant":
+        stage1 = message.get("stage1")
+        if not isinstance(stage1, list) or not all(isinstance(result, dict) for result in stage1):
+            raise ValueError(f"Assistant message {position} needs a 'stage1' list of objects")
+        stage2 = message.get("stage2", [])
+        if not isinstance(stage2, list) or not all(isinstance(result, dict) for result in stage2):
+            raise ValueError(f"Assistant message {position} has a malformed 'stage2'")
+        stage3 = message.get("stage3")
+        if not isinstance(stage3, dict) or not isinstance(stage3.get("response", ""), str):
+            raise ValueError(f"Assistant message {position} needs a 'stage3' object")
+        for result in stage1:
+            if not isinstance(result.get("response", ""), str):
+                raise ValueError(f"Assistant message {position} has a non-string stage 1 response")
+    else:
+        raise ValueError(f"Message {position} has an invalid role: {role!r}")
+
+
+def validate_conversation(conversation: Any):
+    """
+    Check that a decoded record is a storable conversation.
+
+    Everything the store relies on is checked (types, timestamps, message
+    shape), so a record that passes can be listed, indexed and served.
+
+    Raises:
+        ValueError: If the record is malformed
+    """
+    if not isinstance(conversation, dict):
+        raise ValueError("Record is not an object")
+    for field in ("id", "created_at", "title", "messages"):
+        if field not in conversation:
+            raise ValueError(f"Record is missing '{field}'")
+    if not isinstance(conversation["id"], str) or not _ID_RE.match(conversation["id"]):
+        raise ValueError(f"Invalid conversation id: {conversation['id']!r}")
+    if not isinstance(conversation["title"], str):
+        raise ValueError("'title' must be a string")
+    if not _is_iso_timestamp(conversation["created_at"]):
+        raise ValueError("'created_at' must be an ISO timestamp")
+    if "updated_at" in conversation and not _is_iso_timestamp(conversation["updated_at"]):
+        raise ValueError("'updated_at' must be an ISO timestamp")
+    version = conversation.get("version", 0)
+    if not isinstance(version, int) or isinstance(version, bool):
+        raise ValueError("'version' must be an integer")
+    if not isinstance(conversation["messages"], list):
+        raise ValueError("'messages' must be a list")
+    for position, message in enumerate(conversation["messages"]):
+        _validate_message(position, message)
+
+
+def _ingest(line: bytes, overwrite: bool) -> str:
+    """Decode, validate and store one record, returning its outcome."""
+    conversation = loads(line)
+    validate_conversation(conversation)
+    return "imported" if storage.import_conversation(conversation, overwrite) else "skipped"
+
+
+def _log_failure(number: int, line: bytes, error: Exception):
+    """Log why a record was not imported, naming its line and id if it has one."""
+    try:
+        record = loads(line)
+        conversation_id = record.get("id") if isinstance(record, dict) else None
+    except Exception:
+        conversation_id = None
+    which = f"line {number}" + (f" (conversation {conversation_id!r})" if isinstance(conversation_id, str) else "")
+    logger.warning(f"Failed to import {which}: {error}", exc_info=True)
+
+
+def import_stream(
+    chunks: Iterable[bytes],
+    workers: int = 4,
+    overwrite: bool = False
+) -> Dict[str, int]:
+    """
+    Import an NDJSON stream using a pool of writer threads.
+
+    At most `workers * 2` records are in flight, so memory stays bounded.
+
+    Args:
+        chunks: Byte chunks of NDJSON (optionally gzip-compressed)
+        workers: Number of parallel writers
+        overwrite: Replace conversations that already exist
+
+    Returns:
+        Counts of imported, skipped and failed records
+    """
+    counts = {"imported": 0, "skipped": 0, "failed": 0}
+    reader = NDJSONLineReader()
+    pending = set()
+    records = {}
+
+    def collect(done):
+        for future in done:
+            number, line = records.pop(future)
+            try:
+                counts[future.result()] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                _log_failure(number, line, e)
+
+    def lines():
+        for chunk in chunks:
+            yield from reader.feed(chunk)
+        yield from reader.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for number, line in enumerate(lines(), start=1):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = pool.submit(_ingest, line, overwrite)
+            records[future] = (number, line)
+            pending.add(future)
+        collect(wait(pending)[0])
+
+    return counts
+
+
+async def import_stream_async(
+    chunks: AsyncIterable[bytes],
+    workers: int = 4,
+    overwrite: bool = False
+) -> Dict[str, int]:
+    """
+    Import an NDJSON request body without blocking the event loop.
+
+    Storage writes run in threads, at most `workers` at a time.
+
+    Args:
+        chunks: Async iterator of body chunks
+        workers: Number of parallel writers
+        overwrite: Replace conversations that already exist
+
+    Returns:
+        Counts of imported, skipped and failed records
+    """
+    counts = {"imported": 0, "skipped": 0, "failed": 0}
+    reader = NDJSONLineReader()
+    semaphore = asyncio.Semaphore(workers)
+    tasks = set()
+    numbers = itertools.count(1)
+
+    async def ingest(number, line):
+        try:
+            counts[await asyncio.to_thread(_ingest, line, overwrite)] += 1
+        except Exception as e:
+            counts["failed"] += 1
+            _log_failure(number, line, e)
+        finally:
+            semaphore.release()
+
+    async def schedule(lines):
+        for line in lines:
+            await semaphore.acquire()
+            task = asyncio.create_task(ingest(next(numbers), line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async for chunk in chunks:
+        await schedule(reader.feed(chunk))
+    await schedule(reader.close())
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return counts
+
+
+def _read_chunks(stream, size: int = 1 << 16) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def main():
+    """Command-line entry point for export and import."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export or import the conversation store as NDJSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write conversations as NDJSON")
+    export_parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    export_parser.add_argument("--since", help="Only conversations created at or after this ISO date")
+    export_parser.add_argument("--until", help="Only conversations created before this ISO date")
+    export_parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+
+    import_parser = subparsers.add_parser("import", help="Read conversations from NDJSON (plain or gzip)")
+    import_parser.add_argument("input", nargs="?", help="Input file (default: stdin)")
+    import_parser.add_argument("--workers", type=int, default=4, help="Parallel writers (default: 4)")
+    import_parser.add_argument("--overwrite", action="store_true", help="Replace existing conversations")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in iter_export(args.since, args.until, args.gzip):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    else:
+        source = open(args.input, 'rb') if args.input else sys.stdin.buffer
+        try:
+            counts = import_stream(_read_chunks(source), args.workers, args.overwrite)
+        finally:
+            if args.input:
+                source.close()
+        print(f"Imported {counts['imported']}, skipped {counts['skipped']}, failed {counts['failed']}",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark the council hot paths: ranking parsing, aggregation and prompt construction.
+
+Upstream calls are replaced with an instant stub, so the stage timings are
+the cost of building prompts and processing responses, not the network.
+
+Run from the project root:
+
+    uv run python -m benchmarks.bench_council
+    uv run python -m benchmarks.bench_council --save-baseline
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+from typing import Any, Dict, List
+
+from backend import council
+
+from .bench_serialization import make_stage_payloads
+from .harness import Results, add_baseline_arguments, finish
+
+LABELS = [f"Response {chr(65 + i)}" for i in range(26)]
+
+
+def make_ranking_text(labels: List[str], evaluation_chars: int, seed: int, header: bool = True) -> str:
+    """A long evaluation that mentions labels in passing, followed by a ranking."""
+    rng = random.Random(seed)
+    sentences = []
+    length = 0
+    while length < evaluation_chars:
+        sentence = f"{rng.choice(labels)} makes a point about entropy that {rng.choice(labels)} overlooks. "
+        sentences.append(sentence)
+        length += len(sentence)
+    order = labels[:]
+    rng.shuffle(order)
+    ranking = "\n".join(f"{i}. {label}" for i, label in enumerate(order, start=1))
+    return "".join(sentences) + ("\n\nFINAL RANKING:\n" if header else "\n\n") + ranking
+
+
+def make_stage2_results(rankers: int, labels: List[str], evaluation_chars: int) -> List[Dict[str, Any]]:
+    return [
+        {"model": f"vendor/ranker-{i}", "ranking": make_ranking_text(labels, evaluation_chars, seed=i)}
+        for i in range(rankers)
+    ]
+
+
+async def _instant_query_model(model, messages, *args, **kwargs):
+    return {"content": make_ranking_text(LABELS[:6], 2000, seed=0), "reasoning_details": None}
+
+
+def run(args) -> Results:
+    results = Results("council")
+
+    print("parse_ranking_from_text:")
+    for chars in (2_000, 50_000):
+        text = make_ranking_text(LABELS, chars, seed=1)
+        results.bench(f"parse_ranking_from_text/{chars}-chars", lambda: council.parse_ranking_from_text(text), 200)
+    text = make_ranking_text(LABELS, 50_000, seed=2, header=False)
+    results.bench("parse_ranking_from_text/50000-chars-no-header",
+                  lambda: council.parse_ranking_from_text(text), 200)
+
+    print("\ncalculate_aggregate_rankings:")
+    label_to_model = {label: f"vendor/model-{i}" for i, label in enumerate(LABELS)}
+    for rankers, chars in ((6, 4_000), (100, 4_000), (100, 50_000)):
+        stage2 = make_stage2_results(rankers, LABELS, chars)
+        results.bench(
+            f"calculate_aggregate_rankings/{rankers}x{chars}-chars",
+            lambda: council.calculate_aggregate_rankings(stage2, label_to_model),
+            10
+        )
+
+    print("\nStage prompt construction (upstream stubbed):")
+    payloads = make_stage_payloads(members=len(council.COUNCIL_MODELS), response_chars=args.response_chars)
+    stage1 = payloads["stage1"]
+    stage2 = payloads["stage2"]
+    loop = asyncio.new_event_loop()
+    original = council.query_model
+    council.query_model = _instant_query_model
+    try:
+        results.bench("stage1_collect_responses",
+                      lambda: loop.run_until_complete(council.stage1_collect_responses("Why is the sky blue?")), 50)
+        results.bench("stage2_collect_rankings",
+                      lambda: loop.run_until_complete(council.stage2_collect_rankings("Why is the sky blue?", stage1)), 50)
+        results.bench("stage3_synthesize_final",
+                      lambda: loop.run_until_complete(council.stage3_synthesize_final("Why is the sky blue?", stage1, stage2)), 50)
+    finally:
+        council.query_model = original
+        loop.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Council hot-path benchmarks")
+    parser.add_argument("--response-chars", type=int, default=4000, help="Size of each stage 1 response")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    sys.exit(finish(run(args), args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark the serialization layer against the previous stdlib code path.
+
+Run from the project root:
+
+    uv run python -m benchmarks.bench_serialization
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import timeit
+from typing import Any, Callable, Dict, List
+
+from backend import serialization
+
+
+def make_stage_payloads(members: int = 6, response_chars: int = 4000) -> Dict[str, Any]:
+    """Build stage1/stage2 payloads of a realistic size."""
+    body = ("Bazinga! " * (response_chars // 9))[:response_chars]
+    stage1 = [
+        {"model": f"vendor/model-{i}", "sheldon_name": f"Sheldon {i}", "response": body}
+        for i in range(members)
+    ]
+    stage2 = [
+        {
+            "model": f"vendor/model-{i}",
+            "sheldon_name": f"Sheldon {i}",
+            "ranking": body + "\n\nFINAL RANKING:\n1. Response A\n2. Response B",
+            "parsed_ranking": ["Response A", "Response B"],
+        }
+        for i in range(members)
+    ]
+    return {"stage1": stage1, "stage2": stage2}
+
+
+def make_conversation(turns: int, payloads: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a conversation document with the given number of turns."""
+    messages: List[Dict[str, Any]] = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question number {i}?"})
+        messages.append({
+            "role": "assistant",
+            "stage1": payloads["stage1"],
+            "stage2": payloads["stage2"],
+            "stage3": {"model": "vendor/chairman", "response": payloads["stage1"][0]["response"]},
+        })
+    return {
+        "id": "bench",
+        "created_at": "2025-01-01T00:00:00",
+        "title": "Benchmark",
+        "messages": messages,
+    }
+
+
+def bench(label: str, fn: Callable[[], Any], number: int) -> float:
+    """Time fn and print the per-call cost in microseconds."""
+    best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<40} {best * 1e6:>10.1f} us")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization benchmarks")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per conversation")
+    parser.add_argument("--number", type=int, default=20, help="Calls per timing sample")
+    args = parser.parse_args()
+
+    payloads = make_stage_payloads()
+    conversation = make_conversation(args.turns, payloads)
+    event = {"type": "stage2_complete", "data": payloads["stage2"], "metadata": {}}
+
+    print(f"orjson: {'yes' if serialization.orjson else 'no'}, "
+          f"msgpack: {'yes' if serialization.msgpack else 'no'}")
+
+    print("\nSSE event (stage2_complete):")
+    legacy = bench("json.dumps (legacy)", lambda: f"data: {json.dumps(event)}\n\n", args.number)
+    current = bench("serialization.sse_event", lambda: serialization.sse_event(event), args.number)
+    print(f"  speedup: {legacy / current:.2f}x")
+
+    print(f"\nStorage encode ({args.turns} turns):")
+    legacy = bench("json.dumps indent=2 (legacy)", lambda: json.dumps(conversation, indent=2), args.number)
+    for fmt in ("json", "msgpack"):
+        if serialization.get_storage_format(fmt) != fmt:
+            continue
+        current = bench(f"encode_document ({fmt})", lambda: serialization.encode_document(conversation, fmt), args.number)
+        print(f"  speedup ({fmt}): {legacy / current:.2f}x")
+
+    print(f"\nStorage round trip through disk ({args.turns} turns):")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.json")
+
+        def legacy_round_trip():
+            with open(legacy_path, "w") as f:
+                json.dump(conversation, f, indent=2)
+            with open(legacy_path, "r") as f:
+                json.load(f)
+
+        legacy = bench("json.dump + json.load (legacy)", legacy_round_trip, args.number)
+
+        for fmt in ("json", "msgpack"):
+            if serialization.get_storage_format(fmt) != fmt:
+                continue
+            path = os.path.join(tmp, f"current{serialization.STORAGE_EXTENSIONS[fmt]}")
+
+            def round_trip(fmt=fmt, path=path):
+                with open(path, "wb") as f:
+                    f.write(serialization.encode_document(conversation, fmt))
+                with open(path, "rb") as f:
+                    serialization.decode_document(f.read(), fmt)
+
+            current = bench(f"encode + decode ({fmt})", round_trip, args.number)
+            size = os.path.getsize(path)
+            print(f"  speedup ({fmt}): {legacy / current:.2f}x, size {size / 1024:.0f} KiB "
+                  f"vs {os.path.getsize(legacy_path) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
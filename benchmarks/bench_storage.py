@@ -0,0 +1,125 @@
+"""
+Benchmark every storage operation against stores of 10, 10k and 100k conversations.
+
+Each store is generated in a temporary directory (the backend's relative
+data paths resolve there), so the real data directory is never touched.
+
+Run from the project root:
+
+    uv run python -m benchmarks.bench_storage
+    uv run python -m benchmarks.bench_storage --sizes 10,10000 --save-baseline
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from backend import archive, storage
+from backend.serialization import encode_document, get_storage_format
+
+from .bench_serialization import make_stage_payloads
+from .harness import Results, add_baseline_arguments, finish
+
+DEFAULT_SIZES = (10, 10_000, 100_000)
+
+
+def make_small_conversation(index: int, payloads: Dict[str, Any]) -> Dict[str, Any]:
+    """A one-turn conversation, like most of a real store."""
+    created = (datetime(2025, 1, 1) + timedelta(minutes=index)).isoformat()
+    return {
+        "id": f"bench-{index:06d}",
+        "created_at": created,
+        "updated_at": created,
+        "version": 3,
+        "title": f"Benchmark conversation {index}",
+        "messages": [
+            {"role": "user", "content": f"Question number {index}?"},
+            {
+                "role": "assistant",
+                "stage1": payloads["stage1"],
+                "stage2": payloads["stage2"],
+                "stage3": {"model": "vendor/chairman", "response": payloads["stage1"][0]["response"]},
+            },
+        ],
+    }
+
+
+def populate(size: int, payloads: Dict[str, Any]):
+    """Write `size` conversation files straight to the data directory."""
+    storage.ensure_data_dir()
+    fmt = get_storage_format()
+    for index in range(size):
+        conversation = make_small_conversation(index, payloads)
+        with open(storage.get_conversation_path(conversation["id"], fmt), "wb") as f:
+            f.write(encode_document(conversation, fmt))
+
+
+def run_size(results: Results, size: int, payloads: Dict[str, Any]):
+    """Benchmark each operation against one freshly generated store."""
+    print(f"\n{size} conversations:")
+    populate(size, payloads)
+    archive.clear()
+
+    # Whole-store operations are slow on big stores, so sample them less
+    scan_repeat = 3 if size <= 10_000 else 1
+    target = "bench-000000"
+    stage1, stage2 = payloads["stage1"], payloads["stage2"]
+    stage3 = {"model": "vendor/chairman", "response": stage1[0]["response"]}
+
+    def bench(op: str, fn, number: int = 20, repeat: int = 5):
+        results.bench(f"storage/{size}/{op}", fn, number, repeat)
+
+    bench("rebuild_search_index", storage.rebuild_search_index, 1, scan_repeat)
+    bench("list_conversations", storage.list_conversations, 1, scan_repeat)
+    bench("iter_conversations", lambda: sum(1 for _ in storage.iter_conversations()), 1, scan_repeat)
+    bench("get_conversation", lambda: storage.get_conversation(target))
+    bench("save_conversation", lambda: storage.save_conversation(storage.get_conversation(target)))
+    bench("add_user_message", lambda: storage.add_user_message(target, "Another question?"))
+    bench("add_assistant_message", lambda: storage.add_assistant_message(target, stage1, stage2, stage3))
+    bench("update_conversation_title", lambda: storage.update_conversation_title(target, "Renamed"))
+    bench("create_conversation", lambda: storage.create_conversation(str(uuid.uuid4())))
+
+    imported = make_small_conversation(size + 1, payloads)
+    bench("import_conversation", lambda: storage.import_conversation(imported, overwrite=True))
+
+    doomed = iter([storage.create_conversation(str(uuid.uuid4()))["id"] for _ in range(100)])
+    bench("delete_conversation", lambda: storage.delete_conversation(next(doomed)), 20, 5)
+
+    # Archive everything, then time reads that go through the archive
+    bench("archive_cold_conversations", lambda: storage.archive_cold_conversations(0), 1, 1)
+    bench("get_conversation (archived)", lambda: storage.get_conversation("bench-000001"))
+    bench("list_conversations (archived)", storage.list_conversations, 1, scan_repeat)
+
+    bench("delete_all_conversations", storage.delete_all_conversations, 1, 1)
+
+
+def run(args) -> Results:
+    results = Results("storage")
+    payloads = make_stage_payloads(members=6, response_chars=args.response_chars)
+    original_cwd = os.getcwd()
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix="council-bench-") as tmp:
+            os.chdir(tmp)
+            try:
+                run_size(results, size, payloads)
+            finally:
+                os.chdir(original_cwd)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage benchmarks")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=list(DEFAULT_SIZES),
+                        help="Comma-separated store sizes (default: 10,10000,100000)")
+    parser.add_argument("--response-chars", type=int, default=1000, help="Size of each stored stage 1 response")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    sys.exit(finish(run(args), args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Timing helpers and JSON baselines shared by the benchmark suites."""
+
+import json
+import os
+import platform
+import sys
+import timeit
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+class Results:
+    """Per-call timings of one suite run, keyed by benchmark name."""
+
+    def __init__(self, suite: str):
+        self.suite = suite
+        self.timings: Dict[str, float] = {}
+
+    def bench(self, name: str, fn: Callable[[], Any], number: int = 1, repeat: int = 5) -> float:
+        """
+        Time fn and record the best per-call cost.
+
+        Args:
+            name: Benchmark name (the baseline key)
+            fn: Zero-argument callable to time
+            number: Calls per timing sample
+            repeat: Number of samples; the fastest is kept
+
+        Returns:
+            Best per-call time in seconds
+        """
+        best = min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+        self.timings[name] = best
+        print(f"  {name:<56} {format_seconds(best):>12}")
+        return best
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def baseline_path(suite: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{suite}.json")
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    """Load a saved baseline, or None if there isn't one yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results: Results, path: str, merge: bool = True):
+    """
+    Store a suite's timings as its new baseline.
+
+    Args:
+        results: Timings to store
+        path: Baseline file
+        merge: Keep entries not measured in this run (e.g. other store sizes)
+    """
+    existing = load_baseline(path) if merge else None
+    timings = dict(existing["timings"]) if existing else {}
+    timings.update(results.timings)
+    document = {
+        "suite": results.suite,
+        "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timings": dict(sorted(timings.items())),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+        f.write("\n")
+    print(f"\nBaseline saved to {path}")
+
+
+def compare(results: Results, baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare timings against a baseline and print the change for each benchmark.
+
+    Args:
+        results: Current timings
+        baseline: Loaded baseline document
+        tolerance: Allowed slowdown as a fraction (0.25 = 25% slower)
+
+    Returns:
+        Names of benchmarks that regressed beyond the tolerance
+    """
+    if baseline.get("platform") != platform.platform() or baseline.get("python") != platform.python_version():
+        print(f"\nNote: baseline was recorded on {baseline.get('platform')} "
+              f"(Python {baseline.get('python')}); timings may not be comparable.")
+
+    regressions = []
+    print(f"\nAgainst baseline ({baseline.get('recorded_at')}), tolerance {tolerance:.0%}:")
+    for name, current in results.timings.items():
+        previous = baseline["timings"].get(name)
+        if previous is None:
+            print(f"  {name:<56} {'new':>12}")
+            continue
+        change = current / previous - 1 if previous else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<56} {change:>+11.1%}{flag}")
+    return regressions
+
+
+def finish(results: Results, args) -> int:
+    """
+    Save or compare a suite's results as requested on the command line.
+
+    Returns:
+        Process exit code: 1 if any benchmark regressed, else 0
+    """
+    path = args.baseline or baseline_path(results.suite)
+    if args.save_baseline:
+        save_baseline(results, path)
+        return 0
+    baseline = load_baseline(path)
+    if baseline is None:
+        print(f"\nNo baseline at {path}; record one with --save-baseline")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def add_baseline_arguments(parser):
+    """Add the --save-baseline / --baseline / --tolerance options."""
+    parser.add_argument("--save-baseline", action="store_true", help="Record these results as the new baseline")
+    parser.add_argument("--baseline", help="Baseline file (default: benchmarks/baselines/<suite>.json)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown before a benchmark counts as a regression (default 0.25)")
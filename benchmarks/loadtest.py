@@ -0,0 +1,426 @@
+"""
+End-to-end load test of the council API against a local upstream stand-in.
+
+Starts an OpenAI-compatible stand-in for OpenRouter (answers after a
+configurable delay, no network or API key needed) and a backend pointed at
+it, running in a temporary directory so the real data directory is never
+touched. It then creates conversations and sends messages to the streaming
+and non-streaming endpoints. Arrivals are either open-loop (Poisson at
+--rate per second, at most --concurrency in flight) or closed-loop
+(--concurrency clients sending back to back).
+
+Run from the project root:
+
+    uv run python -m benchmarks.loadtest --requests 200 --concurrency 20
+    uv run python -m benchmarks.loadtest --rate 5 --duration 60 --upstream-latency-ms 800
+    uv run python -m benchmarks.loadtest --url http://localhost:8001   # an already running backend
+
+Latency is measured from each council's scheduled arrival, so time spent
+waiting for a free client slot in open-loop mode counts (no coordinated
+omission).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "Why is the sky blue?",
+    "How do I reverse a linked list in Python?",
+    "What is the best way to learn a new language?",
+    "Explain quantum entanglement to a five year old.",
+    "Should I use tabs or spaces?",
+    "What causes the seasons on Earth?",
+]
+
+# Stream events whose arrival times give the per-stage latencies
+STAGE_EVENTS = ("stage1_complete", "stage2_complete", "stage3_complete", "complete")
+
+_LABEL_RE = re.compile(rb"Response ([A-Z])\b")
+
+
+class UpstreamStandIn:
+    """
+    A minimal OpenAI-compatible chat-completions server.
+
+    Replies after latency_ms (uniformly jittered by +/- jitter), with a
+    ranking for ranking prompts and response_chars of filler otherwise;
+    error_rate of the requests get a 500 instead.
+    """
+
+    def __init__(self, latency_ms: float, jitter: float, response_chars: int, error_rate: float, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.response_chars = response_chars
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value.strip())
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._answer(body)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode("ascii") + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, body: bytes):
+        self.requests += 1
+        delay = self.latency_ms * (1 + self.rng.uniform(-self.jitter, self.jitter)) / 1000
+        await asyncio.sleep(max(0.0, delay))
+        if self.rng.random() < self.error_rate:
+            return 500, {"error": {"message": "stand-in failure"}}
+
+        if b"FINAL RANKING" in body or b"response_format" in body:
+            labels = sorted(set(_LABEL_RE.findall(body)))
+            self.rng.shuffle(labels)
+            ranking = "\n".join(f"{i}. Response {label.decode()}" for i, label in enumerate(labels, start=1))
+            content = f"Each response has merit.\n\nFINAL RANKING:\n{ranking}"
+        elif b"very short title" in body:
+            content = "Load Test Conversation"
+        else:
+            sentence = "The council considers the question carefully and offers an answer. "
+            content = (sentence * (self.response_chars // len(sentence) + 1))[:self.response_chars]
+        return 200, {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def start_backend(port: int, upstream_port: int, workdir: str, log) -> subprocess.Popen:
+    """Run the backend in workdir (its data paths are relative) against the stand-in, logging to log."""
+    env = {
+        **os.environ,
+        "PYTHONPATH": PROJECT_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "OPENROUTER_API_URL": f"http://127.0.0.1:{upstream_port}/v1/chat/completions",
+        "OPENROUTER_API_KEY": "loadtest",
+        "OPENROUTER_API_KEYS": "",
+        "PROVIDERS": "{}",
+        "TRACE_EXPORTER": "none",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, base_url: str, process: Optional[subprocess.Popen],
+                           timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Backend exited with status {process.returncode}")
+        try:
+            if (await client.get(f"{base_url}/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Backend at {base_url} did not become ready within {timeout:.0f}s")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Recorder:
+    """Samples and outcome counts of one load test."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.outcomes: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def add(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def count(self, outcome: str):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+async def run_council(client: httpx.AsyncClient, base_url: str, streaming: bool, mode: Optional[str],
+                      scheduled: float, recorder: Recorder):
+    """Create a conversation and send one message, recording latencies and the outcome."""
+    kind = "stream" if streaming else "message"
+    try:
+        started = time.perf_counter()
+        response = await client.post(f"{base_url}/api/conversations", json={})
+        recorder.add("create_conversation", time.perf_counter() - started)
+        if response.status_code != 200:
+            recorder.count(f"error:create:{response.status_code}")
+            return
+        conversation_id = response.json()["id"]
+
+        body: Dict[str, Any] = {"content": random.choice(QUESTIONS)}
+        if mode:
+            body["mode"] = mode
+        if not streaming:
+            response = await client.post(f"{base_url}/api/conversations/{conversation_id}/message", json=body)
+            if response.status_code == 429:
+                recorder.count(f"rejected:{kind}")
+                return
+            if response.status_code != 200:
+                recorder.count(f"error:{kind}:{response.status_code}")
+                return
+            recorder.add("message_total", time.perf_counter() - scheduled)
+            recorder.count(f"ok:{kind}")
+            return
+
+        url = f"{base_url}/api/conversations/{conversation_id}/message/stream"
+        async with client.stream("POST", url, json=body) as response:
+            if response.status_code == 429:
+                recorder.count(f"rejected:{kind}")
+                return
+            if response.status_code != 200:
+                recorder.count(f"error:{kind}:{response.status_code}")
+                return
+            await _consume_stream(response, scheduled, recorder)
+    except (httpx.HTTPError, ValueError) as e:
+        recorder.count(f"error:{kind}:{type(e).__name__}")
+
+
+async def _consume_stream(response: httpx.Response, scheduled: float, recorder: Recorder):
+    first_event = None
+    previous = None  # start of the current stage, once the council has a slot
+    async for line in response.aiter_lines():
+        if not line.startswith("data: "):
+            continue
+        now = time.perf_counter()
+        event = json.loads(line[6:])
+        kind = event.get("type")
+        if first_event is None:
+            first_event = now
+            recorder.add("first_event", now - scheduled)
+        if kind != "queued" and previous is None:
+            previous = now
+            recorder.add("queue_wait", now - scheduled)
+        if kind in STAGE_EVENTS:
+            recorder.add(kind, now - previous)
+            previous = now
+        if kind == "complete":
+            recorder.add("stream_total", now - scheduled)
+            recorder.count("ok:stream")
+            return
+        if kind in ("error", "cancelled"):
+            recorder.count(f"error:stream:{kind}")
+            return
+    recorder.count("error:stream:truncated")
+
+
+async def generate_load(args, base_url: str, recorder: Recorder):
+    """Send args.requests councils (or as many as fit in args.duration)."""
+    limits = httpx.Limits(max_connections=args.concurrency * 2 + 10, max_keepalive_connections=args.concurrency * 2)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        deadline = time.perf_counter() + args.duration if args.duration else None
+        slots = asyncio.Semaphore(args.concurrency)
+        rng = random.Random(args.seed)
+        tasks = []
+
+        async def one(scheduled: float, holding_slot: bool):
+            if not holding_slot:
+                await slots.acquire()
+            try:
+                await run_council(client, base_url, rng.random() < args.stream_ratio, args.mode, scheduled, recorder)
+            finally:
+                slots.release()
+
+        recorder.started = time.perf_counter()
+        next_arrival = recorder.started
+        sent = 0
+        while (args.duration or sent < args.requests) and (deadline is None or time.perf_counter() < deadline):
+            if args.rate:
+                # Open loop: Poisson arrivals, whatever the backend's speed
+                next_arrival += rng.expovariate(args.rate)
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(one(next_arrival, False)))
+            else:
+                # Closed loop: start the next council as soon as a slot frees up
+                await slots.acquire()
+                tasks.append(asyncio.create_task(one(time.perf_counter(), True)))
+            sent += 1
+        await asyncio.gather(*tasks)
+        recorder.finished = time.perf_counter()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def build_report(recorder: Recorder, args, upstream_requests: Optional[int]) -> Dict[str, Any]:
+    elapsed = recorder.finished - recorder.started
+    completed = sum(n for outcome, n in recorder.outcomes.items() if outcome.startswith("ok:"))
+    attempted = sum(recorder.outcomes.values())
+    latencies = {}
+    for name, values in recorder.samples.items():
+        values = sorted(values)
+        latencies[name] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 1),
+            **{f"p{q}_ms": round(percentile(values, q) * 1000, 1) for q in (50, 90, 99)},
+            "max_ms": round(values[-1] * 1000, 1),
+        }
+    return {
+        "config": {
+            "requests": args.requests, "duration": args.duration, "rate": args.rate,
+            "concurrency": args.concurrency, "stream_ratio": args.stream_ratio, "mode": args.mode,
+            "upstream_latency_ms": args.upstream_latency_ms,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "attempted": attempted,
+        "completed": completed,
+        "throughput_per_s": round(completed / elapsed, 2) if elapsed else None,
+        "error_rate": round((attempted - completed) / attempted, 4) if attempted else None,
+        "outcomes": dict(sorted(recorder.outcomes.items())),
+        "latency": latencies,
+        "upstream_requests": upstream_requests,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{report['completed']}/{report['attempted']} councils completed in {report['elapsed_s']} s "
+          f"({report['throughput_per_s']}/s), error rate {report['error_rate']:.2%}")
+    if report["upstream_requests"] is not None:
+        print(f"Upstream stand-in served {report['upstream_requests']} requests")
+    print("\nOutcomes:")
+    for outcome, count in report["outcomes"].items():
+        print(f"  {outcome:<40} {count:>8}")
+    order = ["create_conversation", "first_event", "queue_wait", *STAGE_EVENTS, "stream_total", "message_total"]
+    print(f"\n  {'latency':<22} {'count':>7} {'mean':>10} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}")
+    for name in order:
+        stats = report["latency"].get(name)
+        if stats:
+            print(f"  {name:<22} {stats['count']:>7} " + " ".join(
+                f"{stats[key]:>8.1f}ms" for key in ("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")))
+
+
+async def main_async(args) -> Dict[str, Any]:
+    upstream = None
+    process = None
+    workdir = None
+    log = None
+    base_url = args.url
+    try:
+        if base_url is None:
+            upstream = UpstreamStandIn(args.upstream_latency_ms, args.upstream_jitter,
+                                       args.response_chars, args.upstream_error_rate, args.seed)
+            upstream_port = await upstream.start()
+            workdir = tempfile.TemporaryDirectory(prefix="council-loadtest-")
+            port = free_port()
+            log = open(os.path.join(workdir.name, "backend.log"), "wb")
+            process = start_backend(port, upstream_port, workdir.name, log)
+            base_url = f"http://127.0.0.1:{port}"
+            print(f"Upstream stand-in on port {upstream_port}, backend on port {port} (data in {workdir.name})")
+
+        async with httpx.AsyncClient() as client:
+            try:
+                await wait_until_ready(client, base_url, process)
+            except RuntimeError:
+                if workdir is not None:
+                    with open(os.path.join(workdir.name, "backend.log"), "r", errors="replace") as f:
+                        print(f.read()[-4000:], file=sys.stderr)
+                raise
+
+        recorder = Recorder()
+        await generate_load(args, base_url, recorder)
+        return build_report(recorder, args, upstream.requests if upstream else None)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if log is not None:
+            log.close()
+        if upstream is not None:
+            await upstream.stop()
+        if workdir is not None:
+            workdir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end council API load test")
+    parser.add_argument("--requests", type=int, default=100, help="Councils to send (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Send for this many seconds instead")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Open-loop arrivals per second (default: closed loop)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Councils in flight at most")
+    parser.add_argument("--stream-ratio", type=float, default=0.8,
+                        help="Fraction of councils sent to the streaming endpoint")
+    parser.add_argument("--mode", help="Council mode for every message (default: the backend's)")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request client timeout in seconds")
+    parser.add_argument("--url", help="Test an already running backend instead of starting one")
+    parser.add_argument("--upstream-latency-ms", type=float, default=200, help="Stand-in reply delay")
+    parser.add_argument("--upstream-jitter", type=float, default=0.5, help="Relative jitter of the delay")
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0, help="Fraction of stand-in 500s")
+    parser.add_argument("--response-chars", type=int, default=2000, help="Size of stand-in answers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+    if not 0 <= args.stream_ratio <= 1:
+        parser.error("--stream-ratio must be between 0 and 1")
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,49 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import Sidebar from './components/Sidebar';
 import ChatInterface from './components/ChatInterface';
 import { api } from './api';
 import './App.css';
 
+const byNewest = (a, b) => (a.created_at < b.created_at ? 1 : a.created_at > b.created_at ? -1 : 0);
+
+// Apply a list delta ({ reset, changed, deleted }) to the sidebar list
+function mergeConversationList(conversations, delta) {
+  if (delta.reset) {
+    return delta.changed;
+  }
+  const changedIds = new Set(delta.changed.map((conv) => conv.id));
+  const deletedIds = new Set(delta.deleted);
+  return conversations
+    .filter((conv) => !changedIds.has(conv.id) && !deletedIds.has(conv.id))
+    .concat(delta.changed)
+    .sort(byNewest);
+}
+
+// Apply a conversation delta to the copy fetched earlier
+function applyConversationDelta(conv, delta) {
+  const messages = delta.full ? [] : conv.messages.slice(0, delta.message_count);
+  for (const { index, message } of delta.messages) {
+    messages[index] = message;
+  }
+  return {
+    ...(delta.full ? {} : conv),
+    id: delta.id,
+    ...(delta.created_at !== undefined && { created_at: delta.created_at }),
+    ...(delta.title !== undefined && { title: delta.title }),
+    version: delta.version,
+    updated_at: delta.updated_at,
+    messages,
+  };
+}
+
 function App() {
   const [conversations, setConversations] = useState([]);
   const [currentConversationId, setCurrentConversationId] = useState(null);
   const [currentConversation, setCurrentConversation] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
+  // Sync state: cursor of the last list delta, conversations fetched so far
+  const listCursor = useRef(null);
+  const conversationCache = useRef(new Map());
 
   // Load conversations on mount
   useEffect(() => {
@@ -24,8 +59,10 @@ function App() {
 
   const loadConversations = async () => {
     try {
-      const convs = await api.listConversations();
-      setConversations(convs);
+      const delta = await api.listConversationChanges(listCursor.current);
+      listCursor.current = delta.cursor;
+      delta.deleted.forEach((id) => conversationCache.current.delete(id));
+      setConversations((prev) => mergeConversationList(prev, delta));
     } catch (error) {
       console.error('Failed to load conversations:', error);
     }
@@ -33,7 +70,12 @@ function App() {
 
   const loadConversation = async (id) => {
     try {
-      const conv = await api.getConversation(id);
+      // Fetch only what changed since the copy we already have
+      const cached = conversationCache.current.get(id);
+      const conv = cached
+        ? applyConversationDelta(cached, await api.getConversationDelta(id, cached.version))
+        : await api.getConversation(id);
+      conversationCache.current.set(id, conv);
       setCurrentConversation(conv);
     } catch (error) {
       console.error('Failed to load conversation:', error);
@@ -64,6 +106,7 @@ function App() {
     }
     try {
       await api.deleteConversation(id);
+      conversationCache.current.delete(id);
       setConversations(conversations.filter((conv) => conv.id !== id));
       if (currentConversationId === id) {
         setCurrentConversationId(null);
@@ -81,6 +124,7 @@ function App() {
     }
     try {
       await api.deleteAllConversations();
+      conversationCache.current.clear();
       setConversations([]);
       setCurrentConversationId(null);
       setCurrentConversation(null);
@@ -130,10 +174,20 @@ function App() {
       // Send message with streaming
       await api.sendMessageStream(currentConversationId, content, (eventType, event) => {
         switch (eventType) {
+          case 'queued':
+            setCurrentConversation((prev) => {
+              const messages = [...prev.messages];
+              const lastMsg = messages[messages.length - 1];
+              lastMsg.queuePosition = event.position;
+              return { ...prev, messages };
+            });
+            break;
+
           case 'stage1_start':
             setCurrentConversation((prev) => {
               const messages = [...prev.messages];
               const lastMsg = messages[messages.length - 1];
+              lastMsg.queuePosition = null;
               lastMsg.loading.stage1 = true;
               lastMsg.progress.stage1 = { completed: 0, total: 0 };
               return { ...prev, messages };
@@ -16,6 +16,19 @@ export const api = {
     return response.json();
   },
 
+  /**
+   * Changes to the conversation list since a cursor from the previous call
+   * (omit it for the full list): { cursor, reset, changed, deleted }.
+   */
+  async listConversationChanges(cursor = null) {
+    const query = cursor === null ? '' : `?since=${cursor}`;
+    const response = await fetch(`${API_BASE}/api/conversations/delta${query}`);
+    if (!response.ok) {
+      throw new Error('Failed to list conversation changes');
+    }
+    return response.json();
+  },
+
   /**
    * Create a new conversation.
    */
@@ -46,6 +59,37 @@ export const api = {
     return response.json();
   },
 
+  /**
+   * Messages and title of a conversation changed after a version:
+   * { version, full, message_count, messages: [{ index, message }], title? }.
+   */
+  async getConversationDelta(conversationId, since) {
+    const response = await fetch(
+      `${API_BASE}/api/conversations/${conversationId}/delta?since=${since}`
+    );
+    if (!response.ok) {
+      throw new Error('Failed to get conversation changes');
+    }
+    return response.json();
+  },
+
+  /**
+   * Full-text search over past questions and answers.
+   * Append '*' to a word for prefix matching.
+   */
+  async searchConversations(query, { limit = 20, includeStage1 = false } = {}) {
+    const params = new URLSearchParams({
+      q: query,
+      limit: String(limit),
+      include_stage1: String(includeStage1),
+    });
+    const response = await fetch(`${API_BASE}/api/search?${params}`);
+    if (!response.ok) {
+      throw new Error('Failed to search conversations');
+    }
+    return response.json();
+  },
+
   /**
    * Send a message in a conversation.
    */
@@ -73,6 +73,14 @@ export default function ChatInterface({
                 <div className="assistant-message">
                   <div className="message-label">Council of Sheldons</div>
 
+                  {/* Waiting for a free council slot */}
+                  {msg.queuePosition > 0 && (
+                    <div className="stage-loading">
+                      <div className="spinner"></div>
+                      <span>Waiting for the council to convene (position {msg.queuePosition} in queue)...</span>
+                    </div>
+                  )}
+
                   {/* Stage 1 */}
                   {msg.loading?.stage1 && (
                     <div>
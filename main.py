@@ -1,51 +1,229 @@
-"""Start both backend and frontend servers."""
+"""Start both backend and frontend servers and keep them running."""
 
-import subprocess
-import sys
-import signal
+import argparse
+import asyncio
+import collections
 import os
-import time
 import shutil
+import signal
 import socket
-import argparse
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
 from pathlib import Path
+from typing import Deque, List, Optional, TextIO, Union
 
-# Global process references for cleanup
-backend_process = None
-frontend_process = None
+ROOT = Path(__file__).parent
+BACKEND_PORT = 8001
+FRONTEND_PORT = 5173
+BACKEND_HEALTH_URL = f"http://127.0.0.1:{BACKEND_PORT}/"
+FRONTEND_HEALTH_URL = f"http://localhost:{FRONTEND_PORT}/"
 
+# How long a server may take to answer its health check after starting
+READY_TIMEOUT_SECONDS = 60.0
+READY_POLL_SECONDS = 0.25
+# Delay before restarting a crashed server, doubling on each crash up to the max
+RESTART_BACKOFF_SECONDS = 1.0
+RESTART_BACKOFF_MAX_SECONDS = 30.0
+# A server that stayed up this long is stable again: its backoff starts over
+STABLE_AFTER_SECONDS = 60.0
+# Last output lines kept per server, shown when it crashes
+TAIL_LINES = 40
+# Time a server gets to exit after being asked to stop, before it is killed
+STOP_TIMEOUT_SECONDS = 5.0
 
-def cleanup_processes():
-    """Terminate both backend and frontend processes."""
-    global backend_process, frontend_process
-    
-    print("\nShutting down servers...")
-    
-    if backend_process:
-        try:
-            backend_process.terminate()
-            backend_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            backend_process.kill()
-        except Exception as e:
-            print(f"Error stopping backend: {e}")
-    
-    if frontend_process:
+# Proxy settings in the environment must not apply to health checks on localhost
+_health_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def probe(url: str) -> bool:
+    """Whether a server answers a GET on url (any status below 500)."""
+    try:
+        with _health_opener.open(url, timeout=1) as response:
+            return response.status < 500
+    except urllib.error.HTTPError as e:
+        return e.code < 500
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+class ManagedProcess:
+    """
+    One server process, with its output drained and crashes restarted.
+
+    Output is read continuously, so a server that logs heavily never blocks
+    on a full pipe. Lines go to the console (prefixed with the server name)
+    or, when log_path is set, to that file; the last TAIL_LINES are kept to
+    show when the server crashes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cmd: Union[List[str], str],
+        cwd: Path,
+        env: dict,
+        health_url: str,
+        stopping: asyncio.Event,
+        log_path: Optional[Path] = None,
+        max_restarts: int = 0,
+    ):
+        self.name = name
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env
+        self.health_url = health_url
+        self.stopping = stopping
+        self.log_path = log_path
+        self.max_restarts = max_restarts
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.tail: Deque[str] = collections.deque(maxlen=TAIL_LINES)
+        self._log: Optional[TextIO] = None
+        self._drain_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the process and begin draining its output."""
+        if self.log_path is not None and self._log is None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._log = open(self.log_path, "a", encoding="utf-8")
+        options = dict(cwd=self.cwd, env=self.env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if sys.platform != "win32":
+            # Own process group, so stopping also reaches its children
+            # (uvicorn workers, the node process behind npm)
+            options["start_new_session"] = True
+        if isinstance(self.cmd, str):
+            self.process = await asyncio.create_subprocess_shell(self.cmd, **options)
+        else:
+            self.process = await asyncio.create_subprocess_exec(*self.cmd, **options)
+        self.started_at = time.monotonic()
+        self._drain_task = asyncio.create_task(self._drain(self.process.stdout))
+
+    async def _drain(self, stream: asyncio.StreamReader):
+        # Read in chunks rather than lines, so one huge line can't overrun the reader
+        buffer = b""
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                self._emit(line)
+        if buffer:
+            self._emit(buffer)
+
+    def _emit(self, line: bytes):
+        text = line.decode("utf-8", errors="replace").rstrip()
+        self.tail.append(text)
+        if self._log is not None:
+            self._log.write(text + "\n")
+            self._log.flush()
+        else:
+            print(f"[{self.name}] {text}", flush=True)
+
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def wait_ready(self, timeout: float = READY_TIMEOUT_SECONDS) -> bool:
+        """
+        Poll the health URL until the server answers.
+
+        Returns:
+            True once it answers; False if it exits, the timeout passes or
+            the launcher is stopping
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self.stopping.is_set():
+            if not self.running():
+                return False
+            if await asyncio.to_thread(probe, self.health_url):
+                return True
+            await asyncio.sleep(READY_POLL_SECONDS)
+        return False
+
+    def _signal(self, force: bool):
+        if sys.platform == "win32":
+            # Take down the whole tree (npm runs through cmd.exe)
+            subprocess.run(
+                ["taskkill", "/T"] + (["/F"] if force else []) + ["/PID", str(self.process.pid)],
+                capture_output=True
+            )
+            return
         try:
-            frontend_process.terminate()
-            frontend_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            frontend_process.kill()
-        except Exception as e:
-            print(f"Error stopping frontend: {e}")
-    
-    print("✓ Servers stopped")
-    sys.exit(0)
+            os.killpg(self.process.pid, signal.SIGKILL if force else signal.SIGTERM)
+        except ProcessLookupError:
+            pass
 
+    async def stop(self):
+        """Ask the process to exit, kill it after STOP_TIMEOUT_SECONDS, and close its log."""
+        if self.running():
+            self._signal(force=False)
+            try:
+                await asyncio.wait_for(self.process.wait(), STOP_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                print(f"  {self.name} did not stop in time, killing it")
+                self._signal(force=True)
+                await self.process.wait()
+        if self._drain_task is not None:
+            await self._drain_task
+        if self._log is not None:
+            self._log.close()
+            self._log = None
 
-def signal_handler(sig, frame):
-    """Handle Ctrl+C gracefully."""
-    cleanup_processes()
+    async def supervise(self) -> bool:
+        """
+        Restart the process whenever it exits, until the launcher stops.
+
+        Restarts wait RESTART_BACKOFF_SECONDS, doubling after each crash up
+        to RESTART_BACKOFF_MAX_SECONDS; a run of STABLE_AFTER_SECONDS resets
+        the backoff. A restarted server that doesn't become healthy counts
+        as another crash.
+
+        Returns:
+            False if the process crashed more than max_restarts times in a
+            row (0 = no limit), True when the launcher stopped
+        """
+        backoff = RESTART_BACKOFF_SECONDS
+        crashes = 0
+        while True:
+            code = await self.process.wait()
+            await self._drain_task
+            if self.stopping.is_set():
+                return True
+
+            uptime = time.monotonic() - self.started_at
+            print(f"✗ {self.name.capitalize()} exited with code {code} after {uptime:.0f}s")
+            if self._log is not None and self.tail:
+                print(f"  Last output (full log in {self.log_path}):")
+                for line in self.tail:
+                    print(f"    {line}")
+            if uptime >= STABLE_AFTER_SECONDS:
+                backoff = RESTART_BACKOFF_SECONDS
+                crashes = 0
+            crashes += 1
+            if self.max_restarts and crashes > self.max_restarts:
+                print(f"✗ {self.name.capitalize()} crashed {crashes} times in a row, giving up")
+                return False
+
+            print(f"  Restarting {self.name} in {backoff:.0f}s...")
+            try:
+                await asyncio.wait_for(self.stopping.wait(), backoff)
+                return True
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX_SECONDS)
+            self.restarts += 1
+            self.tail.clear()
+            await self.start()
+            if await self.wait_ready():
+                print(f"✓ {self.name.capitalize()} is back up (restart #{self.restarts})")
+            elif self.running() and not self.stopping.is_set():
+                print(f"✗ {self.name.capitalize()} did not become healthy, stopping it")
+                self._signal(force=True)
 
 
 def is_port_in_use(port: int) -> bool:
@@ -127,173 +305,180 @@ def kill_process_on_port(port: int) -> bool:
     return False
 
 
-def main():
-    """Start both backend and frontend servers."""
-    global backend_process, frontend_process
-    
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(description="Start LLM Council servers")
-    parser.add_argument(
-        "--debug",
-        action="store_true",
-        help="Enable debug mode (verbose logging, auto-reload, source maps)"
-    )
-    args = parser.parse_args()
-    
+async def run(args: argparse.Namespace) -> int:
+    """Start the servers, wait until both are healthy, then supervise them."""
     debug_mode = args.debug
-    
-    # Register signal handler for graceful shutdown
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
-    print("Starting LLM Council...")
-    if debug_mode:
-        print("🔍 Debug mode enabled")
-    print()
-    
-    # Check if ports are in use and kill processes if needed
-    if is_port_in_use(8001):
-        print(f"Port 8001 is in use. Attempting to kill process...")
-        if kill_process_on_port(8001):
-            time.sleep(1)  # Wait for port to be released
-            if is_port_in_use(8001):
-                print("✗ Port 8001 is still in use after killing process!")
-                sys.exit(1)
-        else:
-            print("✗ Could not kill process on port 8001!")
-            print("  Please stop any existing backend server manually.")
-            sys.exit(1)
-    
-    if is_port_in_use(5173):
-        print(f"Port 5173 is in use. Attempting to kill process...")
-        if kill_process_on_port(5173):
-            time.sleep(1)  # Wait for port to be released
-            if is_port_in_use(5173):
-                print("✗ Port 5173 is still in use after killing process!")
-                sys.exit(1)
-        else:
-            print("✗ Could not kill process on port 5173!")
-            print("  Please stop any existing frontend server manually.")
-            sys.exit(1)
-    
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: no loop signal handlers
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stopping.set))
+
     # Determine which Python to use - prioritize venv if it exists
-    venv_python = Path(__file__).parent / ".venv" / "Scripts" / "python.exe" if sys.platform == "win32" else Path(__file__).parent / ".venv" / "bin" / "python"
-    
+    venv_python = ROOT / ".venv" / "Scripts" / "python.exe" if sys.platform == "win32" else ROOT / ".venv" / "bin" / "python"
     if venv_python.exists():
         python_cmd = str(venv_python)
     elif sys.platform == "win32":
         python_cmd = "python"
     else:
         python_cmd = "python3"
-    
-    # Start backend
-    print("Starting backend on http://localhost:8001...")
-    backend_cmd = [python_cmd, "-m", "backend.main"]
-    
-    # Set DEBUG environment variable if debug mode is enabled
+
     backend_env = os.environ.copy()
+    backend_env["BACKEND_WORKERS"] = str(args.workers)
     if debug_mode:
+        # Set DEBUG environment variable if debug mode is enabled
         backend_env["DEBUG"] = "true"
-    
-    # In debug mode, show output directly; otherwise capture it
-    if debug_mode:
-        backend_process = subprocess.Popen(
-            backend_cmd,
-            env=backend_env,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-    else:
-        backend_process = subprocess.Popen(
-            backend_cmd,
-            env=backend_env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-    
-    # Wait a bit for backend to start
-    time.sleep(2)
-    
-    # Check if backend started successfully
-    if backend_process.poll() is not None:
+        if args.workers > 1:
+            print(f"⚠ Debug mode auto-reloads with a single worker; ignoring --workers {args.workers}")
+
+    # In debug mode, show output in the console; otherwise write it to log files
+    log_dir = None if debug_mode else Path(args.log_dir)
+    backend = ManagedProcess(
+        "backend",
+        [python_cmd, "-m", "backend.main"],
+        cwd=ROOT,
+        env=backend_env,
+        health_url=BACKEND_HEALTH_URL,
+        stopping=stopping,
+        log_path=log_dir / "backend.log" if log_dir else None,
+        max_restarts=args.max_restarts,
+    )
+    servers = [backend]
+
+    async def shutdown(exit_code: int) -> int:
+        print("\nShutting down servers...")
+        stopping.set()
+        await asyncio.gather(*(server.stop() for server in servers))
+        print("✓ Servers stopped")
+        return exit_code
+
+    workers = "" if debug_mode or args.workers == 1 else f" with {args.workers} workers"
+    print(f"Starting backend on http://localhost:{BACKEND_PORT}{workers}...")
+    await backend.start()
+    if not await backend.wait_ready():
+        if stopping.is_set():
+            return await shutdown(0)
         print("✗ Backend failed to start!")
-        print(backend_process.stdout.read() if backend_process.stdout else "No output")
-        sys.exit(1)
-    
+        if log_dir:
+            print("\n".join(backend.tail) or "No output")
+        return await shutdown(1)
+
     # Start frontend
-    print("Starting frontend on http://localhost:5173...")
-    frontend_dir = Path(__file__).parent / "frontend"
-    
+    frontend_dir = ROOT / "frontend"
+
     # Check if node_modules exists
     if not (frontend_dir / "node_modules").exists():
         print("⚠ node_modules not found. Run 'npm install' in frontend/ first.")
-        cleanup_processes()
-        return
-    
-    # On Windows, use shell=True to ensure PATH is respected for npm
-    use_shell = sys.platform == "win32"
-    if use_shell:
-        frontend_cmd = "npm run dev:debug" if debug_mode else "npm run dev"
+        return await shutdown(1)
+
+    # On Windows, run npm through the shell to ensure PATH is respected
+    if sys.platform == "win32":
+        frontend_cmd: Union[List[str], str] = "npm run dev:debug" if debug_mode else "npm run dev"
     else:
         npm_path = shutil.which("npm")
         if not npm_path:
             print("✗ npm not found in PATH!")
-            cleanup_processes()
-            return
+            return await shutdown(1)
         frontend_cmd = [npm_path, "run", "dev:debug" if debug_mode else "dev"]
-    
-    # In debug mode, show output directly; otherwise capture it
-    if debug_mode:
-        frontend_process = subprocess.Popen(
-            frontend_cmd,
-            cwd=frontend_dir,
-            text=True,
-            bufsize=1,
-            universal_newlines=True,
-            shell=use_shell
-        )
-    else:
-        frontend_process = subprocess.Popen(
-            frontend_cmd,
-            cwd=frontend_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True,
-            shell=use_shell
-        )
-    
+
+    print(f"Starting frontend on http://localhost:{FRONTEND_PORT}...")
+    frontend = ManagedProcess(
+        "frontend",
+        frontend_cmd,
+        cwd=frontend_dir,
+        env=os.environ.copy(),
+        health_url=FRONTEND_HEALTH_URL,
+        stopping=stopping,
+        log_path=log_dir / "frontend.log" if log_dir else None,
+        max_restarts=args.max_restarts,
+    )
+    servers.append(frontend)
+    await frontend.start()
+    if not await frontend.wait_ready():
+        if stopping.is_set():
+            return await shutdown(0)
+        print("✗ Frontend failed to start!")
+        if log_dir:
+            print("\n".join(frontend.tail) or "No output")
+        return await shutdown(1)
+
     print()
     print("✓ LLM Council is running!")
-    print("  Backend:  http://localhost:8001")
-    print("  Frontend: http://localhost:5173")
+    print(f"  Backend:  http://localhost:{BACKEND_PORT}")
+    print(f"  Frontend: http://localhost:{FRONTEND_PORT}")
     if debug_mode:
         print("  🔍 Debug mode: Logs visible, auto-reload enabled")
+    else:
+        print(f"  Logs:     {log_dir}/")
     print()
     print("Press Ctrl+C to stop both servers")
     print()
-    
-    # Stream output from both processes
-    try:
-        while True:
-            # Check if processes are still alive
-            if backend_process.poll() is not None:
-                print("✗ Backend process exited!")
-                break
-            if frontend_process.poll() is not None:
-                print("✗ Frontend process exited!")
-                break
-            
-            time.sleep(0.5)
-    except KeyboardInterrupt:
-        pass
-    finally:
-        cleanup_processes()
+
+    # Restart crashed servers until Ctrl+C, or until one keeps crashing
+    supervisors = [asyncio.create_task(server.supervise()) for server in servers]
+    stop_requested = asyncio.create_task(stopping.wait())
+    await asyncio.wait(supervisors + [stop_requested], return_when=asyncio.FIRST_COMPLETED)
+    exit_code = 0 if stopping.is_set() else 1
+    stopping.set()
+    for task in supervisors:
+        task.cancel()
+    await asyncio.gather(*supervisors, return_exceptions=True)
+    return await shutdown(exit_code)
+
+
+def main():
+    """Start both backend and frontend servers."""
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description="Start LLM Council servers")
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (verbose logging, auto-reload, source maps)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("BACKEND_WORKERS", "1")),
+        help="Backend worker processes (default: BACKEND_WORKERS or 1)"
+    )
+    parser.add_argument(
+        "--log-dir",
+        default="logs",
+        help="Directory for server logs outside debug mode (default: logs)"
+    )
+    parser.add_argument(
+        "--max-restarts",
+        type=int,
+        default=5,
+        help="Give up after a server crashes this many times in a row (0 = never, default: 5)"
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    print("Starting LLM Council...")
+    if args.debug:
+        print("🔍 Debug mode enabled")
+    print()
+
+    # Check if ports are in use and kill processes if needed
+    for port, name in ((BACKEND_PORT, "backend"), (FRONTEND_PORT, "frontend")):
+        if is_port_in_use(port):
+            print(f"Port {port} is in use. Attempting to kill process...")
+            if kill_process_on_port(port):
+                time.sleep(1)  # Wait for port to be released
+                if is_port_in_use(port):
+                    print(f"✗ Port {port} is still in use after killing process!")
+                    sys.exit(1)
+            else:
+                print(f"✗ Could not kill process on port {port}!")
+                print(f"  Please stop any existing {name} server manually.")
+                sys.exit(1)
+
+    sys.exit(asyncio.run(run(args)))
 
 
 if __name__ == "__main__":
@@ -10,8 +10,11 @@ echo "Starting backend on http://localhost:8001..."
 uv run python -m backend.main &
 BACKEND_PID=$!
 
-# Wait a bit for backend to start
-sleep 2
+# Wait until the backend answers its health check
+for _ in $(seq 1 120); do
+    curl -sf http://localhost:8001/ > /dev/null && break
+    sleep 0.5
+done
 
 # Start frontend
 echo "Starting frontend on http://localhost:5173..."
@@ -0,0 +1,28 @@
+"""Shared test setup.
+
+Every test runs in its own scratch directory, so the relative data paths in
+backend.config (data/conversations, data/search.db, data/locks, ...) point there.
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
+
+
+@pytest.fixture(autouse=True)
+def scratch_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _reopen_lock_files()
+    return tmp_path
+
+
+def _reopen_lock_files():
+    """Lock files stay open once used; have them reopened under the new directory."""
+    from backend import locking
+
+    for lock_file in (locking._conversation_locks, locking._named_locks):
+        if lock_file._fd is not None and not lock_file._depth:
+            os.close(lock_file._fd)
+            lock_file._fd = None
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from backend.admission import AdmissionController, AdmissionRejected
+from backend.locking import SharedSlots
+
+
+def test_admits_up_to_the_limit_then_queues():
+    controller = AdmissionController(max_concurrent=2, max_queue=5)
+    first, second, third = (controller.enqueue("a") for _ in range(3))
+    assert first.admitted and second.admitted
+    assert not third.admitted
+    assert controller.position(third) == 1
+
+    controller.release(first)
+    assert third.admitted
+    assert controller.stats() == {"active": 2, "queued": 0, "max_concurrent": 2, "max_queue": 5}
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    controller = AdmissionController(max_concurrent=1, max_queue=1)
+    controller.enqueue("a")
+    controller.enqueue("a")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.enqueue("b")
+    assert rejected.value.retry_after >= 1
+
+
+def test_fair_queue_alternates_between_clients():
+    controller = AdmissionController(max_concurrent=1, max_queue=10, fair=True)
+    running = controller.enqueue("burst")
+    burst = [controller.enqueue("burst") for _ in range(3)]
+    other = controller.enqueue("other")
+    assert controller.position(other) == 2
+
+    controller.release(running)
+    assert burst[0].admitted
+    controller.release(burst[0])
+    assert other.admitted
+
+
+def test_fifo_without_fairness():
+    controller = AdmissionController(max_concurrent=1, max_queue=10, fair=False)
+    running = controller.enqueue("burst")
+    burst = [controller.enqueue("burst") for _ in range(2)]
+    other = controller.enqueue("other")
+    assert controller.position(other) == 3
+    controller.release(running)
+    controller.release(burst[0])
+    assert burst[1].admitted and not other.admitted
+
+
+def test_leaving_the_queue_and_double_release():
+    controller = AdmissionController(max_concurrent=1, max_queue=10)
+    running = controller.enqueue("a")
+    waiting = controller.enqueue("b")
+    controller.release(waiting)
+    assert controller.queued == 0
+    controller.release(running)
+    controller.release(running)
+    assert controller.active == 0
+
+
+def test_waiters_wake_when_admitted():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=10)
+        running = controller.enqueue("a")
+        waiting = controller.enqueue("b")
+        waiter = asyncio.create_task(controller.wait(waiting))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        controller.release(running)
+        await asyncio.wait_for(waiter, 1)
+        assert waiting.admitted
+
+    asyncio.run(scenario())
+
+
+def test_shared_slots_limit_across_controllers():
+    async def scenario():
+        slots = SharedSlots("test-slots.lock", 1)
+        # Two workers' controllers sharing one slot
+        first = AdmissionController(max_concurrent=1, max_queue=10, shared=slots)
+        second = AdmissionController(max_concurrent=1, max_queue=10, shared=slots)
+        running = first.enqueue("a")
+        waiting = second.enqueue("b")
+        assert running.admitted and not waiting.admitted
+        first.release(running)
+        await asyncio.wait_for(second.wait(waiting), 2)
+        assert waiting.admitted
+
+    asyncio.run(scenario())
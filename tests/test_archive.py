@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+
+from backend import archive, storage
+
+
+def make(conversation_id, text="hello", size=1):
+    return {
+        "id": conversation_id,
+        "created_at": "2026-01-01T00:00:00",
+        "title": conversation_id,
+        "messages": [{"role": "user", "content": text * size}],
+    }
+
+
+def segment_files():
+    return sorted(name for name in os.listdir(archive.ARCHIVE_DIR) if name.endswith(archive.SEGMENT_SUFFIX))
+
+
+def test_append_read_and_list():
+    assert archive.append([make("a"), make("b", "bye")]) == 2
+    assert archive.read("b")["messages"][0]["content"] == "bye"
+    assert archive.read("missing") is None
+    assert sorted(c["id"] for c in archive.list_metadata()) == ["a", "b"]
+    assert len(segment_files()) == 1
+
+
+def test_segment_writes_do_not_hold_the_process_lock(monkeypatch):
+    write_segments = archive._write_segments
+
+    def checked(*args, **kwargs):
+        # Readers and saves in this process must not wait for segment I/O
+        assert archive._lock.acquire(blocking=False)
+        archive._lock.release()
+        return write_segments(*args, **kwargs)
+
+    monkeypatch.setattr(archive, "_write_segments", checked)
+    archive.append([make("a")])
+    assert archive.contains("a")
+
+
+def test_reclaim_rewrites_mostly_dead_segments():
+    archive.append([make(f"c{i}", size=200) for i in range(10)])
+    [first] = segment_files()
+    for i in range(8):
+        archive.forget(f"c{i}")
+
+    freed = archive.reclaim(0.5)
+    assert freed > 0
+    assert first not in segment_files()
+    assert archive.read("c8")["id"] == "c8"
+    assert archive.read("c9")["id"] == "c9"
+    assert archive.read("c0") is None
+    # Nothing left to reclaim
+    assert archive.reclaim(0.5) == 0
+
+
+def test_mappings_are_dropped_when_another_worker_recreates_segments(scratch_dir):
+    archive.append([make("old", "x", size=500)])
+    assert archive.read("old")["messages"][0]["content"] == "x" * 500
+
+    # Another worker clears the archive and packs a different conversation
+    # into a segment with the same name
+    script = (
+        "from backend import archive\n"
+        "archive.clear()\n"
+        "archive.append([{'id': 'new', 'created_at': '2026-01-01T00:00:00', "
+        "'messages': [{'role': 'user', 'content': 'y' * 400}]}])\n"
+    )
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+    subprocess.run([sys.executable, "-c", script], cwd=scratch_dir, env=env, check=True)
+
+    assert archive.read("old") is None
+    assert archive.read("new")["messages"][0]["content"] == "y" * 400
+
+
+def test_conversation_archived_between_lookup_and_open_is_read_from_the_archive(monkeypatch):
+    storage.create_conversation("c1")
+    storage.add_user_message("c1", "hello")
+    find_conversation_file = storage.find_conversation_file
+
+    def archived_after_lookup(conversation_id):
+        found = find_conversation_file(conversation_id)
+        if found is not None:
+            assert storage.archive_cold_conversations(older_than_days=-1) == 1
+        return found
+
+    monkeypatch.setattr(storage, "find_conversation_file", archived_after_lookup)
+    conversation = storage.get_conversation("c1")
+    assert [m["content"] for m in conversation["messages"]] == ["hello"]
+    assert storage.find_conversation_file("c1") is None
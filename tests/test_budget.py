@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from backend import budget
+from backend.budget import condense, estimate_tokens, fit_messages, fit_texts, strip_thinking
+
+WORDS = ["council", "ranking", "réponse", "λ", "漢字", "x" * 30, "\n"]
+
+
+def prose(words, seed=0):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+@pytest.fixture(autouse=True)
+def stripping_on(monkeypatch):
+    monkeypatch.setattr(budget, "STRIP_THINKING", True)
+
+
+def test_think_blocks_are_removed():
+    assert strip_thinking("<think>let me see</think>\nThe answer is 4.") == "The answer is 4."
+    assert strip_thinking("A <thinking>hmm</thinking>B <reasoning>x</reasoning>C") == "A B C"
+    # Cut off mid-thought, or opened by the chat template
+    assert strip_thinking("The answer.<think>unfinished") == "The answer."
+    assert strip_thinking("reasoning the template opened</think> The answer.") == "The answer."
+    # Nothing but reasoning: that is all the model said
+    assert strip_thinking("<think>only this</think>") == "<think>only this</think>"
+
+
+def test_thinking_is_kept_when_stripping_is_off(monkeypatch):
+    monkeypatch.setattr(budget, "STRIP_THINKING", False)
+    assert strip_thinking("<think>x</think>answer") == "<think>x</think>answer"
+
+
+def test_short_texts_come_back_unchanged():
+    text = "A short answer."
+    assert condense(text, 100) is text
+    texts = ["one", "two"]
+    assert fit_texts(texts, 100, [0, 0]) == texts
+    messages = [{"role": "user", "content": "hello"}]
+    assert fit_messages(messages, 100) is messages
+
+
+def test_condensed_text_keeps_both_ends_within_the_budget():
+    text = "BEGIN " + prose(3000) + " END"
+    condensed = condense(text, 300)
+    assert estimate_tokens(condensed) <= 300
+    assert condensed.startswith("BEGIN") and condensed.endswith("END")
+    assert "tokens omitted" in condensed
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_condense_never_exceeds_the_budget(seed):
+    rng = random.Random(seed)
+    text = prose(rng.randint(50, 3000), seed)
+    max_tokens = rng.randint(1, 600)
+    assert estimate_tokens(condense(text, max_tokens)) <= max_tokens
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fitted_texts_stay_within_total_and_caps(seed):
+    rng = random.Random(seed)
+    texts = [prose(rng.randint(0, 1500), seed * 10 + i) for i in range(rng.randint(1, 6))]
+    caps = [rng.choice([0, 50, 400]) for _ in texts]
+    total = rng.randint(0, 2000)
+    fitted = fit_texts(texts, total, caps)
+    assert sum(estimate_tokens(text) for text in fitted) <= total
+    for text, cap in zip(fitted, caps):
+        assert cap == 0 or estimate_tokens(text) <= cap
+
+
+def test_short_texts_keep_their_length_when_sharing_a_total():
+    short, long = "brief answer", prose(2000)
+    fitted = fit_texts([short, long], 500, [0, 0])
+    assert fitted[0] == short
+    assert estimate_tokens(fitted[1]) <= 500 - estimate_tokens(short)
+
+
+def test_fit_messages_condenses_the_longest_message():
+    system = {"role": "system", "content": "Be brief."}
+    user = {"role": "user", "content": prose(4000)}
+    fitted = fit_messages([system, user], 800)
+    assert fitted[0] is system
+    assert budget.estimate_messages(fitted) <= 800
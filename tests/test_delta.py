@@ -0,0 +1,116 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main, storage
+
+
+def age(conversation_id, seconds):
+    """Pretend a conversation file was last written `seconds` ago."""
+    path, _ = storage.find_conversation_file(conversation_id)
+    written = time.time() - seconds
+    os.utime(path, (written, written))
+
+
+def ids(conversations):
+    return sorted(c["id"] for c in conversations)
+
+
+def test_conversation_delta_sends_what_changed_since_a_version():
+    storage.create_conversation("c1")
+    storage.add_user_message("c1", "first")
+    seen = storage.get_conversation("c1")["version"]
+    storage.add_user_message("c1", "second")
+    storage.update_conversation_title("c1", "Renamed")
+
+    delta = storage.conversation_delta(storage.get_conversation("c1"), seen)
+    assert not delta["full"]
+    assert [(m["index"], m["message"]["content"]) for m in delta["messages"]] == [(1, "second")]
+    assert delta["title"] == "Renamed" and delta["message_count"] == 2
+
+    current = storage.get_conversation("c1")
+    assert storage.conversation_delta(current, current["version"])["messages"] == []
+    assert "title" not in storage.conversation_delta(current, current["version"])
+    # Unknown versions get everything
+    assert storage.conversation_delta(current, 0)["full"]
+    assert storage.conversation_delta(current, current["version"] + 5)["full"]
+
+
+def test_list_delta_without_a_cursor_is_a_reset():
+    storage.create_conversation("a")
+    changes = storage.list_conversation_changes(None)
+    assert changes["reset"] and ids(changes["changed"]) == ["a"]
+
+
+def test_list_delta_sends_saves_and_deletions_since_the_cursor():
+    for conversation_id in ("a", "b", "c"):
+        storage.create_conversation(conversation_id)
+        age(conversation_id, 60)
+    cursor = storage.list_conversation_changes(None)["cursor"]
+
+    storage.add_user_message("b", "hello")
+    storage.delete_conversation("c")
+    changes = storage.list_conversation_changes(cursor)
+    assert not changes["reset"]
+    assert ids(changes["changed"]) == ["b"]
+    assert changes["deleted"] == ["c"]
+
+    age("b", 60)
+    later = storage.list_conversation_changes(changes["cursor"] + 60)
+    assert later["changed"] == [] and later["deleted"] == []
+
+
+def test_list_delta_resends_writes_in_flight_at_the_cursor():
+    storage.create_conversation("a")
+    age("a", 60)
+    cursor = storage.list_conversation_changes(None)["cursor"]
+    # Written just before the previous listing finished, so it may have been missed
+    storage.add_user_message("a", "hello")
+    age("a", storage.LIST_SYNC_OVERLAP_SECONDS - 1)
+    assert ids(storage.list_conversation_changes(cursor)["changed"]) == ["a"]
+
+
+def test_recreated_conversation_is_not_reported_deleted():
+    storage.create_conversation("a")
+    cursor = storage.list_conversation_changes(None)["cursor"]
+    storage.delete_conversation("a")
+    storage.create_conversation("a")
+    changes = storage.list_conversation_changes(cursor)
+    assert ids(changes["changed"]) == ["a"] and changes["deleted"] == []
+
+
+def test_delete_all_resets_the_list():
+    storage.create_conversation("a")
+    cursor = storage.list_conversation_changes(None)["cursor"]
+    storage.delete_all_conversations()
+    storage.create_conversation("b")
+    changes = storage.list_conversation_changes(cursor)
+    assert changes["reset"]
+    assert ids(changes["changed"]) == ["b"] and changes["deleted"] == []
+
+
+def test_expired_cursor_resets_the_list(monkeypatch):
+    storage.create_conversation("a")
+    monkeypatch.setattr(storage, "DELETIONS_RETENTION_DAYS", 1)
+    changes = storage.list_conversation_changes(time.time() - 2 * 86400)
+    assert changes["reset"] and ids(changes["changed"]) == ["a"]
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_delta_endpoints(client):
+    conversation_id = client.post("/api/conversations", json={}).json()["id"]
+    listing = client.get("/api/conversations/delta").json()
+    assert listing["reset"] and [c["id"] for c in listing["changed"]] == [conversation_id]
+
+    client.delete(f"/api/conversations/{conversation_id}")
+    listing = client.get("/api/conversations/delta", params={"since": listing["cursor"]}).json()
+    assert listing["deleted"] == [conversation_id]
+
+    assert client.get(f"/api/conversations/{conversation_id}/delta").status_code == 404
@@ -0,0 +1,114 @@
+from collections import Counter
+
+import pytest
+
+from backend import keypool
+from backend.keypool import STRATEGY_LEAST_LOADED, ApiKey, KeyPool
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(keypool.time, "time", clock)
+    return clock
+
+
+def picks(pool, count):
+    chosen = []
+    for _ in range(count):
+        key = pool.acquire()
+        pool.release(key, 200)
+        chosen.append(key.key)
+    return chosen
+
+
+def test_round_robin_follows_the_weights_smoothly(clock):
+    pool = KeyPool([ApiKey("key-a", 5), ApiKey("key-b", 1), ApiKey("key-c", 1)])
+    chosen = picks(pool, 700)
+    assert Counter(chosen) == {"key-a": 500, "key-b": 100, "key-c": 100}
+    # Smooth: the light keys' turns fall inside the heavy key's, not after them
+    assert chosen[:7] == ["key-a", "key-a", "key-b", "key-a", "key-c", "key-a", "key-a"]
+    assert all(k.current_weight == 0 for k in pool.keys)
+
+
+def test_least_loaded_prefers_fewest_in_flight_per_weight(clock):
+    heavy, light = ApiKey("key-heavy", 3), ApiKey("key-light", 1)
+    pool = KeyPool([heavy, light], strategy=STRATEGY_LEAST_LOADED)
+    held = [pool.acquire() for _ in range(4)]
+    assert Counter(k.key for k in held) == {"key-heavy": 3, "key-light": 1}
+
+
+def test_quarantined_key_is_skipped_until_it_expires(clock, monkeypatch):
+    monkeypatch.setattr(keypool, "KEY_QUARANTINE_SECONDS", 10)
+    monkeypatch.setattr(keypool, "KEY_QUARANTINE_MAX_SECONDS", 300)
+    bad, good = ApiKey("key-bad"), ApiKey("key-good")
+    pool = KeyPool([bad, good])
+    pool.release(pool.acquire(exclude=[good]), 429)
+    assert set(picks(pool, 5)) == {"key-good"}
+
+    # A further failure doubles the quarantine; a success resets it
+    clock.now += 10
+    pool.release(pool.acquire(exclude=[good]), 429)
+    clock.now += 10
+    assert set(picks(pool, 4)) == {"key-good"}
+    clock.now += 10
+    assert "key-bad" in picks(pool, 2)
+    assert bad.consecutive_failures == 0
+    assert pool.stats()[0]["quarantines"] == 2
+
+
+@pytest.mark.parametrize("status", [401, 402])
+def test_unusable_key_is_quarantined_for_the_maximum(clock, monkeypatch, status):
+    monkeypatch.setattr(keypool, "KEY_QUARANTINE_MAX_SECONDS", 300)
+    bad, good = ApiKey("key-bad"), ApiKey("key-good")
+    pool = KeyPool([bad, good])
+    pool.release(pool.acquire(exclude=[good]), status)
+    assert bad.quarantined_until == clock.now + 300
+    clock.now += 299
+    assert not pool.has_alternative([good])
+    clock.now += 1
+    assert pool.has_alternative([good])
+
+
+def test_retry_after_sets_the_quarantine(clock):
+    key = ApiKey("key-a")
+    pool = KeyPool([key, ApiKey("key-b")])
+    pool.release(pool.acquire(), 429, {"retry-after": "7"})
+    assert key.quarantined_until == clock.now + 7
+
+
+def test_every_key_unavailable_uses_the_first_to_recover(clock):
+    early, late = ApiKey("key-early"), ApiKey("key-late")
+    early.quarantined_until = clock.now + 5
+    late.quarantined_until = clock.now + 50
+    assert KeyPool([late, early]).acquire().key == "key-early"
+
+
+def test_exhausted_rate_limit_is_skipped_until_the_reset(clock):
+    limited, other = ApiKey("key-limited"), ApiKey("key-other")
+    pool = KeyPool([limited, other])
+    pool.release(pool.acquire(exclude=[other]), 200, {
+        "x-ratelimit-limit": "100", "x-ratelimit-remaining": "0", "x-ratelimit-reset": "20s",
+    })
+    assert (limited.rate_limit, limited.remaining, limited.reset_at) == (100, 0, clock.now + 20)
+    assert set(picks(pool, 3)) == {"key-other"}
+    clock.now += 20
+    assert "key-limited" in picks(pool, 2)
+
+
+def test_reset_formats():
+    now = 1_700_000_000.0
+    assert keypool._parse_reset("1700000060000", now) == 1_700_000_060.0
+    assert keypool._parse_reset("1700000060", now) == 1_700_000_060
+    assert keypool._parse_reset("30", now) == now + 30
+    assert keypool._parse_reset("6m0s", now) == now + 360
+    assert keypool._parse_reset("150ms", now) == pytest.approx(now + 0.15)
+    assert keypool._parse_reset("soon", now) is None
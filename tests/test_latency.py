@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from backend import latency
+
+
+@pytest.fixture(autouse=True)
+def fresh_histograms(monkeypatch, scratch_dir):
+    monkeypatch.setattr(latency, "LATENCY_STATS_PATH", str(scratch_dir / "latency.json"))
+    monkeypatch.setattr(latency, "ADAPTIVE_TIMEOUTS", True)
+    monkeypatch.setattr(latency, "_histograms", {})
+    monkeypatch.setattr(latency, "_unsaved", {})
+    monkeypatch.setattr(latency, "_loaded", False)
+    monkeypatch.setattr(latency, "_saving", False)
+    # Only save when a test asks for it
+    monkeypatch.setattr(latency, "_last_save", float("inf"))
+
+
+def test_deadline_follows_the_observed_quantile():
+    assert latency.timeout_for("m", "stage1", 120.0) == 120.0
+    for _ in range(latency.LATENCY_MIN_SAMPLES):
+        latency.record("m", "stage1", 20.0)
+    # Read from a bucket at most GROWTH above the true value
+    deadline = latency.timeout_for("m", "stage1", 120.0)
+    assert 20.0 * latency.LATENCY_TIMEOUT_FACTOR <= deadline <= 20.0 * latency.GROWTH * latency.LATENCY_TIMEOUT_FACTOR
+
+
+def test_timeouts_never_raise_the_deadline():
+    for _ in range(latency.LATENCY_MIN_SAMPLES):
+        latency.record("m", "stage1", 20.0)
+    deadline = latency.timeout_for("m", "stage1", 120.0)
+    # Each timeout used to be recorded at the deadline, ratcheting it up to the ceiling
+    for _ in range(200):
+        latency.record_timeout("m", "stage1")
+        assert latency.timeout_for("m", "stage1", 120.0) == deadline
+    stats = latency.latency_stats()["m"]["stage1"]
+    assert stats["timeouts"] == 200 and stats["samples"] == latency.LATENCY_MIN_SAMPLES
+
+
+def test_workers_merge_their_samples_instead_of_overwriting():
+    latency.record("m", "stage1", 1.0)
+    latency.record_timeout("m", "stage1")
+    latency.save()
+
+    # Another worker, starting from the same file
+    latency._histograms, latency._unsaved, latency._loaded = {}, {}, False
+    latency.record("m", "stage1", 2.0)
+    latency.record("m", "stage2", 2.0)
+    latency.save()
+
+    with open(latency.LATENCY_STATS_PATH, encoding="utf-8") as f:
+        document = json.load(f)
+    assert sum(document["histograms"]["m"]["stage1"].values()) == 2
+    assert document["timeouts"]["m"]["stage1"] == 1
+    assert latency._histograms[("m", "stage1")].total == 2
+    assert not latency._unsaved
+
+
+def test_saving_again_adds_nothing_twice():
+    latency.record("m", "stage1", 1.0)
+    latency.save()
+    latency.save()
+    assert latency._read_histograms()[("m", "stage1")].total == 1
+
+
+def test_periodic_save_runs_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(latency, "_last_save", 0.0)
+    threads = []
+    save = latency.save
+    monkeypatch.setattr(latency, "save", lambda: (threads.append(threading.current_thread()), save()))
+
+    async def scenario():
+        latency.record("m", "stage1", 1.0)
+        while latency._saving:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert threads and threads[0] is not threading.main_thread()
+    assert latency._read_histograms()[("m", "stage1")].total == 1
+
+
+def test_decay_halves_samples_and_timeouts_together():
+    histogram = latency.Histogram()
+    for _ in range(latency.DECAY_AT - 1):
+        histogram.record(1.0)
+    histogram.record_timeout()
+    assert histogram.total == (latency.DECAY_AT - 1) / 2
+    assert histogram.timeouts == 0.5
@@ -0,0 +1,105 @@
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from backend import locking, storage
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_named_locks_in_use_do_not_collide():
+    names = set()
+    for path in (ROOT / "backend").glob("*.py"):
+        names.update(re.findall(r'named_lock\("([^"]+)"\)', path.read_text(encoding="utf-8")))
+    assert {"archive", "archive-segments", "search-index", "deletions-log"} <= names
+    slots = {locking._stripe(name, locking.NAMED_LOCK_SLOTS) for name in names}
+    assert len(slots) == len(names)
+
+
+def test_conversation_lock_excludes_other_processes(scratch_dir):
+    script = (
+        "import sys, time\n"
+        "from backend.locking import conversation_lock\n"
+        "with conversation_lock('c1'):\n"
+        "    print('locked', flush=True)\n"
+        "    time.sleep(1.5)\n"
+    )
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    holder = subprocess.Popen([sys.executable, "-c", script], cwd=scratch_dir, env=env, stdout=subprocess.PIPE)
+    try:
+        assert holder.stdout.readline().strip() == b"locked"
+        stripe = locking._stripe("c1", locking.LOCK_STRIPES)
+        assert not locking._conversation_locks.acquire(stripe, blocking=False)
+
+        started = time.monotonic()
+        with locking.conversation_lock("c1"):
+            assert time.monotonic() - started > 0.2
+    finally:
+        holder.wait(5)
+
+
+def test_conversation_lock_is_reentrant_within_a_thread():
+    with locking.conversation_lock("c1"):
+        with locking.conversation_lock("c1"):
+            pass
+    stripe = locking._stripe("c1", locking.LOCK_STRIPES)
+    assert locking._conversation_locks.acquire(stripe, blocking=False)
+    locking._conversation_locks.release(stripe)
+
+
+def test_listing_skips_files_removed_during_the_scan(monkeypatch):
+    for conversation_id in ("a", "b"):
+        storage.create_conversation(conversation_id)
+    read_document = storage.read_document
+
+    def racing(path, fmt):
+        if os.path.basename(path).startswith("a."):
+            raise FileNotFoundError(path)
+        return read_document(path, fmt)
+
+    monkeypatch.setattr(storage, "read_document", racing)
+    assert [c["id"] for c in storage.list_conversations()] == ["b"]
+    assert [c["id"] for c in storage.iter_conversations()] == ["b"]
+
+
+def test_delete_all_tolerates_files_removed_during_the_sweep(monkeypatch):
+    for conversation_id in ("a", "b"):
+        storage.create_conversation(conversation_id)
+    format_for_path = storage.format_for_path
+
+    def removed_meanwhile(filename):
+        # Another worker deletes "a" right after the listing saw it
+        if filename.startswith("a.") and storage.find_conversation_file("a"):
+            storage.delete_conversation("a")
+        return format_for_path(filename)
+
+    monkeypatch.setattr(storage, "format_for_path", removed_meanwhile)
+    storage.delete_all_conversations()
+    assert storage.list_conversations() == []
+
+
+def test_delete_all_waits_for_a_write_in_progress():
+    storage.create_conversation("c1")
+    writing = threading.Event()
+    finished = []
+
+    def writer():
+        with locking.conversation_lock("c1"):
+            writing.set()
+            time.sleep(0.3)
+            storage.write_document(storage.get_conversation("c1"))
+            finished.append(time.monotonic())
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    writing.wait()
+    storage.delete_all_conversations()
+    swept = time.monotonic()
+    thread.join()
+    # The sweep ran after the write, so it didn't come back
+    assert finished[0] <= swept
+    assert storage.get_conversation("c1") is None
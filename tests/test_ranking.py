@@ -0,0 +1,88 @@
+import json
+
+from backend import ranking
+from backend.council import calculate_aggregate_rankings
+
+LABELS = ["Response A", "Response B", "Response C"]
+
+
+def test_structured_json_with_tied_ranks():
+    text = json.dumps({
+        "evaluation": "...",
+        "ranking": [
+            {"response": "Response B", "rank": 1},
+            {"response": "Response A", "rank": 2},
+            {"response": "Response C", "rank": 2},
+        ],
+    })
+    parsed = ranking.parse_ranking(text, LABELS)
+    assert parsed == {"groups": [["Response B"], ["Response A", "Response C"]], "method": ranking.METHOD_JSON}
+
+
+def test_json_in_a_code_block_drops_unknown_and_repeated_labels():
+    text = 'Here it is:\n```json\n{"ranking": ["Response C", "Response Z", "Response C", "Response A"]}\n```'
+    parsed = ranking.parse_ranking(text, LABELS)
+    assert parsed == {"groups": [["Response C"], ["Response A"]], "method": ranking.METHOD_JSON}
+
+
+def test_final_ranking_section_wins_over_earlier_lists():
+    text = (
+        "1. Response A is thorough\n2. Response B is short\n\n"
+        "FINAL RANKING:\n1. Response C\n2. Response A\n3. Response B"
+    )
+    parsed = ranking.parse_ranking(text, LABELS)
+    assert parsed["method"] == ranking.METHOD_FINAL_RANKING
+    assert ranking.flatten(parsed["groups"]) == ["Response C", "Response A", "Response B"]
+
+
+def test_ties_and_passing_mentions_under_the_header():
+    text = "FINAL RANKING:\n1. Response B = Response C\n2. Response A (better than Response B)"
+    parsed = ranking.parse_ranking(text, LABELS)
+    assert parsed["groups"] == [["Response B", "Response C"], ["Response A"]]
+
+
+def test_repeated_rank_number_is_a_tie():
+    text = "FINAL RANKING:\n1. **Response A**\n1. **Response C**\n3. **Response B**"
+    assert ranking.parse_ranking(text, LABELS)["groups"] == [["Response A", "Response C"], ["Response B"]]
+
+
+def test_last_numbered_list_without_a_header():
+    text = "Notes:\n1. Response A first look\n\nMy order:\n1) Response B\n2) Response A\n3) Response C"
+    parsed = ranking.parse_ranking(text, LABELS)
+    assert parsed["method"] == ranking.METHOD_NUMBERED_LIST
+    assert ranking.flatten(parsed["groups"]) == ["Response B", "Response A", "Response C"]
+
+
+def test_mentions_fallback_and_nothing_found():
+    parsed = ranking.parse_ranking("Response C was best, then Response A.", LABELS)
+    assert parsed == {"groups": [["Response C"], ["Response A"]], "method": ranking.METHOD_MENTIONS}
+    assert ranking.parse_ranking("No labels here.", LABELS) == {"groups": [], "method": ranking.METHOD_NONE}
+
+
+def test_format_ranking_round_trips():
+    groups = [["Response A", "Response C"], ["Response B"]]
+    text = ranking.format_ranking(groups)
+    assert text == "FINAL RANKING:\n1. Response A = Response C\n2. Response B"
+    assert ranking.parse_ranking(text, LABELS)["groups"] == groups
+
+
+def test_tied_labels_share_the_average_position():
+    groups = [["Response A", "Response B"], ["Response C"]]
+    assert ranking.average_positions(groups) == {"Response A": 1.5, "Response B": 1.5, "Response C": 3}
+
+    label_to_model = {"Response A": "a", "Response B": "b", "Response C": "c"}
+    aggregate = calculate_aggregate_rankings(
+        [{"ranking": "", "parsed_groups": groups}, {"ranking": ranking.format_ranking([["Response B"], ["Response A"], ["Response C"]])}],
+        label_to_model,
+    )
+    assert [(row["model"], row["average_rank"]) for row in aggregate] == [("b", 1.25), ("a", 1.75), ("c", 3.0)]
+
+
+def test_parse_stats_counts_methods_per_model(monkeypatch):
+    monkeypatch.setattr(ranking, "_stats", {})
+    ranking.record_parse("m", ranking.METHOD_JSON)
+    ranking.record_parse("m", ranking.METHOD_MENTIONS)
+    assert ranking.parse_stats()["m"] == {
+        "attempts": 2, "parsed": 1, "success_rate": 0.5,
+        "methods": {ranking.METHOD_JSON: 1, ranking.METHOD_MENTIONS: 1},
+    }
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from backend import rerun, storage
+from backend.config import COUNCIL_MODELS, COUNCIL_SHELDON_NAMES
+from backend.ranking import format_ranking
+
+
+def member(index, **fields):
+    return {"model": COUNCIL_MODELS[index], "sheldon_name": COUNCIL_SHELDON_NAMES[index], **fields}
+
+
+def ranking(index, *labels):
+    groups = [[f"Response {label}"] for label in labels]
+    return member(index, ranking=format_ranking(groups), parsed_groups=groups)
+
+
+def stored_answer():
+    """Members 0-2 answered (1 failed) and ranked (2 failed); the others were skipped."""
+    stage1 = [
+        member(0, response="zero"),
+        member(1, response="*Error: timed out*"),
+        member(2, response="two"),
+    ]
+    stage2 = [
+        ranking(0, "A", "B", "C"),  # placed the failed response
+        ranking(1, "C", "A"),       # left it out
+        member(2, ranking="*Error: timed out*"),
+    ]
+    storage.create_conversation("c1")
+    storage.add_user_message("c1", "question?")
+    storage.add_assistant_message("c1", stage1, stage2, {"model": "chair", "response": "old"})
+    return stage1, stage2
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = {"stage1": [], "stage2": []}
+
+    async def stage1_query_member(user_query, index):
+        calls["stage1"].append(index)
+        return member(index, response=f"fresh {index}")
+
+    async def stage2_collect_rankings(user_query, stage1, rankers=None):
+        calls["stage2"].append(list(rankers))
+        labels = [chr(65 + i) for i in range(len(stage1))]
+        return [ranking(index, *labels) for index in rankers], {}
+
+    async def stage3_synthesize_final(user_query, stage1, stage2, chairman_model=None):
+        return {"model": chairman_model, "response": "new"}
+
+    monkeypatch.setattr(rerun, "stage1_query_member", stage1_query_member)
+    monkeypatch.setattr(rerun, "stage2_collect_rankings", stage2_collect_rankings)
+    monkeypatch.setattr(rerun, "stage3_synthesize_final", stage3_synthesize_final)
+    return calls
+
+
+def test_affected_rankers_are_failed_missing_or_placed_a_changed_response():
+    stage1, stage2 = stored_answer()
+    label_to_model = {f"Response {chr(65 + i)}": r["model"] for i, r in enumerate(stage1)}
+    rankers = rerun.rankers_to_rerun(stage2, ["Response B"], label_to_model, rerun.RERANK_AFFECTED)
+    # 0 ranked B, 2 failed, 3-5 never ranked; 1 left B out and keeps its ranking
+    assert rankers == [0, 2, 3, 4, 5]
+    assert rerun.rankers_to_rerun(stage2, ["Response B"], label_to_model, rerun.RERANK_NONE) == []
+    assert rerun.rankers_to_rerun(stage2, ["Response B"], label_to_model, rerun.RERANK_ALL) == list(range(6))
+
+
+def test_failed_members_rerun_and_kept_rankings_lose_stale_votes(calls):
+    stored_answer()
+    result = asyncio.run(rerun.rerun_message("c1", 1, rerank=rerun.RERANK_NONE))
+
+    assert calls == {"stage1": [1], "stage2": []}
+    assert [r["response"] for r in result["stage1"]] == ["zero", "fresh 1", "two"]
+    by_model = {entry["model"]: entry for entry in result["stage2"]}
+    # Ranker 0's vote on the changed response B is dropped; ranker 1 had none
+    assert by_model[COUNCIL_MODELS[0]]["parsed_groups"] == [["Response A"], ["Response C"]]
+    assert by_model[COUNCIL_MODELS[0]]["stale_labels"] == ["Response B"]
+    assert "stale_labels" not in by_model[COUNCIL_MODELS[1]]
+
+    stored = storage.get_conversation("c1")["messages"][1]
+    assert stored["stage3"]["response"] == "new"
+    assert stored["metadata"]["reruns"][0]["members"] == [COUNCIL_MODELS[1]]
+
+
+def test_skipped_member_joins_under_the_next_free_label(calls):
+    stored_answer()
+    result = asyncio.run(rerun.rerun_message("c1", 1, members=["Humorous Sheldon"]))
+
+    assert calls["stage1"] == [4]
+    assert result["metadata"]["label_to_model"]["Response D"] == COUNCIL_MODELS[4]
+    # Nobody had ranked D: only the failed and missing rankers rank again
+    assert calls["stage2"] == [[2, 3, 4, 5]]
+    kept = {entry["model"]: entry for entry in result["stage2"]}[COUNCIL_MODELS[0]]
+    assert "stale_labels" not in kept
+
+
+def test_answer_changed_during_the_rerun_is_kept(calls, monkeypatch):
+    stored_answer()
+
+    async def stage3_synthesize_final(user_query, stage1, stage2, chairman_model=None):
+        # Another worker's re-run of the same answer finishes first
+        storage.replace_assistant_message("c1", 1, stage1, stage2, {"model": "chair", "response": "theirs"})
+        return {"model": chairman_model, "response": "ours"}
+
+    monkeypatch.setattr(rerun, "stage3_synthesize_final", stage3_synthesize_final)
+    with pytest.raises(rerun.RerunConflict, match="changed during the re-run"):
+        asyncio.run(rerun.rerun_message("c1", 1))
+    assert storage.get_conversation("c1")["messages"][1]["stage3"]["response"] == "theirs"
+    assert not rerun._running
+
+
+def test_second_rerun_in_the_same_worker_conflicts(calls, monkeypatch):
+    stored_answer()
+    release = asyncio.Event()
+
+    async def slow_member(user_query, index):
+        await release.wait()
+        return member(index, response="late")
+
+    monkeypatch.setattr(rerun, "stage1_query_member", slow_member)
+
+    async def scenario():
+        first = asyncio.create_task(rerun.rerun_message("c1", 1))
+        await asyncio.sleep(0.05)
+        with pytest.raises(rerun.RerunConflict, match="already being re-run"):
+            await rerun.rerun_message("c1", 1)
+        release.set()
+        await first
+
+    asyncio.run(scenario())
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main, runner, storage
+from backend.config import COUNCIL_MODELS
+
+
+def answer(index):
+    return {"model": COUNCIL_MODELS[index], "response": f"answer {index}"}
+
+
+def test_cancel_during_stage1_records_members_that_answered(monkeypatch):
+    async def member(user_query, index):
+        if index == 0:
+            return answer(0)
+        await asyncio.Event().wait()  # never answers
+
+    monkeypatch.setattr(runner, "stage1_query_member", member)
+
+    async def scenario():
+        storage.create_conversation("c1")
+        run = runner.CouncilRun("c1", "question?", is_first_message=False, mode="full")
+        run.start()
+        while not run._member_results:
+            await asyncio.sleep(0.01)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run.task
+
+    asyncio.run(scenario())
+    stored = storage.get_conversation("c1")["messages"][-1]
+    assert stored["stage1"] == [answer(0)]
+    assert stored["metadata"]["status"] == "cancelled"
+    assert stored["metadata"]["cancelled_during"] == "stage1"
+
+
+def test_cancel_before_any_answer_records_an_empty_stage1(monkeypatch):
+
+    async def member(user_query, index):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(runner, "stage1_query_member", member)
+
+    async def scenario():
+        storage.create_conversation("c1")
+        run = runner.CouncilRun("c1", "question?", is_first_message=False, mode="full")
+        run.start()
+        while run.stage != "stage1" or not run._member_tasks:
+            await asyncio.sleep(0.01)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run.task
+
+    asyncio.run(scenario())
+    stored = storage.get_conversation("c1")["messages"][-1]
+    assert stored["stage1"] == []
+    assert stored["stage3"]["response"].startswith("*Cancelled")
+
+
+def test_skipping_stage1_before_any_answer_continues_with_the_first(monkeypatch):
+    first = asyncio.Event()
+
+    async def member(user_query, index):
+        if index == 0:
+            await first.wait()
+            return answer(0)
+        await asyncio.Event().wait()  # never answers
+
+    async def chairman(user_query, stage1, stage2, *args, **kwargs):
+        return {"model": "chair", "response": f"from {len(stage1)} answer(s)"}
+
+    monkeypatch.setattr(runner, "stage1_query_member", member)
+    monkeypatch.setattr(runner, "stage3_synthesize_final", chairman)
+
+    async def scenario():
+        storage.create_conversation("c1")
+        run = runner.CouncilRun("c1", "question?", is_first_message=False, mode="full")
+        run.start()
+        while run.stage != "stage1" or not run._member_tasks:
+            await asyncio.sleep(0.01)
+        run.skip_stage("stage1")
+        run.skip_stage("stage2")
+        await asyncio.sleep(0.05)
+        assert not run.task.done()  # still waiting for a first answer
+        first.set()
+        await run.task
+
+    asyncio.run(scenario())
+    stored = storage.get_conversation("c1")["messages"][-1]
+    assert stored["stage1"] == [answer(0)]
+    assert stored["stage3"]["response"] == "from 1 answer(s)"
+
+
+def test_stream_reports_the_real_error_when_a_cached_run_fails_to_start(monkeypatch):
+    class Broken:
+        def __init__(self, *args, **kwargs):
+            raise RuntimeError("could not start")
+
+    async def find_cached_answer(request):
+        return {"stage3": {}}
+
+    monkeypatch.setattr(main, "find_cached_answer", find_cached_answer)
+    monkeypatch.setattr(main, "CouncilRun", Broken)
+    storage.create_conversation("c1")
+
+    with TestClient(main.app) as client:
+        # Before the fix, the generator's cleanup raised AttributeError on run=None
+        with pytest.raises(RuntimeError, match="could not start"):
+            client.post("/api/conversations/c1/message/stream", json={"content": "hi"})
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from backend.scheduler import (
+    BACKGROUND,
+    BATCH,
+    INTERACTIVE,
+    UpstreamScheduler,
+    current_priority,
+    priority,
+    validate_priority,
+)
+
+WEIGHTS = {INTERACTIVE: 2, BACKGROUND: 1, BATCH: 1}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def call(scheduler, priority_class, served, release=None):
+    async with scheduler.slot(priority_class):
+        served.append(priority_class)
+        if release is not None:
+            await release.wait()
+
+
+def test_queued_calls_share_slots_by_weight():
+    async def scenario():
+        scheduler = UpstreamScheduler(1, WEIGHTS)
+        served = []
+        release = asyncio.Event()
+        blocker = asyncio.create_task(call(scheduler, BACKGROUND, [], release))
+        await settle()
+        tasks = [asyncio.create_task(call(scheduler, cls, served)) for cls in [BATCH] * 4 + [INTERACTIVE] * 4]
+        await settle()
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return served
+
+    served = asyncio.run(scenario())
+    # Interactive gets two slots for each batch slot while both are queued
+    assert served[:6].count(INTERACTIVE) == 4
+    assert served[6:] == [BATCH, BATCH]
+
+
+def test_idle_class_does_not_bank_credit():
+    async def scenario():
+        scheduler = UpstreamScheduler(1, WEIGHTS)
+        # Many batch calls while nothing else is queued move the virtual clock on
+        for _ in range(10):
+            await call(scheduler, BATCH, [])
+        served = []
+        release = asyncio.Event()
+        blocker = asyncio.create_task(call(scheduler, BATCH, [], release))
+        await settle()
+        tasks = [asyncio.create_task(call(scheduler, cls, served)) for cls in [INTERACTIVE] * 4 + [BACKGROUND] * 2]
+        await settle()
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return served
+
+    served = asyncio.run(scenario())
+    # Background was idle throughout but starts level with interactive, not ten slots ahead
+    assert served[:3].count(BACKGROUND) == 1
+
+
+def test_reserved_slots_only_go_to_interactive_calls():
+    async def scenario():
+        scheduler = UpstreamScheduler(3, WEIGHTS, reserved=1)
+        release = asyncio.Event()
+        served = []
+        batch = [asyncio.create_task(call(scheduler, BATCH, served, release)) for _ in range(3)]
+        await settle()
+        assert served == [BATCH, BATCH]
+        interactive = asyncio.create_task(call(scheduler, INTERACTIVE, served, release))
+        await settle()
+        assert served == [BATCH, BATCH, INTERACTIVE]
+        release.set()
+        await asyncio.gather(*batch, interactive)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.stats()["classes"][BATCH]["had_to_wait"] == 1
+
+
+def test_long_waiting_call_is_promoted():
+    async def scenario():
+        scheduler = UpstreamScheduler(2, WEIGHTS, reserved=1, max_wait=0.05)
+        release = asyncio.Event()
+        served = []
+        holder = asyncio.create_task(call(scheduler, INTERACTIVE, served, release))
+        batch = asyncio.create_task(call(scheduler, BATCH, served, release))
+        await settle()
+        # The only free slot is reserved, so the batch call waits
+        assert served == [INTERACTIVE]
+        await asyncio.sleep(0.06)
+        # The next dispatch lets it take the reserved slot, even ahead of an interactive call
+        later = asyncio.create_task(call(scheduler, INTERACTIVE, served, release))
+        await settle()
+        assert served == [INTERACTIVE, BATCH]
+        release.set()
+        await asyncio.gather(holder, batch, later)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.stats()["classes"][BATCH]["starvation_promotions"] == 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = UpstreamScheduler(1, WEIGHTS)
+        release = asyncio.Event()
+        holder = asyncio.create_task(call(scheduler, INTERACTIVE, [], release))
+        await settle()
+        waiter = asyncio.create_task(call(scheduler, BATCH, []))
+        await settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.stats()["classes"][BATCH]["queued"] == 0
+        release.set()
+        await holder
+        assert scheduler.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_priority_context_and_validation():
+    assert current_priority() == INTERACTIVE
+    with priority(BATCH):
+        assert current_priority() == BATCH
+    assert current_priority() == INTERACTIVE
+    assert validate_priority(None) == INTERACTIVE
+    with pytest.raises(ValueError, match="Unknown priority"):
+        validate_priority("urgent")
@@ -0,0 +1,50 @@
+from backend import search
+
+
+def conversation(answer="Quantum physics is strange"):
+    return {
+        "id": "c1",
+        "title": "Physics",
+        "created_at": "2026-01-01T00:00:00",
+        "messages": [
+            {"role": "user", "content": "What is quantum physics?"},
+            {"role": "assistant", "stage1": [], "stage2": [], "stage3": {"model": "m", "response": answer}},
+        ],
+    }
+
+
+def test_match_query_quotes_terms_and_keeps_prefixes():
+    assert search.build_match_query('quant* OR "physics"') == '"quant"* "OR" "physics"'
+    assert search.build_match_query("*** !!") is None
+
+
+def test_search_finds_user_and_final_answers():
+    search.index_conversation(conversation())
+    results = search.search("quantum")
+    assert {r["kind"] for r in results} == {search.KIND_USER, search.KIND_STAGE3}
+    assert all(r["title"] == "Physics" for r in results)
+
+
+def test_snippet_escapes_stored_markup():
+    search.index_conversation(conversation('<img src=x onerror="alert(1)"> quantum'))
+    [result] = search.search("onerror")
+    assert "<img" not in result["snippet"]
+    assert "&lt;img" in result["snippet"]
+    assert "<mark>onerror</mark>" in result["snippet"]
+
+
+def test_reindexing_replaces_previous_content():
+    search.index_conversation(conversation())
+    search.index_conversation(conversation())
+    assert len(search.search("quantum")) == 2
+
+    search.replace_assistant_message("c1", 1, [], {"model": "m", "response": "Relativity instead"})
+    assert [r["kind"] for r in search.search("quantum")] == [search.KIND_USER]
+    assert len(search.search("relativity")) == 1
+
+
+def test_schema_is_recreated_when_the_index_file_disappears(scratch_dir):
+    search.index_conversation(conversation())
+    (scratch_dir / "data" / "search.db").unlink()
+    search.index_conversation(conversation())
+    assert len(search.search("quantum")) == 2
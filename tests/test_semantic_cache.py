@@ -0,0 +1,89 @@
+import asyncio
+
+from backend import runner, semantic_cache, storage
+from backend.admission import AdmissionController
+
+ANSWER = {"model": "chair", "response": "Use slicing: items[::-1]"}
+
+
+def test_rewording_matches_and_unrelated_question_does_not():
+    semantic_cache.remember("c1", 1, "How do I reverse a list in Python?", ANSWER)
+    match = semantic_cache.lookup("how can I reverse a list in python")
+    assert match["conversation_id"] == "c1" and match["message_index"] == 1
+    assert match["stage3"] == ANSWER
+    assert semantic_cache.lookup("What is the capital of France?") is None
+
+
+def test_refreshed_answer_replaces_the_stored_one():
+    semantic_cache.remember("c1", 1, "How do I reverse a list in Python?", ANSWER)
+    semantic_cache.remember("c1", 1, "How do I reverse a list in Python?", {"model": "chair", "response": "new"})
+    assert semantic_cache.lookup("How do I reverse a list in Python?")["stage3"]["response"] == "new"
+
+
+def test_shingles_are_capped_for_long_questions():
+    question = " ".join(f"word{i}" for i in range(5000))
+    assert len(semantic_cache.shingles(question)) <= semantic_cache.MAX_SHINGLES
+    # Only the start is compared, so the same opening matches
+    semantic_cache.remember("c1", 1, question, ANSWER)
+    assert semantic_cache.lookup(question + " and one more thing") is not None
+
+
+def answered_conversation():
+    storage.create_conversation("c1")
+    storage.add_user_message("c1", "How do I reverse a list in Python?")
+
+
+def test_answers_are_not_remembered_while_the_cache_is_off(monkeypatch):
+    monkeypatch.setattr(storage, "SEMANTIC_CACHE", False)
+    calls = []
+    monkeypatch.setattr(semantic_cache, "remember", lambda *args: calls.append(args))
+    answered_conversation()
+    storage.add_assistant_message("c1", [], [], ANSWER)
+    assert calls == []
+
+
+def test_answers_are_remembered_while_the_cache_is_on(monkeypatch):
+    monkeypatch.setattr(storage, "SEMANTIC_CACHE", True)
+    answered_conversation()
+    storage.add_assistant_message("c1", [], [], ANSWER)
+    assert semantic_cache.lookup("how can I reverse a list in python")["message_index"] == 1
+
+
+def test_refresh_waits_for_a_council_slot_and_is_drained(monkeypatch):
+    admission = AdmissionController(max_concurrent=1, max_queue=4)
+    monkeypatch.setattr(runner, "council_admission", admission)
+    started = []
+
+    async def run_full_council(user_query, mode):
+        started.append(user_query)
+        await asyncio.Event().wait()  # never finishes
+
+    monkeypatch.setattr(runner, "run_full_council", run_full_council)
+
+    async def scenario():
+        busy = admission.enqueue("someone")
+        runner.refresh_cached_answer("c1", 1, "question?", "full")
+        await asyncio.sleep(0.05)
+        assert started == [] and admission.queued == 1
+
+        admission.release(busy)
+        await asyncio.sleep(0.05)
+        assert started == ["question?"] and admission.active == 1
+
+        await runner.drain_pending_refreshes(timeout=0.05)
+        assert not runner._refreshes
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_refresh_is_dropped_when_the_queue_is_full(monkeypatch):
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    monkeypatch.setattr(runner, "council_admission", admission)
+
+    async def scenario():
+        admission.enqueue("someone")
+        runner.refresh_cached_answer("c1", 1, "question?", "full")
+        assert not runner._refreshes
+
+    asyncio.run(scenario())
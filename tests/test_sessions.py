@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend import main, storage
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_websocket_from_a_foreign_origin_is_refused(client):
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect("/api/ws", headers={"Origin": "https://evil.example"}):
+            pass
+    assert refused.value.code == 1008
+
+
+@pytest.mark.parametrize("headers", [{"Origin": "http://localhost:5173"}, {}])
+def test_websocket_from_allowed_origins_or_non_browsers(client, headers):
+    with client.websocket_connect("/api/ws", headers=headers) as ws:
+        ws.send_text('{"type": "cancel", "conversation_id": "nope"}')
+        assert ws.receive_json()["type"] == "error"
+
+
+@pytest.mark.parametrize("message, error", [
+    ('{"type": "send", "conversation_id": "c1", "content": ["not", "text"]}', "'content' must be a str"),
+    ('{"type": "send", "conversation_id": "c1", "content": "hi", "mode": 3}', "'mode' must be a str"),
+    ('{"type": "send", "conversation_id": "c1", "content": "hi", "use_cache": "yes"}', "'use_cache' must be a bool"),
+    ('{"type": "send", "conversation_id": ["c1"], "content": "hi"}', "'conversation_id' must be a string"),
+    ('{"type": "send", "conversation_id": "c1", "content": "hi", "priority": 5}', "'priority' must be a str"),
+    ('[1, 2]', "Messages must be JSON objects"),
+    ('not json', "Invalid JSON"),
+])
+def test_malformed_messages_get_an_error_and_keep_the_socket(client, message, error):
+    storage.create_conversation("c1")
+    with client.websocket_connect("/api/ws") as ws:
+        ws.send_text(message)
+        reply = ws.receive_json()
+        assert reply["type"] == "error"
+        assert reply["message"] == error
+        # The connection is still usable
+        ws.send_text('{"type": "cancel", "conversation_id": "c1"}')
+        assert ws.receive_json()["message"] == "No council is running for this conversation"
@@ -0,0 +1,24 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import diagnostics, main
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_traces_are_hidden_unless_diagnostics_are_on(client, monkeypatch):
+    monkeypatch.setattr(diagnostics, "DIAGNOSTICS", False)
+    assert client.get("/api/debug/traces").status_code == 404
+
+
+def test_traces_require_the_admin_token(client, monkeypatch):
+    monkeypatch.setattr(diagnostics, "DIAGNOSTICS", True)
+    monkeypatch.setattr(diagnostics, "DIAGNOSTICS_TOKEN", "secret")
+    assert client.get("/api/debug/traces").status_code == 403
+    response = client.get("/api/debug/traces", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
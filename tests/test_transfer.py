@@ -0,0 +1,113 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from backend import search, storage, transfer
+
+
+def record(**overrides):
+    conversation = {
+        "id": "conv-1",
+        "created_at": "2026-01-01T00:00:00",
+        "updated_at": "2026-01-01T00:00:00",
+        "version": 2,
+        "title": "Imported",
+        "messages": [
+            {"role": "user", "content": "Why is the sky blue?"},
+            {
+                "role": "assistant",
+                "stage1": [{"model": "m", "response": "Rayleigh scattering"}],
+                "stage2": [],
+                "stage3": {"model": "c", "response": "Because of Rayleigh scattering"},
+            },
+        ],
+    }
+    conversation.update(overrides)
+    return conversation
+
+
+def ndjson(*records):
+    return [b"".join(json.dumps(r).encode() + b"\n" for r in records)]
+
+
+@pytest.mark.parametrize("overrides", [
+    {"id": "../etc"},
+    {"id": 5},
+    {"title": None},
+    {"created_at": 5},
+    {"created_at": "yesterday"},
+    {"updated_at": 1.5},
+    {"version": "2"},
+    {"messages": {}},
+    {"messages": [{"foo": 1}]},
+    {"messages": [{"role": "user", "content": ["not", "text"]}]},
+    {"messages": [{"role": "assistant", "stage1": [], "stage3": "answer"}]},
+    {"messages": [{"role": "assistant", "stage3": {"response": "x"}}]},
+    {"messages": [{"role": "system", "content": "x"}]},
+])
+def test_malformed_records_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        transfer.validate_conversation(record(**overrides))
+
+
+def test_valid_record_passes():
+    transfer.validate_conversation(record())
+
+
+def test_import_counts_and_keeps_the_store_listable():
+    counts = transfer.import_stream(ndjson(
+        record(),
+        record(id="bad-date", created_at=5),
+        record(id="bad-message", messages=[{"foo": 1}]),
+    ))
+    assert counts == {"imported": 1, "skipped": 0, "failed": 2}
+    assert [c["id"] for c in storage.list_conversations()] == ["conv-1"]
+    assert search.search("rayleigh")
+
+    assert transfer.import_stream(ndjson(record())) == {"imported": 0, "skipped": 1, "failed": 0}
+
+
+def test_failed_indexing_rolls_the_write_back(monkeypatch):
+    def broken(conversation):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(search, "index_conversation", broken)
+    assert transfer.import_stream(ndjson(record())) == {"imported": 0, "skipped": 0, "failed": 1}
+    assert storage.get_conversation("conv-1") is None
+
+
+def test_failed_overwrite_restores_the_previous_version(monkeypatch):
+    transfer.import_stream(ndjson(record()))
+    monkeypatch.setattr(search, "index_conversation", lambda conversation: 1 / 0)
+    counts = transfer.import_stream(ndjson(record(title="Replacement")), overwrite=True)
+    assert counts["failed"] == 1
+    assert storage.get_conversation("conv-1")["title"] == "Imported"
+
+
+def test_export_round_trip():
+    transfer.import_stream(ndjson(record()))
+    lines = b"".join(transfer.iter_export()).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["conv-1"]
+
+
+def test_failed_records_are_logged_with_line_and_id(caplog):
+    body = ndjson(record(), record(id="bad-date", created_at=5)) + [b"not json\n"]
+    with caplog.at_level(logging.WARNING, logger="backend.transfer"):
+        assert transfer.import_stream(body)["failed"] == 2
+    messages = sorted(r.getMessage() for r in caplog.records)
+    assert messages[0].startswith("Failed to import line 2 (conversation 'bad-date'): ")
+    assert messages[1].startswith("Failed to import line 3: ")
+    assert all(r.exc_info for r in caplog.records)
+
+
+def test_async_import_logs_failures_too(caplog):
+    async def chunks():
+        for chunk in ndjson(record(id="bad-date", created_at=5)):
+            yield chunk
+
+    with caplog.at_level(logging.WARNING, logger="backend.transfer"):
+        counts = asyncio.run(transfer.import_stream_async(chunks()))
+    assert counts["failed"] == 1
+    assert "line 1 (conversation 'bad-date')" in caplog.records[0].getMessage()